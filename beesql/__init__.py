@@ -11,6 +11,12 @@ Goals
 # Source: https://github.com/kasun/BeeSQL
 
 from core import connection
+from core import pool
+from core import register_backend
+from core import routed
+from core import shared
+from core import spec
 
 from exceptions import BeeSQLError
 from exceptions import BeeSQLDatabaseError
+from exceptions import BeeSQLConnectionError
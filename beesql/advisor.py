@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+''' BeeSQL index advice from query plans. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import logging
+import threading
+
+from beesql.exceptions import BeeSQLDatabaseError
+from beesql.exceptions import BeeSQLError
+
+# Logger used for scans of large tables.
+scan_log = logging.getLogger('beesql.advisor')
+
+def index_covers(index_columns, columns):
+    ''' Return True if an index on index_columns serves equality conditions on all of columns,
+        that is columns are its leading columns in any order. '''
+    return set(index_columns[:len(columns)]) == set(columns)
+
+class IndexAdvisor(object):
+    ''' Thread safe record of the where_conditions columns CRUD methods filter tables on.
+
+    The first call of each table and columns shape is explained. Shapes scanning tables of at least
+    large_table_rows rows are logged to the beesql.advisor logger, and report suggests composite
+    indexes covering the shapes of large tables no existing index covers. Table sizes and indexes
+    are read once per table, when its first shape is observed. Shapes which could not be explained
+    are not reported.
+
+    An IndexAdvisor can be shared by connections to the same database. '''
+    def __init__(self, large_table_rows=10000):
+        ''' Initialize advisor.
+
+        Arguments:
+            :large_table_rows (int): Number of rows from which scanning a table is flagged. '''
+        self.large_table_rows = large_table_rows
+        self._lock = threading.Lock()
+        self._shapes = {}
+        self._tables = {}
+
+    def observe(self, connection, table, columns, sql, escapes=None):
+        ''' Record a call filtering table on equality conditions of columns, run as sql through connection. '''
+        key = (table, tuple(sorted(columns)))
+        with self._lock:
+            shape = self._shapes.get(key)
+            if shape is not None:
+                shape['count'] += 1
+                return
+            self._shapes[key] = shape = dict(table=table, columns=key[1], count=1, scan=None, rows=None, covered=None)
+        try:
+            plan = connection.explain(sql, escapes)
+            info = self._table(connection, table)
+        except (BeeSQLError, BeeSQLDatabaseError):
+            # The statement itself reports the error. The shape is still counted but not reported.
+            return
+        scan = any([step['scan'] for step in plan if step['table'] == table])
+        with self._lock:
+            shape.update(scan=scan, rows=info['rows'],
+                         covered=any([index_covers(index, key[1]) for index in info['indexes'].values()]))
+        if scan and info['rows'] >= self.large_table_rows:
+            scan_log.warning('Scan of %s (%s rows) filtering on %s: %s', table, info['rows'], ', '.join(key[1]), sql)
+
+    def _table(self, connection, table):
+        ''' Return row count and indexes of table, read once. '''
+        info = self._tables.get(table)
+        if info is None:
+            info = dict(rows=connection.table_rows(table), indexes=connection.indexes(table))
+            self._tables[table] = info
+        return info
+
+    def _suggestions(self, shapes):
+        ''' Return indexes covering shapes, each as a list of columns. Indexes are shared by shapes whose
+            columns extend the columns of a smaller shape, which then lead the index. '''
+        indexes = []
+        for shape in sorted(shapes, key=lambda shape: len(shape['columns'])):
+            columns = shape['columns']
+            for index in indexes:
+                if index['table'] == shape['table'] and set(index['columns']) <= set(columns):
+                    index['columns'].extend([column for column in columns if column not in index['columns']])
+                    index['calls'] += shape['count']
+                    break
+            else:
+                indexes.append(dict(table=shape['table'], columns=list(columns), calls=shape['count']))
+        return indexes
+
+    def report(self):
+        ''' Return dict of observed shapes, scans of large tables and suggested indexes.
+
+        Returns:
+            dict with shapes, the list of observed table and columns shapes with their call count, whether
+            they scanned the table, the table's rows and whether an existing index covers them, most
+            called first; scans, the shapes scanning large tables; and suggestions, the indexes covering
+            uncovered shapes of large tables with their CREATE INDEX statement and the calls they serve.
+
+        Example::
+
+            advisor.report()['suggestions']
+            [{'table': 'beesql_downloads', 'columns': ('release', 'country'), 'calls': 1200,
+              'sql': 'CREATE INDEX beesql_downloads_release_country ON beesql_downloads (release, country)'}] '''
+        with self._lock:
+            shapes = [dict(shape) for shape in self._shapes.values() if shape['scan'] is not None]
+        shapes.sort(key=lambda shape: (-shape['count'], shape['table'], shape['columns']))
+        large = [shape for shape in shapes if shape['rows'] >= self.large_table_rows]
+        suggestions = []
+        for index in self._suggestions([shape for shape in large if not shape['covered']]):
+            columns = tuple(index['columns'])
+            name = '%s_%s' % (index['table'].replace('.', '_'), '_'.join(columns))
+            suggestions.append(dict(table=index['table'], columns=columns, calls=index['calls'],
+                                    sql='CREATE INDEX %s ON %s (%s)' % (name, index['table'], ', '.join(columns))))
+        suggestions.sort(key=lambda index: -index['calls'])
+        return dict(shapes=shapes, scans=[shape for shape in large if shape['scan']], suggestions=suggestions)
+
+    def reset(self):
+        ''' Forget observed shapes and tables. '''
+        with self._lock:
+            self._shapes = {}
+            self._tables = {}
@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+
+''' BeeSQL asyncio API.
+
+Every AsyncConnection owns a worker thread which opens a regular BeeSQL connection and runs
+operations on it one at a time. Operations return asyncio futures, which can be awaited
+(or yielded from with trollius), so the event loop is never blocked by the database.
+An AsyncPool spreads operations over several connections to run queries concurrently.
+
+Requires asyncio, or trollius on Python 2. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import collections
+import itertools
+import threading
+import Queue
+
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+
+import beesql
+from beesql.exceptions import BeeSQLError
+
+try:
+    StopAsyncIteration = StopAsyncIteration
+except NameError:
+    class StopAsyncIteration(Exception):
+        ''' Raised by AsyncRowIterator once all rows are consumed. '''
+
+# Connection methods mirrored as coroutines by AsyncConnection and AsyncPool.
+METHODS = ('query', 'get', 'get_many', 'select', 'insert', 'insert_many', 'upsert_many', 'update', 'update_many', 'delete', 'query_columns', 'tables', 'export', 'load', 'explain')
+
+def _new_future(loop):
+    ''' Return a new future attached to loop. '''
+    if hasattr(loop, 'create_future'):
+        return loop.create_future()
+    return asyncio.Future(loop=loop)
+
+def _set_result(future, result):
+    if not future.cancelled():
+        future.set_result(result)
+
+def _set_exception(future, exception):
+    if not future.cancelled():
+        future.set_exception(exception)
+
+class AsyncConnection(object):
+    ''' Connection running BeeSQL operations on a dedicated worker thread. '''
+    def __init__(self, engine='mysql', loop=None, **options):
+        ''' Start the worker thread, which opens the connection.
+
+        Arguments:
+            :engine: Database to use; Default to mysql.
+            :loop: Event loop futures are attached to; Default to the current event loop.
+            :options: Connection options passed to beesql.connection. '''
+        self.engine = engine
+        self.options = options
+        self.loop = loop or asyncio.get_event_loop()
+        self.closed = False
+        # Number of submitted operations which have not completed yet.
+        self.pending = 0
+        # Number of row iterators which are not exhausted yet.
+        self.iterators = 0
+        self._queue = Queue.Queue()
+        self._thread = threading.Thread(target=self._work, name='beesql-aio-%s' % (engine))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _work(self):
+        ''' Worker thread, open the connection and run submitted operations until closed. '''
+        connection = None
+        error = None
+        try:
+            connection = beesql.connection(engine=self.engine, **self.options)
+        except Exception, e:
+            error = e
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            func, args, kwargs, future = item
+            if error is not None:
+                self.loop.call_soon_threadsafe(_set_exception, future, error)
+                continue
+            try:
+                result = func(connection, *args, **kwargs)
+            except Exception, e:
+                self.loop.call_soon_threadsafe(_set_exception, future, e)
+            else:
+                self.loop.call_soon_threadsafe(_set_result, future, result)
+        if connection is not None:
+            connection.close()
+
+    def _done(self, future):
+        self.pending -= 1
+
+    def run(self, func, *args, **kwargs):
+        ''' Run func(connection, *args, **kwargs) on the worker thread.
+
+        Returns:
+            Future of func's return value. '''
+        if self.closed:
+            raise BeeSQLError('Connection is closed')
+        future = _new_future(self.loop)
+        self.pending += 1
+        future.add_done_callback(self._done)
+        self._queue.put((func, args, kwargs, future))
+        return future
+
+    def iter_query(self, sql, escapes=None, batch_size=1000, row_format=None):
+        ''' Run provided query and return an async iterator over resulting rows. '''
+        return AsyncRowIterator(self, 'iter_query', (sql, escapes, batch_size, row_format), {}, batch_size)
+
+    def iter_select(self, table, *args, **kwargs):
+        ''' Select from table and return an async iterator over rows. Accepts the arguments of select. '''
+        return AsyncRowIterator(self, 'iter_select', (table,) + args, kwargs, kwargs.get('batch_size', 1000))
+
+    def close(self):
+        ''' Close the connection once submitted operations are done.
+
+        Returns:
+            Future which is done once the connection is closed. '''
+        future = _new_future(self.loop)
+        if self.closed:
+            future.set_result(None)
+            return future
+        self.closed = True
+        self._queue.put(None)
+        def join():
+            self._thread.join()
+            self.loop.call_soon_threadsafe(_set_result, future, None)
+        threading.Thread(target=join).start()
+        return future
+
+def _method(name):
+    ''' Return a method running connection method name on the worker thread. '''
+    def method(self, *args, **kwargs):
+        return self.run(lambda connection: getattr(connection, name)(*args, **kwargs))
+    method.__name__ = name
+    method.__doc__ = ''' Run connection.%s on the worker thread and return a future of its result. ''' % (name)
+    return method
+
+for name in METHODS:
+    setattr(AsyncConnection, name, _method(name))
+
+class AsyncRowIterator(object):
+    ''' Async iterator over rows of a streaming query, fetching batches of rows on the worker thread.
+
+    Use with async for, or call fetch() until it returns an empty list. '''
+    def __init__(self, connection, method, args, kwargs, batch_size):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.done = False
+        self._rows = collections.deque()
+        self._generator = None
+        self._method = method
+        self._args = args
+        self._kwargs = kwargs
+        connection.iterators += 1
+
+    def _fetch(self, connection):
+        ''' Fetch next batch of rows, runs on the worker thread. '''
+        if self._generator is None:
+            self._generator = getattr(connection, self._method)(*self._args, **self._kwargs)
+        rows = list(itertools.islice(self._generator, self.batch_size))
+        if not rows:
+            self._generator = None
+        return rows
+
+    def _finish(self):
+        if not self.done:
+            self.done = True
+            self.connection.iterators -= 1
+
+    def fetch(self):
+        ''' Return a future of the next batch of rows, an empty list once all rows are consumed. '''
+        future = _new_future(self.connection.loop)
+        if self._rows:
+            rows = list(self._rows)
+            self._rows.clear()
+            future.set_result(rows)
+            return future
+        if self.done:
+            future.set_result([])
+            return future
+        def fetched(batch):
+            if batch.cancelled():
+                future.cancel()
+            elif batch.exception() is not None:
+                self._finish()
+                future.set_exception(batch.exception())
+            else:
+                if not batch.result():
+                    self._finish()
+                future.set_result(batch.result())
+        self.connection.run(self._fetch).add_done_callback(fetched)
+        return future
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = _new_future(self.connection.loop)
+        if self._rows:
+            future.set_result(self._rows.popleft())
+            return future
+        def fetched(batch):
+            if batch.exception() is not None:
+                future.set_exception(batch.exception())
+            elif not batch.result():
+                future.set_exception(StopAsyncIteration())
+            else:
+                self._rows.extend(batch.result())
+                future.set_result(self._rows.popleft())
+        self.fetch().add_done_callback(fetched)
+        return future
+
+def _chain(source, target):
+    ''' Complete target future with the outcome of source future. '''
+    if target.cancelled():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+class _PendingConnection(object):
+    ''' Stand-in for a pool connection while all connections are reserved with acquire. Operations are
+        held until a connection is released, then submitted to it in order before anyone acquires it. '''
+    def __init__(self, loop):
+        self.loop = loop
+        self.connection = None
+        self._iterators = 0
+        self._held = []
+
+    @property
+    def iterators(self):
+        if self.connection is not None:
+            return self.connection.iterators
+        return self._iterators
+
+    @iterators.setter
+    def iterators(self, value):
+        if self.connection is not None:
+            self.connection.iterators = value
+        else:
+            self._iterators = value
+
+    def run(self, func, *args, **kwargs):
+        ''' Run func on the connection once one is released, see AsyncConnection.run. '''
+        if self.connection is not None:
+            return self.connection.run(func, *args, **kwargs)
+        future = _new_future(self.loop)
+        self._held.append((func, args, kwargs, future))
+        return future
+
+    # Row iterators fetch their batches through run.
+    iter_query = AsyncConnection.__dict__['iter_query']
+    iter_select = AsyncConnection.__dict__['iter_select']
+
+    def bind(self, connection):
+        ''' Submit held operations to connection, which runs all further operations. '''
+        self.connection = connection
+        connection.iterators += self._iterators
+        held, self._held = self._held, []
+        for func, args, kwargs, future in held:
+            try:
+                connection.run(func, *args, **kwargs).add_done_callback(lambda result, future=future: _chain(result, future))
+            except Exception, e:
+                _set_exception(future, e)
+
+    def fail(self, error):
+        ''' Fail held operations with error. '''
+        held, self._held = self._held, []
+        for func, args, kwargs, future in held:
+            _set_exception(future, error)
+
+class AsyncPool(object):
+    ''' Fixed size pool of AsyncConnections. Operations run on the connection with the fewest
+        pending operations, so up to size queries run concurrently. Use acquire and release
+        to run several operations, such as a transaction, on the same connection. Reserved connections
+        do not run pool operations, while all connections are reserved operations wait for a release. '''
+    def __init__(self, engine='mysql', size=4, loop=None, **options):
+        ''' Open size connections.
+
+        Arguments:
+            :engine: Database to use; Default to mysql.
+            :size (int): Number of connections.
+            :loop: Event loop futures are attached to; Default to the current event loop.
+            :options: Connection options passed to beesql.connection. '''
+        self.loop = loop or asyncio.get_event_loop()
+        self.connections = [AsyncConnection(engine, self.loop, **options) for i in range(size)]
+        self._idle = collections.deque(self.connections)
+        self._waiters = collections.deque()
+
+    def _pick(self):
+        ''' Return the connection not reserved with acquire with fewest open row iterators and pending
+            operations, or a stand-in running operations on the next released connection. '''
+        if self._idle:
+            return min(self._idle, key=lambda connection: (connection.iterators, connection.pending))
+        if not self._waiters or not isinstance(self._waiters[-1], _PendingConnection):
+            self._waiters.append(_PendingConnection(self.loop))
+        return self._waiters[-1]
+
+    def run(self, func, *args, **kwargs):
+        ''' Run func(connection, *args, **kwargs) on the least busy connection's worker thread. '''
+        return self._pick().run(func, *args, **kwargs)
+
+    def iter_query(self, *args, **kwargs):
+        ''' Async iterator over rows of a query, run on the least busy connection. '''
+        return self._pick().iter_query(*args, **kwargs)
+
+    def iter_select(self, *args, **kwargs):
+        ''' Async iterator over selected rows, run on the least busy connection. '''
+        return self._pick().iter_select(*args, **kwargs)
+
+    def acquire(self):
+        ''' Return a future of a connection reserved for the caller until released. '''
+        future = _new_future(self.loop)
+        if self._idle:
+            future.set_result(self._idle.popleft())
+        else:
+            self._waiters.append(future)
+        return future
+
+    def release(self, connection):
+        ''' Return a connection reserved with acquire. Operations waiting for a connection are submitted
+            to it before it is handed to the next acquire. '''
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if isinstance(waiter, _PendingConnection):
+                waiter.bind(connection)
+            elif not waiter.done():
+                waiter.set_result(connection)
+                return
+        self._idle.append(connection)
+
+    def close(self):
+        ''' Close all connections.
+
+        Returns:
+            Future which is done once all connections are closed. '''
+        for waiter in self._waiters:
+            if isinstance(waiter, _PendingConnection):
+                waiter.fail(BeeSQLError('Pool is closed'))
+        return asyncio.gather(*[connection.close() for connection in self.connections])
+
+for name in METHODS:
+    setattr(AsyncPool, name, _method(name))
+
+def connect(engine='mysql', loop=None, **options):
+    ''' Create and return an AsyncConnection. Accepts the options of beesql.connection. '''
+    return AsyncConnection(engine, loop, **options)
+
+def pool(engine='mysql', size=4, loop=None, **options):
+    ''' Create and return an AsyncPool of size connections. Accepts the options of beesql.connection. '''
+    return AsyncPool(engine, size, loop, **options)
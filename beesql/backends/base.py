@@ -5,33 +5,764 @@
 # Author: Kasun Herath <kasunh01@gmail.com>
 # Source: https://github.com/kasun/BeeSQL
 
+import contextlib
+import itertools
+import os
+import sys
+import time
+
+import beesql
+from beesql import BeeSQLError
+from beesql.advisor import IndexAdvisor
+from beesql.exceptions import BeeSQLConnectionError
+from beesql.exceptions import BeeSQLDatabaseError
+from beesql.cache import LRUCache
+from beesql.cache import ResultCache
+from beesql.cache import read_tables
+from beesql.cache import written_tables
+from beesql.columns import ColumnBuilder
+from beesql.columns import column_names
+from beesql.parallel import parallel_select
+from beesql.rows import ROW_FORMATS
+from beesql.rows import converter
+from beesql.specs import ConnectionSpec
+from beesql.stats import QueryStats
+from beesql.transfer import export
+from beesql.transfer import load
+from beesql.utils import Page
+from beesql.utils import decode_cursor
+from beesql.utils import encode_cursor
+
+# Database connections inherited from a parent process. They are kept referenced so that they are
+# never closed, or finalized, by the child while the parent still uses them.
+_inherited = []
+
 class BeeSQLBaseConnection(object):
     ''' Base Abstract Database Connection. '''
-    def __init__(self):
-        self.transaction = False
+    # Driver errors raised as BeeSQLDatabaseError.
+    database_errors = ()
+    # Driver errors of failed or lost connections which are raised as they are.
+    connection_errors = ()
+
+    def __init__(self, statement_cache_size=256, row_format='dict', result_cache=None, commit_every=None,
+                 commit_interval=None, query_stats=None):
+        ''' Initialize options common to all connections.
+
+        Arguments:
+            :statement_cache_size (int): Number of compiled statements cached by CRUD methods, 0 disables caching.
+            :row_format: Format of returned rows, one of 'dict', 'tuple', 'namedtuple' or 'row'.
+            :result_cache: Optional, beesql.cache.ResultCache used to cache results of get and select.
+            :commit_every (int): Optional, outside transactions commit once every commit_every writing statements
+                                 instead of after each statement. Reads are not counted.
+            :commit_interval (float): Optional, outside transactions commit once at least commit_interval
+                                      milliseconds passed since last commit, checked whenever a statement runs.
+                                      There is no timer, call flush once a burst of writes ends.
+            :query_stats: Optional, beesql.stats.QueryStats collecting statistics of statements run. '''
+        # Options the connection was created with, used to open more connections like it.
+        self.options = dict(statement_cache_size=statement_cache_size, row_format=row_format, result_cache=result_cache,
+                            commit_every=commit_every, commit_interval=commit_interval, query_stats=query_stats)
+        self.in_transaction = False
+        # Process the database connection belongs to, a forked child connects again.
+        self._pid = os.getpid()
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        # Statements run since last commit and time of last commit, used by the commit policy.
+        self._pending = 0
+        self._last_commit = time.time()
+        self.row_format = self._check_row_format(row_format)
+        # Compiled statements of CRUD methods keyed on the shape of the call.
+        self.statement_cache = LRUCache(statement_cache_size)
+        self.result_cache = result_cache
+        # Tables written since last commit, None if unknown tables were written.
+        self._written = set()
+        # (before, after) execute hooks, statements are not timed while empty.
+        self.hooks = []
+        self.query_stats = None
+        if query_stats is not None:
+            self.enable_stats(stats=query_stats)
+        self.index_advisor = None
    
-    def _run_query(self, sql, escapes=None):
-        ''' Run provided query using implemented class's DB Cursor. Use Escape values if provided. ''' 
+    def __getattr__(self, name):
+        ''' Connect connections created with lazy=True on first use of their database connection or cursor. '''
+        if name not in ('db_connection', 'cursor') or self.__dict__.get('_connecting'):
+            raise AttributeError(name)
+        self._connecting = True
+        try:
+            self._connect()
+        finally:
+            self._connecting = False
+        return object.__getattribute__(self, name)
+
+    def _check_fork(self):
+        ''' Drop the database connection and cursor if the process forked since they were opened, so that
+            the child connects again on first use instead of sharing the parent's socket or file handle. '''
+        pid = os.getpid()
+        if pid == self._pid:
+            return
+        self._pid = pid
+        if 'db_connection' in self.__dict__:
+            _inherited.append((self.__dict__.pop('db_connection'), self.__dict__.pop('cursor', None)))
+        # Transactions and pending statements are the parent's.
+        self.in_transaction = False
+        self._pending = 0
+        self._written = set()
+
+    def _database_error(self, error):
+        ''' Return driver error as a BeeSQLConnectionError if the connection failed, else as a BeeSQLDatabaseError. '''
+        if self._connection_failed(error):
+            return BeeSQLConnectionError(str(error))
+        return BeeSQLDatabaseError(str(error))
+
+    def _connection_failed(self, error):
+        ''' Return True if driver error reports a failed or lost connection rather than a failed statement. '''
+        return False
+
+    def _new_cursor(self, *args):
+        ''' Return a new cursor of the database connection, connecting again in a forked child. '''
+        self._check_fork()
+        return self.db_connection.cursor(*args)
+
+    @property
+    def connected(self):
+        ''' True once the database was connected to, connections created with lazy=True connect on first use. '''
+        return 'db_connection' in self.__dict__
+
+    def clone(self):
+        ''' Open and return a new connection to the same database with the same options.
+            Result cache and query stats are shared with this connection. '''
+        arguments = dict(username=None, password=None)
+        arguments.update(self.connect_args)
+        arguments.update(self.options)
+        return self.__class__(**arguments)
+
+    def spec(self):
+        ''' Return a picklable beesql.specs.ConnectionSpec opening connections like this one, for example
+            in worker processes. Result cache and query stats are not part of it.
+
+        Raises:
+            BeeSQLError if the connection's class is not registered as an engine. '''
+        path = '%s:%s' % (self.__class__.__module__, self.__class__.__name__)
+        engines = [engine for engine, backend in beesql.core.BACKENDS.items() if backend == path]
+        if not engines:
+            raise BeeSQLError('%s is not registered as an engine' % (self.__class__.__name__))
+        options = dict(self.connect_args)
+        options.update(self.options)
+        for option in ('result_cache', 'query_stats'):
+            options.pop(option)
+        return ConnectionSpec(engines[0], **options)
+
+    def parallel_select(self, table, partition_key, partitions=4, workers=4, columns=None, ordered=False, batch_size=1000,
+                        row_format=None, where=None, **where_conditions):
+        ''' Read rows of table concurrently on partitions ranges of partition_key, each worker on a clone of
+            this connection, and iterate over them. See beesql.parallel.parallel_select.
+
+        Example::
+
+            for row in connection.parallel_select('beesql_downloads', 'id', partitions=8, workers=8):
+                process(row) '''
+        return parallel_select(self, table, partition_key, partitions, workers, columns, ordered, batch_size,
+                               row_format, where, **where_conditions)
+
+    def export(self, source, target, format='csv', batch_size=1000, escapes=None, compress=None, **options):
+        ''' Stream rows of table or query source to a CSV or JSON Lines file, batch_size rows at a time.
+            See beesql.transfer.export.
+
+        Example::
+
+            connection.export('SELECT * FROM beesql_downloads WHERE year=?', 'downloads.csv.gz', escapes=(2012,))
+            {'rows': 120000, 'bytes': 1873421} '''
+        return export(self, source, target, format, batch_size, escapes, compress, **options)
+
+    def load(self, table, source, columns=None, format=None, batch_size=1000, fast=False, progress=None, **options):
+        ''' Insert rows of a CSV or JSON Lines file, or of an iterable of rows, into table batch_size rows at a time.
+            With fast set rows are loaded in a fast_ingest session. See beesql.transfer.load.
+
+        Example::
+
+            connection.load('beesql_downloads', 'downloads.csv.gz', fast=True, progress=report)
+            {'rows': 120000, 'seconds': 1.92} '''
+        return load(self, table, source, columns, format, batch_size, fast=fast, progress=progress, **options)
+
+    def _load_file(self, table, path, columns=None, header=True, encoding='utf-8', options=None):
+        ''' Load a CSV file with the database's own bulk loader and return the number of rows loaded,
+            or None if it is not available. '''
+        return None
+
+    def _check_row_format(self, row_format):
+        ''' Return row_format if it is supported, raise BeeSQLError otherwise. '''
+        if row_format not in ROW_FORMATS:
+            raise BeeSQLError('Invalid row format: %s' % (row_format))
+        return row_format
+
+    def _converter(self, cursor, row_format=None):
+        ''' Return a function converting fetched row tuples of cursor's result to row_format,
+            the connection's row format if not provided. '''
+        if cursor.description is None:
+            return lambda rows: rows
+        if row_format is None:
+            row_format = self.row_format
+        else:
+            self._check_row_format(row_format)
+        return converter(row_format, cursor.description)
+
+    def add_hook(self, before=None, after=None):
+        ''' Register callbacks run around every statement.
+
+        Arguments:
+            :before: Optional, called as before(connection, sql, escapes) before a statement runs.
+            :after: Optional, called as after(connection, sql, escapes, elapsed, rows, error) after a statement
+                    ran or failed. elapsed is wall time in seconds, rows the number of rows returned or affected
+                    and error the raised exception or None. Streaming reads call it once all rows are read.
+
+        Returns:
+            Handle which can be passed to remove_hook. '''
+        hook = (before, after)
+        self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        ''' Unregister callbacks registered with add_hook. '''
+        self.hooks.remove(hook)
+
+    def _before(self, sql, escapes):
+        ''' Run before hooks and return start time of a statement. '''
+        for before, after in self.hooks:
+            if before is not None:
+                before(self, sql, escapes)
+        return time.time()
+
+    def _after(self, sql, escapes, start, rows, error=None):
+        ''' Run after hooks of a statement started at start. '''
+        elapsed = time.time() - start
+        for before, after in self.hooks:
+            if after is not None:
+                after(self, sql, escapes, elapsed, rows, error)
+
+    def enable_stats(self, slow_query_threshold=None, stats=None):
+        ''' Collect per statement shape counts and latency percentiles and log slow statements.
+
+        Arguments:
+            :slow_query_threshold (float): Optional, milliseconds above which a statement is logged
+                                           to the beesql.slow logger.
+            :stats: Optional, beesql.stats.QueryStats to record to, for example one shared by several connections.
+
+        Returns:
+            The beesql.stats.QueryStats. '''
+        if self.query_stats is not None:
+            self.disable_stats()
+        if stats is None:
+            stats = QueryStats(slow_query_threshold)
+        self.query_stats = stats
+        self._stats_hook = self.add_hook(after=stats.after)
+        return stats
+
+    def disable_stats(self):
+        ''' Stop collecting statistics. '''
+        if self.query_stats is not None:
+            self.remove_hook(self._stats_hook)
+            self.query_stats = None
+
+    def stats(self):
+        ''' Return snapshot of statement statistics as a dict mapping statement shape to count, errors, rows
+            and total, mean, min, max, p50, p95 and p99 latencies in milliseconds. Empty if stats are not enabled. '''
+        if self.query_stats is None:
+            return {}
+        return self.query_stats.snapshot()
+
+    def enable_index_advisor(self, large_table_rows=10000, advisor=None):
+        ''' Explain the first get, select, update and delete call of each table and where_conditions columns
+            shape, flag scans of large tables and collect the composite indexes which would cover the shapes.
+
+        Arguments:
+            :large_table_rows (int): Number of rows from which scanning a table is flagged.
+            :advisor: Optional, beesql.advisor.IndexAdvisor to record to, for example one shared by several connections.
+
+        Returns:
+            The beesql.advisor.IndexAdvisor. '''
+        if advisor is None:
+            advisor = IndexAdvisor(large_table_rows)
+        self.index_advisor = advisor
+        return advisor
+
+    def disable_index_advisor(self):
+        ''' Stop observing calls. '''
+        self.index_advisor = None
+
+    def index_advice(self):
+        ''' Return report of the index advisor, see beesql.advisor.IndexAdvisor.report. Empty if it is not enabled. '''
+        if self.index_advisor is None:
+            return {}
+        return self.index_advisor.report()
+
+    def _advise(self, table, where, where_conditions, sql, escapes):
+        ''' Record the where_conditions shape of a CRUD call with the index advisor if enabled. '''
+        if self.index_advisor is not None and where_conditions and not where:
+            self.index_advisor.observe(self, table, where_conditions.keys(), sql, escapes)
+
+    def _run_query(self, sql, escapes=None, row_format=None, cursor=None):
+        ''' Run provided query using implemented class's DB Cursor, or cursor if provided. Use Escape values if provided.
+            Return rows in row_format, the connection's row format if not provided. ''' 
+        if cursor is None:
+            self._check_fork()
+            cursor = self.cursor
+        if self.hooks:
+            start = self._before(sql, escapes)
+            try:
+                result = self._execute_query(cursor, sql, escapes, row_format)
+            except:
+                self._after(sql, escapes, start, None, sys.exc_info()[1])
+                raise
+            self._after(sql, escapes, start, len(result) if result else max(cursor.rowcount, 0))
+            return result
+        return self._execute_query(cursor, sql, escapes, row_format)
+
+    def _execute_query(self, cursor, sql, escapes=None, row_format=None):
+        ''' Run provided query using given DB Cursor, see _run_query. '''
         if not escapes:
-            self.cursor.execute(sql)
+            cursor.execute(sql)
+        else:
+            cursor.execute(sql, escapes)
+        if self.result_cache is not None:
+            self._note_write(sql)
+        self._autocommit(sql)
+        return self._converter(cursor, row_format)(cursor.fetchall())
+
+    def _inspect(self, sql, escapes=None, row_format=None):
+        ''' Run a statement reading a query plan, table statistics or the schema on a new cursor.
+            Unlike query it does not change lastsql, is not counted by the commit policy, does not commit
+            and does not run hooks, so that the index advisor can run it in the middle of other calls. '''
+        cursor = self._new_cursor()
+        try:
+            if not escapes:
+                cursor.execute(sql)
+            else:
+                cursor.execute(sql, escapes)
+            return self._converter(cursor, row_format)(cursor.fetchall())
+        except self.database_errors, e:
+            raise self._database_error(e)
+        finally:
+            cursor.close()
+
+    def _iter_batches(self, cursor, sql, escapes=None, batch_size=1000):
+        ''' Run provided query using given DB Cursor and yield lists of row tuples, fetching batch_size rows at a time. '''
+        if not self.hooks:
+            return self._fetch_batches(cursor, sql, escapes, batch_size)
+        return self._timed_batches(cursor, sql, escapes, batch_size)
+
+    def _timed_batches(self, cursor, sql, escapes=None, batch_size=1000):
+        ''' Yield batches of _fetch_batches, running hooks once all rows are read. '''
+        start = self._before(sql, escapes)
+        rows = 0
+        try:
+            for batch in self._fetch_batches(cursor, sql, escapes, batch_size):
+                rows += len(batch)
+                yield batch
+        except GeneratorExit:
+            self._after(sql, escapes, start, rows)
+            raise
+        except:
+            self._after(sql, escapes, start, rows, sys.exc_info()[1])
+            raise
+        self._after(sql, escapes, start, rows)
+
+    def _fetch_batches(self, cursor, sql, escapes=None, batch_size=1000):
+        ''' Generator of _iter_batches. '''
+        try:
+            if not escapes:
+                cursor.execute(sql)
+            else:
+                cursor.execute(sql, escapes)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+        self._autocommit(sql)
+
+    def _iter_query(self, cursor, sql, escapes=None, batch_size=1000, row_format=None):
+        ''' Run provided query using given DB Cursor and yield resulting rows in row_format,
+            fetching batch_size rows at a time. '''
+        convert = None
+        for rows in self._iter_batches(cursor, sql, escapes, batch_size):
+            if convert is None:
+                convert = self._converter(cursor, row_format)
+            for row in convert(rows):
+                yield row
+
+    def _iter_columns(self, cursor, sql, escapes=None, batch_size=1000, per_batch=True):
+        ''' Run provided query using given DB Cursor and yield a Columns mapping for each fetched batch,
+            or a single Columns mapping of the whole result if per_batch is False. '''
+        builder = None
+        for rows in self._iter_batches(cursor, sql, escapes, batch_size):
+            if builder is None or per_batch:
+                builder = ColumnBuilder(column_names(cursor.description))
+            builder.add(rows)
+            if per_batch:
+                yield builder.finish()
+        if not per_batch:
+            if builder is None:
+                builder = ColumnBuilder(column_names(cursor.description))
+            yield builder.finish()
+
+    def _run_many(self, sql, escapes_list, cursor=None):
+        ''' Run provided query once for each tuple of escape values using DB Cursor's executemany, or cursor's
+            if provided. Commit once for the whole batch and return number of affected rows. '''
+        if cursor is None:
+            self._check_fork()
+            cursor = self.cursor
+        if self.hooks:
+            start = self._before(sql, escapes_list)
+            try:
+                rowcount = self._execute_many(cursor, sql, escapes_list)
+            except:
+                self._after(sql, escapes_list, start, None, sys.exc_info()[1])
+                raise
+            self._after(sql, escapes_list, start, rowcount)
+            return rowcount
+        return self._execute_many(cursor, sql, escapes_list)
+
+    def _execute_many(self, cursor, sql, escapes_list):
+        ''' Run provided query for each tuple of escape values using given DB Cursor, see _run_many. '''
+        cursor.executemany(sql, escapes_list)
+        if self.result_cache is not None:
+            self._note_write(sql)
+        self._autocommit(sql)
+        return cursor.rowcount
+
+    def _row_tuples(self, rows, columns=None):
+        ''' Return columns and an iterator of escape value tuples for provided rows.
+            Rows are either dicts or tuples, columns are taken from the first row if not provided. '''
+        rows = iter(rows)
+        try:
+            first = next(rows)
+        except StopIteration:
+            return columns, iter(())
+        if columns is None:
+            if not isinstance(first, dict):
+                raise BeeSQLError('columns are required when rows are not dicts')
+            columns = tuple(first.keys())
+        rows = itertools.chain((first,), rows)
+        return columns, (tuple([row[column] for column in columns]) if isinstance(row, dict) else tuple(row) for row in rows)
+
+    def _key_columns(self, key_columns, columns):
+        ''' Return key_columns as a tuple, a single column name is accepted. Raise BeeSQLError if
+            a key column is not one of columns. '''
+        if isinstance(key_columns, basestring):
+            key_columns = (key_columns,)
+        key_columns = tuple(key_columns)
+        if not key_columns:
+            raise BeeSQLError('key_columns are required')
+        for column in key_columns:
+            if column not in columns:
+                raise BeeSQLError('Key column %s is not one of the columns' % (column))
+        return key_columns
+
+    def _existing_keys(self, table, key_columns, keys, placeholder, row_values=False):
+        ''' Return set of key tuples among keys which are present in table. Composite keys are matched with
+            a row value IN list if row_values is set, else with one OR'ed condition per key. '''
+        keys = list(set(keys))
+        if len(key_columns) == 1:
+            where = '%s IN (%s)' % (key_columns[0], ', '.join([placeholder] * len(keys)))
+            escapes = tuple([key[0] for key in keys])
+        elif row_values:
+            row = '(%s)' % ', '.join([placeholder] * len(key_columns))
+            where = '(%s) IN (VALUES %s)' % (', '.join(key_columns), ', '.join([row] * len(keys)))
+            escapes = tuple(itertools.chain.from_iterable(keys))
+        else:
+            condition = '(%s)' % ' AND '.join(['%s=%s' % (column, placeholder) for column in key_columns])
+            where = ' OR '.join([condition] * len(keys))
+            escapes = tuple(itertools.chain.from_iterable(keys))
+        sql = 'SELECT %s FROM %s WHERE %s' % (', '.join(key_columns), table, where)
+        return set(self.query(sql, escapes, row_format='tuple'))
+
+    def _upsert_counts(self, keys, existing):
+        ''' Return (inserted, updated) counts of upserting rows with keys in order, given keys already present.
+            A key repeated within keys updates the row inserted by its first occurrence. '''
+        inserted = 0
+        seen = set(existing)
+        for key in keys:
+            if key not in seen:
+                inserted += 1
+                seen.add(key)
+        return inserted, len(keys) - inserted
+
+    def _update_batches(self, rows, key_columns, columns=None, chunk_size=500):
+        ''' Yield (update_columns, keys, values) batches of up to chunk_size rows which update the same columns,
+            in row order. keys are tuples of key column values and values tuples of updated column values.
+            Rows are dicts, or tuples when columns are provided. '''
+        if isinstance(key_columns, basestring):
+            key_columns = (key_columns,)
+        if columns is not None:
+            update_columns = tuple([column for column in columns if column not in key_columns])
+            self._key_columns(key_columns, columns)
+            key_indexes = [list(columns).index(column) for column in key_columns]
+            value_indexes = [list(columns).index(column) for column in update_columns]
+        batch_columns, keys, values = None, [], []
+        for row in rows:
+            if isinstance(row, dict):
+                row_columns = update_columns if columns is not None else tuple(sorted([column for column in row if column not in key_columns]))
+                try:
+                    key = tuple([row[column] for column in key_columns])
+                    value = tuple([row[column] for column in row_columns])
+                except KeyError, ke:
+                    raise BeeSQLError('Row is missing column %s' % (ke))
+            elif columns is None:
+                raise BeeSQLError('columns are required when rows are not dicts')
+            else:
+                row_columns = update_columns
+                key = tuple([row[index] for index in key_indexes])
+                value = tuple([row[index] for index in value_indexes])
+            if not row_columns:
+                raise BeeSQLError('Row has no columns to update')
+            if row_columns != batch_columns or len(keys) >= chunk_size:
+                if keys:
+                    yield batch_columns, keys, values
+                batch_columns, keys, values = row_columns, [], []
+            keys.append(key)
+            values.append(value)
+        if keys:
+            yield batch_columns, keys, values
+
+    def _unique_keys(self, values):
+        ''' Return values without duplicates, in order of first occurrence. '''
+        seen = set()
+        keys = []
+        for value in values:
+            if value not in seen:
+                seen.add(value)
+                keys.append(value)
+        return keys
+
+    def _select_columns(self, key_columns, columns=None, alias=None):
+        ''' Return select list of columns, prefixed with alias if provided. Missing key columns,
+            a column name or a tuple of column names, are added. '''
+        prefix = alias + '.' if alias else ''
+        if not columns:
+            return prefix + '*'
+        if isinstance(columns, basestring):
+            columns = (columns,)
+        if isinstance(key_columns, basestring):
+            key_columns = (key_columns,)
+        columns = list(columns)
+        columns.extend([column for column in key_columns if column not in columns])
+        return ', '.join([prefix + name for name in columns])
+
+    def _keyed_rows(self, rows, sql, escapes, column, row_format=None):
+        ''' Run provided query and add resulting rows to dict rows keyed on column's value.
+            Rows are read as tuples and converted to row_format once keyed. '''
+        result = self.query(sql, escapes, row_format='tuple')
+        if not result:
+            return rows
+        index = list(column_names(self.cursor.description)).index(column)
+        for key, row in zip([row[index] for row in result], self._converter(self.cursor, row_format)(result)):
+            rows[key] = row
+        return rows
+
+    def _paginate(self, placeholder, table, columns=None, key='id', page_size=10000, descending=False, after=None,
+                  where=None, row_format=None, where_conditions=None):
+        ''' Yield Pages of rows of table in key order, each read by seeking past the last key of the previous page.
+            placeholder is the escape value placeholder of the backend, see paginate of backends. '''
+        if isinstance(key, basestring):
+            key = (key,)
+        key = tuple(key)
+        select = 'SELECT %s FROM %s' % (self._select_columns(key, columns), table)
+        conditions, escapes = self._conditions(placeholder, where, where_conditions)
+        order = ' ORDER BY %s LIMIT %d' % (', '.join(['%s %s' % (column, 'DESC' if descending else 'ASC') for column in key]),
+                                          page_size)
+        last = decode_cursor(after, len(key), descending) if after is not None else None
+        while True:
+            page_conditions, page_escapes = list(conditions), list(escapes)
+            if last is not None:
+                seek_sql, seek_escapes = self._seek_condition(key, last, descending, placeholder)
+                page_conditions.append(seek_sql)
+                page_escapes.extend(seek_escapes)
+            sql = select
+            if page_conditions:
+                sql = sql + ' WHERE ' + ' AND '.join(page_conditions)
+            result = self.query(sql + order, tuple(page_escapes) or None, row_format='tuple')
+            if not result:
+                return
+            names = list(column_names(self.cursor.description))
+            last = tuple([result[-1][names.index(column)] for column in key])
+            page = Page(self._converter(self.cursor, row_format)(result))
+            page.cursor = encode_cursor(last, descending)
+            yield page
+            if len(result) < page_size:
+                return
+
+    def _conditions(self, placeholder, where=None, where_conditions=None):
+        ''' Return list of where conditions, where if provided or else one per where_conditions pair,
+            and list of their escape values. '''
+        if where:
+            return ['(%s)' % (where)], []
+        conditions = []
+        escapes = []
+        for name, value in (where_conditions or {}).items():
+            conditions.append('%s=%s' % (name, placeholder))
+            escapes.append(value)
+        return conditions, escapes
+
+    def _seek_condition(self, key, last, descending, placeholder):
+        ''' Return condition selecting rows after key values last in key order, and its escape values.
+            The leading key column is also bounded on its own so that the condition is an index range. '''
+        operator = '<' if descending else '>'
+        if len(key) == 1:
+            return '%s %s %s' % (key[0], operator, placeholder), [last[0]]
+        alternatives = []
+        escapes = [last[0]]
+        for position in range(len(key)):
+            equal = ['%s = %s' % (column, placeholder) for column in key[:position]]
+            alternatives.append('(%s)' % ' AND '.join(equal + ['%s %s %s' % (key[position], operator, placeholder)]))
+            escapes.extend(last[:position + 1])
+        sql = '%s %s= %s AND (%s)' % (key[0], operator, placeholder, ' OR '.join(alternatives))
+        return sql, escapes
+
+    def _note_write(self, sql):
+        ''' Remember tables changed by sql so that their cached results are invalidated on commit. '''
+        if self._written is None:
+            return
+        tables = written_tables(sql)
+        if tables is None:
+            self._written = None
+        else:
+            self._written.update(tables)
+
+    def _cached_query(self, table, sql, escapes=None, row_format=None):
+        ''' Run provided query reading from table, using the result cache if enabled.
+            Results are tagged with every table the statement reads, so that writes to joined tables
+            and tables of subqueries invalidate them too. The cache is bypassed while there are
+            uncommitted writes. '''
+        if self.result_cache is None or self.in_transaction or self._written != set():
+            return self.query(sql, escapes, row_format)
+        key = (sql, escapes, row_format or self.row_format)
+        try:
+            result = self.result_cache.get(key)
+        except TypeError:
+            # Unhashable escape values can not be cached.
+            return self.query(sql, escapes, row_format)
+        if result is None:
+            result = self.query(sql, escapes, row_format)
+            self.result_cache.put(key, result, read_tables(sql) or [table])
         else:
-            self.cursor.execute(sql, escapes)
-        if not self.transaction:
-            self.db_connection.commit()
-        return self.cursor.fetchall()
+            self.last_sql = sql
+            self.last_escapes = escapes
+        return result
+
+    def enable_result_cache(self, max_entries=1024, max_bytes=None, ttl=None, table_ttls=None):
+        ''' Cache results of get and select. Writes made through this connection invalidate
+            cached results of the written tables.
+
+        Arguments:
+            :max_entries (int): Maximum number of cached results.
+            :max_bytes (int): Optional, maximum approximate size of cached results in bytes.
+            :ttl (float): Optional, seconds a result stays valid; Default to until invalidated.
+            :table_ttls (dict): Optional, ttl per table overriding ttl.
+
+        Returns:
+            The beesql.cache.ResultCache, its stats method reports hit ratio, evictions and bytes held. '''
+        self.result_cache = ResultCache(max_entries, max_bytes, ttl, table_ttls)
+        return self.result_cache
+
+    def _autocommit(self, sql):
+        ''' Commit after statement sql run outside transaction mode according to the commit policy.
+            Only statements which may write are counted. The interval is checked whenever a statement runs,
+            there is no timer: writes of a burst stay uncommitted until the next statement, flush or close. '''
+        if self.in_transaction:
+            return
+        if self.commit_every is None and self.commit_interval is None:
+            self.commit()
+            return
+        if written_tables(sql) != []:
+            self._pending += 1
+        if self._pending and ((self.commit_every is not None and self._pending >= self.commit_every) or
+            (self.commit_interval is not None and (time.time() - self._last_commit) * 1000 >= self.commit_interval)):
+            self.commit()
+
+    def flush(self):
+        ''' Commit statements held back by the commit policy. '''
+        if self._pending:
+            self.commit()
+
+    @contextlib.contextmanager
+    def batched_commits(self, commit_every=None, commit_interval=None):
+        ''' Context manager applying a commit policy within the block and committing on exit.
+
+        Arguments:
+            :commit_every (int): Commit once every commit_every writing statements.
+            :commit_interval (float): Commit once at least commit_interval milliseconds passed since last commit,
+                                      checked whenever a statement runs.
+
+        Example::
+
+            with connection.batched_commits(commit_every=1000):
+                for row in rows:
+                    connection.insert('beesql_downloads', **row) '''
+        policy = self.commit_every, self.commit_interval
+        self.commit_every, self.commit_interval = commit_every, commit_interval
+        try:
+            yield self
+        finally:
+            self.commit_every, self.commit_interval = policy
+            self.flush()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        ''' Context manager running the block in a transaction. The transaction is committed
+            if the block succeeds and rolled back if it raises. Nested blocks join the outer transaction.
+
+        Example::
+
+            with connection.transaction():
+                connection.update('beesql_version', {'release_manager': 'John Doe'}, version='0.1')
+                connection.delete('beesql_version', version='0.0') '''
+        if self.in_transaction:
+            yield self
+            return
+        self.transaction_on()
+        try:
+            yield self
+        except:
+            self.rollback()
+            raise
+        else:
+            self.commit()
+        finally:
+            self.transaction_off()
 
     def commit(self):
         ''' Commit a transaction. '''
+        self._check_fork()
         self.db_connection.commit()
+        self._pending = 0
+        self._last_commit = time.time()
+        if self.result_cache is not None and self._written != set():
+            if self._written is None:
+                self.result_cache.invalidate()
+            else:
+                for table in self._written:
+                    self.result_cache.invalidate(table)
+            self._written = set()
 
     def rollback(self):
         ''' Rollback a transaction. '''
+        self._check_fork()
         self.db_connection.rollback()
+        self._pending = 0
+        self._written = set()
 
     def transaction_on(self):
-        ''' Set transaction mode on. '''
-        self.transaction = True
+        ''' Set transaction mode on. Statements held back by the commit policy are committed first. '''
+        self.flush()
+        self.in_transaction = True
 
     def transaction_off(self):
         ''' Set transaction mode off. '''
-        self.transaction = False
+        self.in_transaction = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
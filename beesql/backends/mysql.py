@@ -5,51 +5,162 @@
 # Author: Kasun Herath <kasunh01@gmail.com>
 # Source: https://github.com/kasun/BeeSQL
 
+import contextlib
+import csv
+import itertools
+import logging
+
 import pymysql
+import pymysql.cursors
 
 from base import BeeSQLBaseConnection
 from beesql import BeeSQLError
 from beesql import BeeSQLDatabaseError
+from beesql.prepared import PreparedStatement
+from beesql.utils import chunks
+
+# Unbuffered cursors were added in PyMySQL 0.6, older releases only read whole results.
+SSCursor = getattr(pymysql.cursors, 'SSCursor', None)
+# Logger used when results can not be streamed.
+driver_log = logging.getLogger('beesql.mysql')
+# EXPLAIN access types reading a whole table or index.
+SCAN_TYPES = ('ALL', 'index')
+# Error codes from 2000 are client errors, such as 2006 server has gone away and 2013 lost connection.
+CLIENT_ERRORS = 2000
 
 class MYSQLConnection(BeeSQLBaseConnection):
     ''' MySQL Database Connection. '''
-    def __init__(self, username, password, host='localhost', port=3306, db=None, unix_socket=None):
-        ''' Initialize MysqlConnection. Initialize BaseConnection, register database connection and cursor.
-            If db is specified issue a use query. '''
-        BeeSQLBaseConnection.__init__(self)
+    # Driver errors raised as BeeSQLDatabaseError.
+    database_errors = pymysql.err.DatabaseError
+    # Driver errors of failed or lost connections which are raised as they are.
+    connection_errors = (pymysql.err.InterfaceError,)
+    # Escape value placeholder.
+    placeholder = '%s'
+    # Set once the missing unbuffered cursor was logged.
+    _warned_buffered = False
+
+    def __init__(self, username, password, host='localhost', port=3306, db=None, unix_socket=None, lazy=False,
+                 local_infile=False, **options):
+        ''' Initialize MysqlConnection. Initialize BaseConnection with options and connect, unless lazy is True
+            in which case the connection is made on first use. local_infile allows load to use
+            LOAD DATA LOCAL INFILE, it requires a PyMySQL release supporting it and the server's local_infile. '''
+        BeeSQLBaseConnection.__init__(self, **options)
         if (not username or password is None):
             raise BeeSQLError('Engine mysql requires username and password')
+        self.connect_args = dict(username=username, password=password, host=host, port=port, db=db, unix_socket=unix_socket,
+                                 local_infile=local_infile)
+        self._max_allowed_packet = None
+        if not lazy:
+            self._connect()
+
+    def _connect(self):
+        ''' Connect to the server, register database connection and cursor. If db is specified issue a use query. '''
+        args = self.connect_args
+        # Older PyMySQL releases do not accept local_infile, it is passed only when requested.
+        extra = dict(local_infile=True) if args['local_infile'] else {}
         try:
-            if not unix_socket:
-                self.db_connection = pymysql.connect(user=username, passwd=password, host=host, port=port)
+            if not args['unix_socket']:
+                self.db_connection = pymysql.connect(user=args['username'], passwd=args['password'], host=args['host'],
+                                                     port=args['port'], **extra)
             else:
-                self.db_connection = pymysql.connect(user=username, passwd=password, unix_socket=unix_socket)
-            self.cursor = self.db_connection.cursor(pymysql.cursors.DictCursor)
-            if db and db != '':
-                self.cursor.execute('use %s' % (db))
+                self.db_connection = pymysql.connect(user=args['username'], passwd=args['password'],
+                                                     unix_socket=args['unix_socket'], **extra)
+            self.cursor = self.db_connection.cursor()
+            if args['db'] and args['db'] != '':
+                self.cursor.execute('use %s' % (args['db']))
         except pymysql.err.DatabaseError, de:
-            raise BeeSQLDatabaseError(str(de))
+            raise self._database_error(de)
 
-    def query(self, sql, escapes=None):
+    def query(self, sql, escapes=None, row_format=None):
         """Run provided query.
 
         Arguments:
             :sql (str): Query to run.
             :escapes: Optional, A tuple of escape values to escape provided sql.
+            :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the connection's row format.
+
+        Returns:
+            List of rows, dictionaries unless another row format is used.
+
+        Raises:
+            BeeSQLDatabaseError. """
+        try:
+            self.last_sql = sql
+            self.last_escapes = escapes
+            return self._run_query(sql, escapes, row_format)
+        except pymysql.err.DatabaseError, de:
+            raise self._database_error(de)
+
+    def iter_query(self, sql, escapes=None, batch_size=1000, row_format=None, as_columns=False):
+        """Run provided query and iterate over resulting rows using an unbuffered server side cursor,
+        fetching batch_size rows at a time. The connection can not run other queries until the
+        returned generator is exhausted or closed. Streaming needs PyMySQL 0.6 or later, with older
+        releases the whole result is read and a warning is logged to the beesql.mysql logger.
+
+        Arguments:
+            :sql (str): Query to run.
+            :escapes: Optional, A tuple of escape values to escape provided sql.
+            :batch_size (int): Number of rows fetched from the cursor at once.
+            :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the connection's row format.
+            :as_columns (bool): Yield a mapping of column name to numpy array (array.array without numpy) per batch instead of rows.
+
+        Returns:
+            Generator of rows, dictionaries unless another row format is used.
+
+        Raises:
+            BeeSQLDatabaseError. """
+        try:
+            self.last_sql = sql
+            self.last_escapes = escapes
+            cursor = self._unbuffered_cursor()
+            if as_columns:
+                results = self._iter_columns(cursor, sql, escapes, batch_size)
+            else:
+                results = self._iter_query(cursor, sql, escapes, batch_size, row_format)
+            for result in results:
+                yield result
+        except pymysql.err.DatabaseError, de:
+            raise self._database_error(de)
+
+    def query_columns(self, sql, escapes=None, batch_size=1000):
+        """Run provided query and return the result as columns, filled from the cursor batch_size rows at a time.
+
+        Arguments:
+            :sql (str): Query to run.
+            :escapes: Optional, A tuple of escape values to escape provided sql.
+            :batch_size (int): Number of rows fetched from the cursor at once.
 
         Returns:
-            Tuple of dictionaries representing rows.
+            beesql.columns.Columns, a mapping of column name to numpy array, or to array.array
+            (list for non numeric columns) when numpy is not installed. NULL values are flagged in its masks.
 
         Raises:
             BeeSQLDatabaseError. """
         try:
             self.last_sql = sql
             self.last_escapes = escapes
-            return self._run_query(sql, escapes)
+            return next(self._iter_columns(self._unbuffered_cursor(), sql, escapes, batch_size, per_batch=False))
         except pymysql.err.DatabaseError, de:
-            raise BeeSQLDatabaseError(str(de))
+            raise self._database_error(de)
+
+    def prepare(self, sql):
+        """ Prepare a statement to be executed many times on a cursor of its own.
+            PyMySQL interpolates escape values on the client, the statement is not prepared on the server.
+
+        Arguments:
+            :sql (str): Statement using %s placeholders.
 
-    def get(self, table, where=None, **where_conditions):
+        Returns:
+            beesql.prepared.PreparedStatement.
+
+        Example::
+
+            statement = connection.prepare('SELECT * FROM beesql_version WHERE version = %s')
+            rows = statement.execute(('0.1',))
+            statement.close() """
+        return PreparedStatement(self, sql, self._new_cursor())
+
+    def get(self, table, where=None, row_format=None, explain=False, **where_conditions):
         ''' Retrieve a single row.
 
         Arguments:
@@ -57,28 +168,108 @@ class MYSQLConnection(BeeSQLBaseConnection):
             :where (str): Optional where conditional clause as a string.
             :where_conditions: Optional, condition pairs to contruct where conditional clause.
                                 if where is not provided.
+            :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the connection's row format.
+            :explain (bool): Return the query plan of the statement instead of running it, see explain.
 
         Returns:
-            A dict representing a single Row.
+            A dict representing a single Row, unless another row format is used.
 
         Raises:
             BeeSQLDatabaseError. '''
 
-        sql = 'SELECT * FROM %s' % table
         escapes= None
-        if where:
-            sql = sql + ' WHERE %s' % where
-        elif where_conditions:
-            sql = sql + ' WHERE ' + ' AND '.join([k + '=%s' for k in where_conditions.keys()])
+        if not where and where_conditions:
             escapes = tuple(where_conditions.values())
-        sql = sql + ' LIMIT 1'
-        result = self.query(sql, escapes)
+        key = ('get', table, where, tuple(where_conditions))
+        sql = self.statement_cache.get(key)
+        if sql is None:
+            sql = 'SELECT * FROM %s' % table
+            if where:
+                sql = sql + ' WHERE %s' % where
+            elif where_conditions:
+                sql = sql + ' WHERE ' + ' AND '.join([k + '=%s' for k in where_conditions.keys()])
+            sql = sql + ' LIMIT 1'
+            self.statement_cache.put(key, sql)
+        if explain:
+            return self.explain(sql, escapes)
+        self._advise(table, where, where_conditions, sql, escapes)
+        result = self._cached_query(table, sql, escapes, row_format)
         if result:
             return result[0]
         return None
 
+    @property
+    def max_allowed_packet(self):
+        ''' Return maximum size of a statement accepted by the server in bytes, queried once. '''
+        if self._max_allowed_packet is None:
+            self._max_allowed_packet = int(self.query('SELECT @@max_allowed_packet', row_format='tuple')[0][0])
+        return self._max_allowed_packet
+
+    def _key_chunks(self, keys, size):
+        ''' Yield lists of keys whose escaped values fit in size bytes. '''
+        chunk, used = [], 0
+        for key in keys:
+            # Escaping at most doubles a string, quotes and separator add 4 bytes.
+            length = len(key) * 2 + 4 if isinstance(key, basestring) else len(str(key)) + 2
+            if chunk and used + length > size:
+                yield chunk
+                chunk, used = [], 0
+            chunk.append(key)
+            used += length
+        if chunk:
+            yield chunk
+
+    def get_many(self, table, column, values, columns=None, row_format=None, temp_table_threshold=100000):
+        ''' Retrieve rows whose column matches any of values, in as few statements as possible.
+            Values are looked up in IN lists sized to fit max_allowed_packet, or joined through a
+            temporary table when there are more than temp_table_threshold distinct values.
+
+        Arguments:
+            :table (str): Table to retrieve from.
+            :column (str): Column to match, expected to be unique.
+            :values: Iterable of values to look up, duplicates are looked up once.
+            :columns: Optional, tuple of columns to retrieve; Default to all. column is added if missing.
+            :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the connection's row format.
+            :temp_table_threshold (int): Number of distinct values above which a temporary table is used.
+
+        Returns:
+            Dict mapping found values to their row. Values without a row are missing from the dict.
+
+        Raises:
+            BeeSQLDatabaseError.
+
+        Example::
+
+            connection.get_many('beesql_version', 'id', [1, 2, 3])
+            sql - SELECT * FROM beesql_version WHERE id IN (%s, %s, %s) '''
+
+        keys = self._unique_keys(values)
+        rows = {}
+        if not keys:
+            return rows
+        try:
+            if len(keys) > temp_table_threshold:
+                # The temporary table copies the type of column.
+                self.query('CREATE TEMPORARY TABLE beesql_get_many SELECT %s AS value FROM %s LIMIT 0' % (column, table))
+                try:
+                    self.insert_many('beesql_get_many', [(key,) for key in keys], ('value',))
+                    sql = 'SELECT %s FROM beesql_get_many AS k JOIN %s AS t ON t.%s = k.value' % (
+                          self._select_columns(column, columns, 't'), table, column)
+                    return self._keyed_rows(rows, sql, None, column, row_format)
+                finally:
+                    self.query('DROP TEMPORARY TABLE IF EXISTS beesql_get_many')
+            select = 'SELECT %s FROM %s WHERE %s IN ' % (self._select_columns(column, columns), table, column)
+            # Leave room for the rest of the statement and the packet header.
+            size = self.max_allowed_packet - len(select) - 1024
+            for chunk in self._key_chunks(keys, size):
+                self._keyed_rows(rows, select + '(%s)' % ', '.join(['%s'] * len(chunk)), tuple(chunk), column, row_format)
+        except pymysql.err.DatabaseError, de:
+            raise self._database_error(de)
+        return rows
+
     def select(self, table, columns=None, distinct=False, where=None, group_by=None, group_by_asc=True, having=None, 
-                order_by=None, order_by_asc=True, limit=False, **where_conditions):
+                order_by=None, order_by_asc=True, limit=False, row_format=None, as_columns=False, explain=False,
+                **where_conditions):
         """Select columns from table.
 
         Arguments:
@@ -93,9 +284,12 @@ class MYSQLConnection(BeeSQLBaseConnection):
             :limit (int): Optional, Limit results to provided number of rows.
             :where_conditions: Optional, condition pairs to contruct where conditional clause 
                                     if where is not provided. 
+            :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the connection's row format.
+            :as_columns (bool): Return a mapping of column name to numpy array (array.array without numpy) instead of rows.
+            :explain (bool): Return the query plan of the statement instead of running it, see explain.
 
         Returns:
-            Tuple of dicts representing rows.
+            List of rows, dicts unless another row format is used.
 
         Raises:
             BeeSQLDatabaseError.
@@ -111,8 +305,51 @@ class MYSQLConnection(BeeSQLBaseConnection):
             connection.select('beesql_version', release_year=2012, release_manager='John Doe')
             sql - SELECT * FROM beesql_version WHERE release_year=2012 AND release_manager='John Doe' """
 
-        sql = 'SELECT '
+        sql, escapes = self._select_sql(table, columns, distinct, where, group_by, group_by_asc, having,
+                                        order_by, order_by_asc, limit, where_conditions)
+        if explain:
+            return self.explain(sql, escapes)
+        self._advise(table, where, where_conditions, sql, escapes)
+        if as_columns:
+            return self.query_columns(sql, escapes)
+        try:
+            return self._cached_query(table, sql, escapes, row_format)
+        except pymysql.err.DatabaseError, de:
+            raise self._database_error(de)
+
+    def iter_select(self, table, columns=None, distinct=False, where=None, group_by=None, group_by_asc=True, having=None,
+                order_by=None, order_by_asc=True, limit=False, batch_size=1000, row_format=None, as_columns=False,
+                **where_conditions):
+        """Select columns from table and iterate over rows using an unbuffered server side cursor.
+
+        Accepts the same arguments as select, with as_columns a columns mapping is yielded per batch.
+        The connection can not run other queries until the returned generator is exhausted or closed.
+
+        Arguments:
+            :batch_size (int): Number of rows fetched from the cursor at once.
+
+        Returns:
+            Generator of rows, dicts unless another row format is used.
+
+        Raises:
+            BeeSQLDatabaseError. """
+
+        sql, escapes = self._select_sql(table, columns, distinct, where, group_by, group_by_asc, having,
+                                        order_by, order_by_asc, limit, where_conditions)
+        return self.iter_query(sql, escapes, batch_size, row_format, as_columns)
+
+    def _select_sql(self, table, columns, distinct, where, group_by, group_by_asc, having, order_by, order_by_asc,
+                    limit, where_conditions):
+        ''' Build select statement, return sql and escape values. '''
         escapes= None
+        if not where and where_conditions:
+            escapes = tuple(where_conditions.values())
+        key = ('select', table, columns, distinct, where, group_by, group_by_asc, having, order_by, order_by_asc,
+               limit, tuple(where_conditions))
+        sql = self.statement_cache.get(key)
+        if sql is not None:
+            return sql, escapes
+        sql = 'SELECT '
         if distinct:
             sql = sql + 'DISTINCT '
         if columns:
@@ -128,7 +365,6 @@ class MYSQLConnection(BeeSQLBaseConnection):
             sql = sql + ' WHERE %s' % (where)
         elif where_conditions:
             sql = sql + ' WHERE ' + ' AND '.join([k + '=%s' for k in where_conditions.keys()])
-            escapes = tuple(where_conditions.values())
         if group_by:
             sql = sql + ' GROUP BY '
             if type(group_by) is tuple:
@@ -149,10 +385,40 @@ class MYSQLConnection(BeeSQLBaseConnection):
                 sql = sql + ' DESC'
         if limit:
             sql = sql + ' LIMIT %s' % (limit)
-        try:
-            return self.query(sql, (escapes))
-        except pymysql.err.DatabaseError, de:
-            raise BeeSQLDatabaseError(str(de))
+        self.statement_cache.put(key, sql)
+        return sql, escapes
+
+    def paginate(self, table, columns=None, key='id', page_size=10000, descending=False, after=None, where=None,
+                 row_format=None, **where_conditions):
+        ''' Iterate over rows of table in pages of page_size rows ordered by key. Each page is read with
+            WHERE key > last key of previous page ORDER BY key LIMIT page_size, so pages are read from an
+            index on key equally fast however deep the scan is.
+
+        Arguments:
+            :table (str): Table to read.
+            :columns: Optional, tuple of columns to retrieve; Default to all. Key columns are added if missing.
+            :key: Column name or tuple of column names, unique and not NULL, to order and seek pages by; Default to id.
+            :page_size (int): Number of rows per page.
+            :descending (bool): Iterate in descending key order.
+            :after: Optional, cursor token of a page to continue after.
+            :where: Optional, where conditional clause as a string.
+            :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the connection's row format.
+            :where_conditions: Optional, condition pairs to contruct where conditional clause if where is not provided.
+
+        Returns:
+            Generator of pages, lists of rows whose cursor attribute is a token to continue after the page.
+
+        Raises:
+            BeeSQLError, BeeSQLDatabaseError.
+
+        Example::
+
+            for page in connection.paginate('beesql_downloads', key=('day', 'id'), page_size=1000, release='0.1'):
+                process(page)
+                save(page.cursor)
+            sql - SELECT * FROM beesql_downloads WHERE release=%s AND day >= %s AND ((day > %s) OR (day = %s AND id > %s))
+                  ORDER BY day ASC, id ASC LIMIT 1000 '''
+        return self._paginate('%s', table, columns, key, page_size, descending, after, where, row_format, where_conditions)
 
     def insert(self, table, **values):
         ''' Insert values into table.
@@ -170,13 +436,120 @@ class MYSQLConnection(BeeSQLBaseConnection):
             SQL:  INSERT INTO beesql_version (version, release_manager) VALUES ('0.1', 'Kasun Herath') '''
 
         try:
-            sql = "INSERT INTO %s (%s) VALUES (%s)" % (table, ', '.join([columnname for columnname in values.keys()]), ', '.join(['%s' for columnname in values.values()]))
+            key = ('insert', table, tuple(values))
+            sql = self.statement_cache.get(key)
+            if sql is None:
+                sql = "INSERT INTO %s (%s) VALUES (%s)" % (table, ', '.join([columnname for columnname in values.keys()]), ', '.join(['%s' for columnname in values.values()]))
+                self.statement_cache.put(key, sql)
             escapes = tuple(values.values())
             self.query(sql, escapes)
         except pymysql.err.DatabaseError, de:
-            raise BeeSQLDatabaseError(str(de))
+            raise self._database_error(de)
+
+    def insert_many(self, table, rows, columns=None, chunk_size=500):
+        ''' Insert multiple rows into table using multi-row VALUES statements, one statement and commit per chunk.
 
-    def update(self, table, updated_values, where=None, limit=None, **where_conditions):
+        Arguments:
+            :table (str): Table to be inserted into.
+            :rows: Iterable of dicts or tuples representing rows.
+            :columns: Optional, tuple of column names. Required when rows are tuples,
+                      if not provided columns of the first row are used.
+            :chunk_size (int): Number of rows sent in a single statement. Keep the statement below max_allowed_packet.
+
+        Returns:
+            Number of inserted rows.
+
+        Raises:
+            BeeSQLError, BeeSQLDatabaseError.
+
+        Example::
+
+            connection.insert_many('beesql_version', [('0.1', 'Kasun Herath'), ('0.2', 'John Doe')], ('version', 'release_manager'))
+            sql - INSERT INTO beesql_version (version, release_manager) VALUES (%s, %s), (%s, %s) '''
+
+        columns, escapes_list = self._row_tuples(rows, columns)
+        if not columns:
+            return 0
+        sql = "INSERT INTO %s (%s) VALUES " % (table, ', '.join(columns))
+        row_sql = '(%s)' % ', '.join(['%s'] * len(columns))
+        # Statement for a full chunk is built once, only a trailing partial chunk needs its own.
+        chunk_sql = sql + ', '.join([row_sql] * chunk_size)
+        inserted = 0
+        try:
+            for chunk in chunks(escapes_list, chunk_size):
+                if len(chunk) != chunk_size:
+                    chunk_sql = sql + ', '.join([row_sql] * len(chunk))
+                self.query(chunk_sql, tuple(itertools.chain.from_iterable(chunk)))
+                inserted += self.cursor.rowcount
+        except pymysql.err.DatabaseError, de:
+            raise self._database_error(de)
+        return inserted
+
+    def upsert_many(self, table, rows, key_columns, update_columns=None, columns=None, chunk_size=500, count_existing=False):
+        ''' Insert multiple rows into table, updating rows whose key already exists, using multi-row
+            INSERT ... ON DUPLICATE KEY UPDATE statements, one statement and commit per chunk.
+
+        Arguments:
+            :table (str): Table to be upserted into.
+            :rows: Iterable of dicts or tuples representing rows.
+            :key_columns: Column name or tuple of column names of the PRIMARY or UNIQUE key identifying a row.
+            :update_columns: Optional, tuple of columns updated when a row exists; Default to all columns but
+                             key_columns. When empty existing rows are left untouched.
+            :columns: Optional, tuple of column names. Required when rows are tuples,
+                      if not provided columns of the first row are used.
+            :chunk_size (int): Number of rows sent in a single statement. Keep the statement below max_allowed_packet.
+            :count_existing (bool): Look up the keys of each chunk before writing it to count inserted and updated
+                                    rows. This costs a SELECT per chunk, and keys written by other connections in
+                                    between are miscounted.
+
+        Returns:
+            Dict of affected rows as reported by MySQL, 1 per inserted row, 2 per updated row and 0 per existing
+            row left unchanged (1 with the CLIENT_FOUND_ROWS flag, which BeeSQL connections do not set). With
+            count_existing also inserted and updated row counts, rows are counted as updated when their key was
+            present before their chunk was written.
+
+        Raises:
+            BeeSQLError, BeeSQLDatabaseError.
+
+        Example::
+
+            connection.upsert_many('beesql_version', [(1, '0.1'), (2, '0.2')], 'id', columns=('id', 'version'))
+            sql - INSERT INTO beesql_version (id, version) VALUES (%s, %s), (%s, %s) ON DUPLICATE KEY UPDATE version=VALUES(version) '''
+
+        columns, escapes_list = self._row_tuples(rows, columns)
+        counts = dict(affected=0)
+        if count_existing:
+            counts.update(inserted=0, updated=0)
+        if not columns:
+            return counts
+        key_columns = self._key_columns(key_columns, columns)
+        if update_columns is None:
+            update_columns = [column for column in columns if column not in key_columns]
+        key_indexes = [list(columns).index(column) for column in key_columns]
+        sql = "INSERT INTO %s (%s) VALUES " % (table, ', '.join(columns))
+        row_sql = '(%s)' % ', '.join(['%s'] * len(columns))
+        if update_columns:
+            update_sql = ' ON DUPLICATE KEY UPDATE %s' % ', '.join(['%s=VALUES(%s)' % (column, column) for column in update_columns])
+        else:
+            # Assigning a key column to itself leaves existing rows untouched without ignoring other errors.
+            update_sql = ' ON DUPLICATE KEY UPDATE %s=%s' % (key_columns[0], key_columns[0])
+        chunk_sql = sql + ', '.join([row_sql] * chunk_size) + update_sql
+        try:
+            for chunk in chunks(escapes_list, chunk_size):
+                if count_existing:
+                    keys = [tuple([row[index] for index in key_indexes]) for row in chunk]
+                    inserted, updated = self._upsert_counts(keys, self._existing_keys(table, key_columns, keys, '%s'))
+                    counts['inserted'] += inserted
+                    counts['updated'] += updated
+                if len(chunk) != chunk_size:
+                    chunk_sql = sql + ', '.join([row_sql] * len(chunk)) + update_sql
+                self.query(chunk_sql, tuple(itertools.chain.from_iterable(chunk)))
+                counts['affected'] += max(self.cursor.rowcount, 0)
+        except pymysql.err.DatabaseError, de:
+            raise self._database_error(de)
+        return counts
+
+    def update(self, table, updated_values, where=None, limit=None, explain=False, **where_conditions):
         ''' Update table with provided updated values.
 
         Arguments:
@@ -186,6 +559,7 @@ class MYSQLConnection(BeeSQLBaseConnection):
             :limit (int): Optional, used to limit the number of rows to be updated.
             :where_conditions: Optional, condition pairs to contruct where conditional clause
                               if where is not provided. 
+            :explain (bool): Return the query plan of the statement instead of running it, see explain.
 
         Raises:
             BeeSQLDatabaseError.
@@ -202,21 +576,91 @@ class MYSQLConnection(BeeSQLBaseConnection):
             '''
         if not type(updated_values) is dict:
             raise TypeError('updated_values should be of type dict')
-        sql = 'UPDATE %s SET ' % (table) + ' , '.join([k + '=%s' for k in updated_values.keys()])
         escapes_list = updated_values.values()
-        if where:
-            sql = sql + ' WHERE %s' % (where)
-        elif where_conditions:
-            sql = sql + ' WHERE ' + ' AND '.join([k + '=%s' for k in where_conditions.keys()])
+        if not where and where_conditions:
             escapes_list.extend(where_conditions.values())
-        if limit:
-            sql = sql + ' LIMIT %s' % (limit)
+        key = ('update', table, tuple(updated_values), where, limit, tuple(where_conditions))
+        sql = self.statement_cache.get(key)
+        if sql is None:
+            sql = 'UPDATE %s SET ' % (table) + ' , '.join([k + '=%s' for k in updated_values.keys()])
+            if where:
+                sql = sql + ' WHERE %s' % (where)
+            elif where_conditions:
+                sql = sql + ' WHERE ' + ' AND '.join([k + '=%s' for k in where_conditions.keys()])
+            if limit:
+                sql = sql + ' LIMIT %s' % (limit)
+            self.statement_cache.put(key, sql)
+        if explain:
+            return self.explain(sql, tuple(escapes_list))
+        self._advise(table, where, where_conditions, sql, tuple(escapes_list))
         try:
             self.query(sql, tuple(escapes_list))
         except pymysql.err.DatabaseError, de:
-            raise BeeSQLDatabaseError(str(de))
+            raise self._database_error(de)
+
+    def update_many(self, table, rows, key='id', columns=None, chunk_size=500):
+        ''' Update rows of table to per row values, identified by key. Rows updating the same columns are
+            updated chunk_size rows at a time by a single UPDATE using CASE expressions, one commit per batch.
+
+        Arguments:
+            :table (str): Table to be updated.
+            :rows: Iterable of dicts holding key and updated columns, or of tuples when columns are provided.
+            :key: Column name or tuple of column names identifying a row; Default to id.
+            :columns: Optional, tuple of column names of tuple rows.
+            :chunk_size (int): Maximum number of rows updated by one statement. Keep the statement below max_allowed_packet.
+
+        Returns:
+            Dict of total updated row count and list of updated row counts per batch. MySQL counts only
+            rows whose values changed.
+
+        Raises:
+            BeeSQLError, BeeSQLDatabaseError.
+
+        Example::
+
+            connection.update_many('beesql_version', [{'id': 1, 'version': '0.1'}, {'id': 2, 'version': '0.2'}])
+            sql - UPDATE beesql_version SET version = CASE id WHEN %s THEN %s WHEN %s THEN %s ELSE version END
+                  WHERE id IN (%s, %s) '''
+
+        if isinstance(key, basestring):
+            key = (key,)
+        key_sql = '(' + ' AND '.join([column + '=%s' for column in key]) + ')'
+        if len(key) == 1:
+            case_sql, when_sql = 'CASE %s ' % (key[0]), 'WHEN %s THEN %s'
+        else:
+            case_sql, when_sql = 'CASE ', 'WHEN ' + key_sql + ' THEN %s'
+        result = dict(updated=0, batches=[])
+        try:
+            for update_columns, keys, values in self._update_batches(rows, key, columns, chunk_size):
+                latest = dict(zip(keys, values))
+                if len(latest) != len(keys):
+                    # CASE takes the first matching WHEN, a key repeated within a batch keeps only its last values.
+                    unique_keys, unique_values = [], []
+                    for row_key in keys:
+                        if row_key in latest:
+                            unique_keys.append(row_key)
+                            unique_values.append(latest.pop(row_key))
+                    keys, values = unique_keys, unique_values
+                escapes = []
+                sets = []
+                for index, column in enumerate(update_columns):
+                    sets.append(column + ' = ' + case_sql + ' '.join([when_sql] * len(keys)) + ' ELSE ' + column + ' END')
+                    for row_key, value in zip(keys, values):
+                        escapes.extend(row_key)
+                        escapes.append(value[index])
+                if len(key) == 1:
+                    where = key[0] + ' IN (' + ', '.join(['%s'] * len(keys)) + ')'
+                else:
+                    where = ' OR '.join([key_sql] * len(keys))
+                escapes.extend(itertools.chain.from_iterable(keys))
+                self.query('UPDATE %s SET %s WHERE %s' % (table, ', '.join(sets), where), tuple(escapes))
+                result['updated'] += self.cursor.rowcount
+                result['batches'].append(self.cursor.rowcount)
+        except pymysql.err.DatabaseError, de:
+            raise self._database_error(de)
+        return result
 
-    def delete(self, table, where=None, limit=None, **where_conditions):
+    def delete(self, table, where=None, limit=None, explain=False, **where_conditions):
         ''' Delete values from table.
 
         Arguments:
@@ -225,6 +669,7 @@ class MYSQLConnection(BeeSQLBaseConnection):
             :limit (int): Optional, places a limit on the number of rows to be deleted.
             :where_conditions: Optional, condition pairs to contruct where conditional clause
                               if where is not provided.
+            :explain (bool): Return the query plan of the statement instead of running it, see explain.
 
         Raises:
             BeeSQLDatabaseError.
@@ -238,19 +683,27 @@ class MYSQLConnection(BeeSQLBaseConnection):
             sql - DELETE FROM beesql_version WHERE version=2.0 AND release_name='bumblebee' LIMIT 2 '''
 
         escapes = None
-        sql = 'DELETE FROM %s' % (table)
-        if where:
-            sql = sql + ' WHERE %s' % (where)
-        # If where condition is not supplied as a string derive it using where_conditions.
-        elif where_conditions:
-            sql = sql + ' WHERE ' + ' AND '.join(['%s=%s' % (k, '%s') for k in where_conditions.keys()])
+        if not where and where_conditions:
             escapes = tuple(where_conditions.values())
-        if limit:
-            sql = sql + ' LIMIT %s' % (limit)
+        key = ('delete', table, where, limit, tuple(where_conditions))
+        sql = self.statement_cache.get(key)
+        if sql is None:
+            sql = 'DELETE FROM %s' % (table)
+            if where:
+                sql = sql + ' WHERE %s' % (where)
+            # If where condition is not supplied as a string derive it using where_conditions.
+            elif where_conditions:
+                sql = sql + ' WHERE ' + ' AND '.join(['%s=%s' % (k, '%s') for k in where_conditions.keys()])
+            if limit:
+                sql = sql + ' LIMIT %s' % (limit)
+            self.statement_cache.put(key, sql)
+        if explain:
+            return self.explain(sql, escapes)
+        self._advise(table, where, where_conditions, sql, escapes)
         try:
             self.query(sql, escapes)
         except pymysql.err.DatabaseError, de:
-            raise BeeSQLDatabaseError(str(de))
+            raise self._database_error(de)
 
     def truncate(self, table):
         ''' Empty provided table. '''
@@ -258,7 +711,7 @@ class MYSQLConnection(BeeSQLBaseConnection):
         try:
             self.query(sql)
         except pymysql.err.DatabaseError, de:
-            raise BeeSQLDatabaseError(str(de))
+            raise self._database_error(de)
 
     def drop_table(self, *tables, **kargs):
         ''' Drop tables provided.
@@ -278,7 +731,7 @@ class MYSQLConnection(BeeSQLBaseConnection):
         try:
             self.query(sql)
         except pymysql.err.DatabaseError, de:
-            raise BeeSQLDatabaseError(str(de))
+            raise self._database_error(de)
             
 
     def use(self, db):
@@ -290,7 +743,7 @@ class MYSQLConnection(BeeSQLBaseConnection):
             sql = "USE %s" % (db)
             self.query(sql)
         except pymysql.err.DatabaseError, de:
-            raise BeeSQLDatabaseError(str(de))
+            raise self._database_error(de)
 
     def create(self, db, if_not_exists=False):
         ''' Create provided database.
@@ -305,7 +758,7 @@ class MYSQLConnection(BeeSQLBaseConnection):
                 sql = "CREATE DATABASE %s" % (db)
             self.query(sql)
         except pymysql.err.DatabaseError, de:
-            raise BeeSQLDatabaseError(str(de))
+            raise self._database_error(de)
 
     def tables(self):
         ''' Return tables of current database. 
@@ -313,7 +766,58 @@ class MYSQLConnection(BeeSQLBaseConnection):
         Raises:
             BeeSQLDatabaseError '''
         sql = 'SHOW TABLES'
-        return [tableinfo.values()[0] for tableinfo in self.query(sql)]
+        return [row[0] for row in self.query(sql, row_format='tuple')]
+
+    def explain(self, sql, escapes=None):
+        ''' Return the query plan of a statement, run with EXPLAIN. The statement is not run,
+            lastsql and the commit policy are not affected.
+
+        Arguments:
+            :sql (str): Statement to explain, UPDATE and DELETE need MySQL 5.6.3 or later.
+            :escapes: Optional, A tuple of escape values to escape provided sql.
+
+        Returns:
+            List of plan steps as dicts of the EXPLAIN columns in lower case, with key also as index and Extra
+            as detail, and scan, True if the step reads the whole table or index.
+
+        Raises:
+            BeeSQLDatabaseError.
+
+        Example::
+
+            connection.explain('SELECT * FROM beesql_version WHERE version = %s', ('0.1',))
+            [{'id': 1, 'select_type': 'SIMPLE', 'table': 'beesql_version', 'type': 'ALL', 'possible_keys': None,
+              'key': None, 'index': None, 'rows': 1200, 'detail': 'Using where', 'scan': True, ...}] '''
+        plan = []
+        for row in self._inspect('EXPLAIN ' + sql, escapes, 'dict'):
+            step = dict([(column.lower(), value) for column, value in row.items()])
+            step.update(index=step.get('key'), detail=step.pop('extra', None) or '', scan=step.get('type') in SCAN_TYPES)
+            plan.append(step)
+        return plan
+
+    def indexes(self, table):
+        ''' Return dict mapping index names of table to tuples of their columns, in index order.
+
+        Raises:
+            BeeSQLDatabaseError. '''
+        columns = {}
+        for row in self._inspect('SHOW INDEX FROM %s' % (table), row_format='dict'):
+            columns.setdefault(row['Key_name'], []).append((row['Seq_in_index'], row['Column_name']))
+        return dict([(name, tuple([column for position, column in sorted(index)])) for name, index in columns.items()])
+
+    def table_rows(self, table):
+        ''' Return number of rows of table, estimated from table statistics without counting.
+
+        Raises:
+            BeeSQLDatabaseError. '''
+        if '.' in table:
+            sql, escapes = 'TABLE_SCHEMA = %s AND TABLE_NAME = %s', tuple(table.split('.', 1))
+        else:
+            sql, escapes = 'TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', (table,)
+        rows = self._inspect('SELECT TABLE_ROWS FROM information_schema.TABLES WHERE ' + sql, escapes, 'tuple')
+        if not rows:
+            raise BeeSQLDatabaseError("Table '%s' doesn't exist" % (table))
+        return int(rows[0][0] or 0)
 
     def drop(self, db, if_exists=False):
         ''' Drop provided database.
@@ -328,7 +832,7 @@ class MYSQLConnection(BeeSQLBaseConnection):
                 sql = "DROP DATABASE %s" % (db)
             self.query(sql)
         except pymysql.err.DatabaseError, de:
-            raise BeeSQLDatabaseError(str(de))
+            raise self._database_error(de)
 
     @property
     def lastrowid(self):
@@ -345,6 +849,93 @@ class MYSQLConnection(BeeSQLBaseConnection):
         ''' Return lastly used escape values as a tuple. '''
         return self.last_escapes
 
+    def _unbuffered_cursor(self):
+        ''' Return an unbuffered cursor streaming results from the server. PyMySQL releases before 0.6 have none,
+            a buffered cursor reading the whole result into memory is returned and a warning is logged once. '''
+        if SSCursor is None:
+            if not MYSQLConnection._warned_buffered:
+                MYSQLConnection._warned_buffered = True
+                driver_log.warning('PyMySQL %s has no unbuffered cursor, results of iter_query, iter_select and '
+                                   'query_columns are read into memory. Upgrade to PyMySQL 0.6 or later to stream them.',
+                                   '.'.join([str(part) for part in pymysql.VERSION if part is not None]))
+            return self._new_cursor()
+        return self._new_cursor(SSCursor)
+
+    def _connection_failed(self, error):
+        ''' Return True if error is a client error, reporting a failed or lost connection. '''
+        return isinstance(error, pymysql.err.OperationalError) and bool(error.args) and error.args[0] >= CLIENT_ERRORS
+
+    def ping(self):
+        ''' Check that the connection to the server is alive, without reconnecting.
+
+        Raises:
+            BeeSQLDatabaseError. '''
+        self._check_fork()
+        try:
+            self.db_connection.ping(False)
+        except pymysql.err.Error, e:
+            raise self._database_error(e)
+
+    @contextlib.contextmanager
+    def fast_ingest(self, table=None):
+        ''' Context manager for bulk loads. Within the block unique and foreign key checks are disabled for the
+            session and non unique indexes of table are not updated (MyISAM tables only), they are rebuilt on exit.
+            Previous settings are restored on exit. Rows loaded within the block are not checked against
+            unique and foreign key constraints.
+
+        Arguments:
+            :table (str): Optional, table whose non unique indexes are rebuilt after the block.
+
+        Raises:
+            BeeSQLError, BeeSQLDatabaseError.
+
+        Example::
+
+            with connection.fast_ingest('beesql_downloads'):
+                connection.insert_many('beesql_downloads', rows, columns) '''
+        # ALTER TABLE commits an open transaction, and session settings would apply to the rest of it.
+        if self.in_transaction:
+            raise BeeSQLError('fast_ingest can not be used in a transaction')
+        self.flush()
+        settings = self.query('SELECT @@SESSION.unique_checks, @@SESSION.foreign_key_checks', row_format='tuple')[0]
+        self.query('SET SESSION unique_checks=0, foreign_key_checks=0')
+        try:
+            if table is not None:
+                self.query('ALTER TABLE %s DISABLE KEYS' % (table))
+            try:
+                yield self
+            finally:
+                self.flush()
+                if table is not None:
+                    self.query('ALTER TABLE %s ENABLE KEYS' % (table))
+        finally:
+            self.query('SET SESSION unique_checks=%s, foreign_key_checks=%s', tuple(settings))
+
+    def _load_file(self, table, path, columns=None, header=True, encoding='utf-8', options=None):
+        ''' Load a CSV file with LOAD DATA LOCAL INFILE if the connection was opened with local_infile and return
+            the number of rows loaded. Return None for compressed files and non default CSV dialects. '''
+        if not self.connect_args['local_infile'] or path.endswith('.gz') or options:
+            return None
+        if encoding.lower().replace('-', '') not in ('utf8', 'utf8mb4'):
+            return None
+        with open(path, 'rb') as handle:
+            first = handle.readline()
+        if columns is None and header:
+            columns = next(csv.reader([first]), None)
+        terminator = '\r\n' if first.endswith('\r\n') else '\n'
+        # csv doubles quotes within quoted values rather than escaping them.
+        sql = ("LOAD DATA LOCAL INFILE %%s INTO TABLE %s CHARACTER SET utf8mb4 FIELDS TERMINATED BY ',' "
+               "OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' LINES TERMINATED BY %%s" % (table))
+        if header:
+            sql += ' IGNORE 1 LINES'
+        if columns:
+            sql += ' (%s)' % (', '.join(columns))
+        self.query(sql, (path, terminator))
+        return self.cursor.rowcount
+
     def close(self):
-        ''' Close connection to Database. '''
-        self.db_connection.close()
+        ''' Close connection to Database. Statements held back by the commit policy are committed first. '''
+        self._check_fork()
+        if self.connected:
+            self.flush()
+            self.db_connection.close()
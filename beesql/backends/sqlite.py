@@ -5,53 +5,218 @@
 # Author: Kasun Herath <kasunh01@gmail.com>
 # Source: https://github.com/kasun/BeeSQL
 
+import contextlib
+import re
 import sqlite3
+import urllib
 
 from base import BeeSQLBaseConnection
 from beesql import BeeSQLError
 from beesql import BeeSQLDatabaseError
+from beesql.prepared import PreparedStatement
+from beesql.utils import chunks
+
+# Default maximum number of escape values in a statement (SQLITE_MAX_VARIABLE_NUMBER), raised in sqlite 3.32.
+MAX_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+# sqlite version which added INSERT ... ON CONFLICT DO UPDATE.
+UPSERT_VERSION = (3, 24, 0)
+# sqlite version which added row values, as in (a, b) IN (VALUES (?, ?)).
+ROW_VALUES_VERSION = (3, 15, 0)
+# Default maximum depth of an expression tree (SQLITE_MAX_EXPR_DEPTH), each OR'ed condition nests one level.
+MAX_EXPR_DEPTH = 1000
+
+# Pragmas set on connect by profile name, in order. journal_mode is set first, it can not change within a transaction.
+PROFILES = {
+    'default': (),
+    'durable': (('journal_mode', 'WAL'), ('synchronous', 'FULL')),
+    'throughput': (('journal_mode', 'WAL'), ('synchronous', 'NORMAL'), ('cache_size', -65536),
+                   ('mmap_size', 268435456), ('temp_store', 'MEMORY')),
+    'readonly': (('query_only', 1), ('cache_size', -65536), ('mmap_size', 268435456), ('temp_store', 'MEMORY')),
+}
+# Table and index of a SCAN or SEARCH step of EXPLAIN QUERY PLAN, sqlite before 3.36 writes SCAN TABLE.
+PLAN_STEP = re.compile(r'^(SCAN|SEARCH) (?:TABLE )?(?!CONSTANT ROW)([\w.]+)(?: AS \w+)?'
+                       r'(?: USING (?:(?:[A-Z]+ )*?INDEX (\w+)|(INTEGER PRIMARY KEY)))?')
+# Messages of errors opening, reading or writing the database file rather than running a statement.
+FILE_ERRORS = ('unable to open database file', 'disk I/O error')
+# Pragmas reported by settings.
+SETTINGS = ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store', 'query_only', 'foreign_keys',
+            'busy_timeout')
+
+_uri_filenames = None
+
+def uri_filenames():
+    ''' Return True if sqlite3 opens 'file:' URI filenames, checked once. '''
+    global _uri_filenames
+    if _uri_filenames is None:
+        connection = sqlite3.connect(':memory:')
+        try:
+            _uri_filenames = ('USE_URI',) in connection.execute('PRAGMA compile_options').fetchall()
+        finally:
+            connection.close()
+    return _uri_filenames
 
 class SQLITEConnection(BeeSQLBaseConnection):
     ''' SQLlite Database Connection. '''
-    def __init__(self, username, password, host='localhost', port=3306, db=None, unix_socket=None):
-        ''' Initialize Sqlite connection. '''
-        BeeSQLBaseConnection.__init__(self)
+    # Driver errors raised as BeeSQLDatabaseError.
+    database_errors = sqlite3.OperationalError
+    # Escape value placeholder.
+    placeholder = '?'
+
+    def __init__(self, username, password, host='localhost', port=3306, db=None, unix_socket=None, check_same_thread=True,
+                 lazy=False, cached_statements=100, profile='default', pragmas=None, **options):
+        ''' Initialize Sqlite connection. Set check_same_thread to False to allow using the connection from other threads.
+            cached_statements is the number of parsed statements sqlite3 keeps for reuse by the connection.
+            profile names a preset of pragmas set on connect, one of PROFILES: 'default' leaves sqlite's defaults,
+            'durable' uses WAL with synchronous=FULL, 'throughput' WAL with synchronous=NORMAL, a 64 MiB page cache,
+            256 MiB of memory mapped I/O and in memory temporary tables, 'readonly' opens the database read only.
+            pragmas is an optional dict of pragmas overriding the profile's. If lazy is True the database is
+            opened on first use. Other options are passed to BeeSQLBaseConnection. '''
+        BeeSQLBaseConnection.__init__(self, **options)
         if not db: 
             raise BeeSQLError('Engine sqlite requires db')
+        if profile not in PROFILES:
+            raise BeeSQLError('Invalid sqlite profile %s, should be one of %s' % (profile, ', '.join(sorted(PROFILES))))
+        self.connect_args = dict(db=db, check_same_thread=check_same_thread, cached_statements=cached_statements,
+                                 profile=profile, pragmas=pragmas)
+        if not lazy:
+            self._connect()
+
+    def _connect(self):
+        ''' Open the database, set pragmas of the profile, register database connection and cursor. '''
+        args = self.connect_args
+        db = args['db']
+        if args['profile'] == 'readonly' and db != ':memory:' and uri_filenames():
+            db = 'file:%s?mode=ro' % (urllib.quote(db))
         try:
-            self.db_connection = sqlite3.connect(db)
-            self.db_connection.row_factory = self.__dict_factory
+            self.db_connection = sqlite3.connect(db, check_same_thread=args['check_same_thread'],
+                                                 cached_statements=args['cached_statements'])
             self.cursor = self.db_connection.cursor()
+            for name, value in self._pragmas():
+                self.cursor.execute('PRAGMA %s=%s' % (name, value))
         except sqlite3.OperationalError, oe:
-            raise BeeSQLDatabaseError(str(oe))
+            raise self._database_error(oe)
+
+    def _pragmas(self):
+        ''' Return list of (name, value) pragmas of the profile updated with pragmas option. '''
+        pragmas = list(PROFILES[self.connect_args['profile']])
+        extra = dict(self.connect_args['pragmas'] or {})
+        pragmas = [(name, extra.pop(name, value)) for name, value in pragmas]
+        return pragmas + sorted(extra.items())
+
+    def settings(self):
+        ''' Return dict of effective values of common pragmas and of those set by the profile or pragmas option.
 
-    def __dict_factory(self, cursor, row):
-        ''' Custom Row factory to return results as a dictionary. '''
-        d = {}
-        for idx, col in enumerate(cursor.description):
-            d[col[0]] = row[idx]
-        return d
+        Example::
 
-    def query(self, sql, escapes=None):
+            connection = beesql.connection(engine='sqlite', db='beesql.db', profile='throughput')
+            connection.settings()
+            {'journal_mode': u'wal', 'synchronous': 1, 'cache_size': -65536, 'mmap_size': 268435456, 'temp_store': 2, ...} '''
+        names = list(SETTINGS) + [name for name, value in self._pragmas() if name not in SETTINGS]
+        settings = {}
+        try:
+            for name in names:
+                row = self.db_connection.execute('PRAGMA %s' % (name)).fetchone()
+                settings[name] = row[0] if row else None
+        except sqlite3.OperationalError, oe:
+            raise self._database_error(oe)
+        return settings
+
+    def query(self, sql, escapes=None, row_format=None):
         """ Run provided query.
 
         Arguments:
             :sql (str): Query to run.
             :escapes: Optional, A tuple of escape values to escape provided sql.
+            :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the connection's row format.
+
+        Returns:
+            List of rows, dictionaries unless another row format is used.
+
+        Raises:
+            BeeSQLDatabaseError. """
+        try:
+            self.last_sql = sql
+            self.last_escapes = escapes
+            return self._run_query(sql, escapes, row_format)
+        except sqlite3.OperationalError, oe:
+            raise self._database_error(oe)
+
+    def iter_query(self, sql, escapes=None, batch_size=1000, row_format=None, as_columns=False):
+        """ Run provided query and iterate over resulting rows, fetching batch_size rows at a time.
+
+        Arguments:
+            :sql (str): Query to run.
+            :escapes: Optional, A tuple of escape values to escape provided sql.
+            :batch_size (int): Number of rows fetched from the cursor at once.
+            :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the connection's row format.
+            :as_columns (bool): Yield a mapping of column name to numpy array (array.array without numpy) per batch instead of rows.
 
         Returns:
-            Tuple of dictionaries representing rows.
+            Generator of rows, dictionaries unless another row format is used.
 
         Raises:
             BeeSQLDatabaseError. """
         try:
             self.last_sql = sql
             self.last_escapes = escapes
-            return self._run_query(sql, escapes)
+            if as_columns:
+                results = self._iter_columns(self._new_cursor(), sql, escapes, batch_size)
+            else:
+                results = self._iter_query(self._new_cursor(), sql, escapes, batch_size, row_format)
+            for result in results:
+                yield result
         except sqlite3.OperationalError, oe:
-            raise BeeSQLDatabaseError(str(oe))
+            raise self._database_error(oe)
+
+    def query_columns(self, sql, escapes=None, batch_size=1000):
+        """ Run provided query and return the result as columns, filled from the cursor batch_size rows at a time.
+
+        Arguments:
+            :sql (str): Query to run.
+            :escapes: Optional, A tuple of escape values to escape provided sql.
+            :batch_size (int): Number of rows fetched from the cursor at once.
+
+        Returns:
+            beesql.columns.Columns, a mapping of column name to numpy array, or to array.array
+            (list for non numeric columns) when numpy is not installed. NULL values are flagged in its masks.
+
+        Raises:
+            BeeSQLDatabaseError. """
+        try:
+            self.last_sql = sql
+            self.last_escapes = escapes
+            return next(self._iter_columns(self._new_cursor(), sql, escapes, batch_size, per_batch=False))
+        except sqlite3.OperationalError, oe:
+            raise self._database_error(oe)
+
+    def clone(self):
+        ''' Open and return a new connection to the same database file with the same options.
+
+        Raises:
+            BeeSQLError if the database is in memory, each connection would open a database of its own. '''
+        if self.connect_args['db'] == ':memory:':
+            raise BeeSQLError('In memory sqlite databases can not be cloned')
+        return BeeSQLBaseConnection.clone(self)
+
+    def prepare(self, sql):
+        """ Prepare a statement to be executed many times. The statement keeps a cursor of its own and
+            sqlite3 reuses its parsed form while it stays in the connection's statement cache,
+            whose size is set by the cached_statements connection option.
+
+        Arguments:
+            :sql (str): Statement using ? placeholders.
+
+        Returns:
+            beesql.prepared.PreparedStatement.
+
+        Example::
 
-    def get(self, table, where=None, **where_conditions):
+            statement = connection.prepare('SELECT * FROM beesql_version WHERE version = ?')
+            rows = statement.execute(('0.1',))
+            statement.close() """
+        return PreparedStatement(self, sql, self._new_cursor())
+
+    def get(self, table, where=None, row_format=None, explain=False, **where_conditions):
         """ Retrieve a single row.
 
         Arguments:
@@ -59,28 +224,84 @@ class SQLITEConnection(BeeSQLBaseConnection):
             :where: Optional where conditional clause as a string.
             :where_conditions: Optional, condition pairs to contruct where conditional clause.
                                 if where is not provided.
+            :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the connection's row format.
+            :explain (bool): Return the query plan of the statement instead of running it, see explain.
 
         Returns:
-            A dict representing a single Row.
+            A dict representing a single Row, unless another row format is used.
 
         Raises:
             BeeSQLDatabaseError. """
 
-        sql = 'SELECT * FROM %s' % table
         escapes= None
-        if where:
-            sql = sql + ' WHERE %s' % where
-        elif where_conditions:
-            sql = sql + ' WHERE ' + ' AND '.join([k + '=?' for k in where_conditions.keys()])
+        if not where and where_conditions:
             escapes = tuple(where_conditions.values())
-        sql = sql + ' LIMIT 1'
-        result = self.query(sql, escapes)
+        key = ('get', table, where, tuple(where_conditions))
+        sql = self.statement_cache.get(key)
+        if sql is None:
+            sql = 'SELECT * FROM %s' % table
+            if where:
+                sql = sql + ' WHERE %s' % where
+            elif where_conditions:
+                sql = sql + ' WHERE ' + ' AND '.join([k + '=?' for k in where_conditions.keys()])
+            sql = sql + ' LIMIT 1'
+            self.statement_cache.put(key, sql)
+        if explain:
+            return self.explain(sql, escapes)
+        self._advise(table, where, where_conditions, sql, escapes)
+        result = self._cached_query(table, sql, escapes, row_format)
         if result:
             return result[0]
         return None
 
+    def get_many(self, table, column, values, columns=None, row_format=None, temp_table_threshold=100000):
+        """ Retrieve rows whose column matches any of values, in as few statements as possible.
+            Values are looked up in IN lists of up to MAX_VARIABLES values, or joined through a
+            temporary table when there are more than temp_table_threshold distinct values.
+
+        Arguments:
+            :table (str): Table to retrieve from.
+            :column (str): Column to match, expected to be unique.
+            :values: Iterable of values to look up, duplicates are looked up once.
+            :columns: Optional, tuple of columns to retrieve; Default to all. column is added if missing.
+            :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the connection's row format.
+            :temp_table_threshold (int): Number of distinct values above which a temporary table is used.
+
+        Returns:
+            Dict mapping found values to their row. Values without a row are missing from the dict.
+
+        Raises:
+            BeeSQLDatabaseError.
+
+        Example::
+
+            connection.get_many('beesql_version', 'id', [1, 2, 3])
+            sql - SELECT * FROM beesql_version WHERE id IN (?, ?, ?) """
+
+        keys = self._unique_keys(values)
+        rows = {}
+        if not keys:
+            return rows
+        try:
+            if len(keys) > temp_table_threshold:
+                self.query('CREATE TEMP TABLE beesql_get_many (value PRIMARY KEY)')
+                try:
+                    self._run_many('INSERT INTO temp.beesql_get_many (value) VALUES (?)', [(key,) for key in keys])
+                    sql = 'SELECT %s FROM %s AS t JOIN temp.beesql_get_many AS k ON t.%s = k.value' % (
+                          self._select_columns(column, columns, 't'), table, column)
+                    return self._keyed_rows(rows, sql, None, column, row_format)
+                finally:
+                    self.query('DROP TABLE temp.beesql_get_many')
+            select = 'SELECT %s FROM %s WHERE %s IN ' % (self._select_columns(column, columns), table, column)
+            for chunk in chunks(keys, MAX_VARIABLES):
+                self._keyed_rows(rows, select + '(%s)' % ', '.join(['?'] * len(chunk)), tuple(chunk), column, row_format)
+        except sqlite3.OperationalError, oe:
+            raise self._database_error(oe)
+        return rows
+
     def select(self, table, columns=None, distinct=False, where=None, group_by=None, having=None,
-                order_by=None, order_by_asc=True, limit=False, **where_conditions):
+                order_by=None, order_by_asc=True, limit=False, row_format=None, as_columns=False, explain=False,
+                **where_conditions):
         """ Select columns from table.
 
         Arguments:
@@ -94,9 +315,12 @@ class SQLITEConnection(BeeSQLBaseConnection):
             :limit (int): Limit results to provided number of rows.
             :where_conditions: Optional, condition pairs to contruct where conditional clause
                                 if where is not provided. 
+            :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the connection's row format.
+            :as_columns (bool): Return a mapping of column name to numpy array (array.array without numpy) instead of rows.
+            :explain (bool): Return the query plan of the statement instead of running it, see explain.
 
         Returns:
-            Tuple of dicts representing rows.
+            List of rows, dicts unless another row format is used.
 
         Raises:
             BeeSQLDatabaseError.
@@ -112,8 +336,46 @@ class SQLITEConnection(BeeSQLBaseConnection):
             connection.select('beesql_version', release_year=2012, release_manager='John Doe')
             sql - SELECT * FROM beesql_version WHERE release_year=2012 AND release_manager='John Doe' """
 
-        sql = 'SELECT '
+        sql, escapes = self._select_sql(table, columns, distinct, where, group_by, having,
+                                        order_by, order_by_asc, limit, where_conditions)
+        if explain:
+            return self.explain(sql, escapes)
+        self._advise(table, where, where_conditions, sql, escapes)
+        if as_columns:
+            return self.query_columns(sql, escapes)
+        return self._cached_query(table, sql, escapes, row_format)
+
+    def iter_select(self, table, columns=None, distinct=False, where=None, group_by=None, having=None,
+                order_by=None, order_by_asc=True, limit=False, batch_size=1000, row_format=None, as_columns=False,
+                **where_conditions):
+        """ Select columns from table and iterate over rows without loading the whole result into memory.
+
+        Accepts the same arguments as select, with as_columns a columns mapping is yielded per batch.
+
+        Arguments:
+            :batch_size (int): Number of rows fetched from the cursor at once.
+
+        Returns:
+            Generator of rows, dicts unless another row format is used.
+
+        Raises:
+            BeeSQLDatabaseError. """
+
+        sql, escapes = self._select_sql(table, columns, distinct, where, group_by, having,
+                                        order_by, order_by_asc, limit, where_conditions)
+        return self.iter_query(sql, escapes, batch_size, row_format, as_columns)
+
+    def _select_sql(self, table, columns, distinct, where, group_by, having, order_by, order_by_asc, limit, where_conditions):
+        ''' Build select statement, return sql and escape values. '''
         escapes= None
+        if not where and where_conditions:
+            escapes = tuple(where_conditions.values())
+        key = ('select', table, columns, distinct, where, group_by, having, order_by, order_by_asc, limit,
+               tuple(where_conditions))
+        sql = self.statement_cache.get(key)
+        if sql is not None:
+            return sql, escapes
+        sql = 'SELECT '
         if distinct:
             sql = sql + 'DISTINCT '
         if columns:
@@ -129,7 +391,6 @@ class SQLITEConnection(BeeSQLBaseConnection):
             sql = sql + ' WHERE %s' % (where)
         elif where_conditions:
             sql = sql + ' WHERE ' + ' AND '.join([k + '=?' for k in where_conditions.keys()])
-            escapes = tuple(where_conditions.values())
         if group_by:
             sql = sql + ' GROUP BY '
             if type(group_by) is tuple:
@@ -148,7 +409,40 @@ class SQLITEConnection(BeeSQLBaseConnection):
                 sql = sql + ' DESC'
         if limit:
             sql = sql + ' LIMIT %s' % (limit)
-        return self.query(sql, (escapes))
+        self.statement_cache.put(key, sql)
+        return sql, escapes
+
+    def paginate(self, table, columns=None, key='id', page_size=10000, descending=False, after=None, where=None,
+                 row_format=None, **where_conditions):
+        """ Iterate over rows of table in pages of page_size rows ordered by key. Each page is read with
+            WHERE key > last key of previous page ORDER BY key LIMIT page_size, so pages are read from an
+            index on key equally fast however deep the scan is.
+
+        Arguments:
+            :table (str): Table to read.
+            :columns: Optional, tuple of columns to retrieve; Default to all. Key columns are added if missing.
+            :key: Column name or tuple of column names, unique and not NULL, to order and seek pages by; Default to id.
+            :page_size (int): Number of rows per page.
+            :descending (bool): Iterate in descending key order.
+            :after: Optional, cursor token of a page to continue after.
+            :where: Optional, where conditional clause as a string.
+            :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the connection's row format.
+            :where_conditions: Optional, condition pairs to contruct where conditional clause if where is not provided.
+
+        Returns:
+            Generator of pages, lists of rows whose cursor attribute is a token to continue after the page.
+
+        Raises:
+            BeeSQLError, BeeSQLDatabaseError.
+
+        Example::
+
+            for page in connection.paginate('beesql_downloads', key=('day', 'id'), page_size=1000, release='0.1'):
+                process(page)
+                save(page.cursor)
+            sql - SELECT * FROM beesql_downloads WHERE release=? AND day >= ? AND ((day > ?) OR (day = ? AND id > ?))
+                  ORDER BY day ASC, id ASC LIMIT 1000 """
+        return self._paginate('?', table, columns, key, page_size, descending, after, where, row_format, where_conditions)
 
     def insert(self, table, **values):
         """ Insert values into table.
@@ -165,11 +459,112 @@ class SQLITEConnection(BeeSQLBaseConnection):
             BeeSQL insert - connection.insert('beesql_version', version='0.1', release_manager='Kasun Herath')
             SQL - INSERT INTO beesql_version (version, release_manager) VALUES ('0.1', 'Kasun Herath') """
 
-        sql = "INSERT INTO %s (%s) VALUES (%s)" % (table, ', '.join([columnname for columnname in values.keys()]), ', '.join(['?' for columnname in values.values()]))
+        key = ('insert', table, tuple(values))
+        sql = self.statement_cache.get(key)
+        if sql is None:
+            sql = "INSERT INTO %s (%s) VALUES (%s)" % (table, ', '.join([columnname for columnname in values.keys()]), ', '.join(['?' for columnname in values.values()]))
+            self.statement_cache.put(key, sql)
         escapes = tuple(values.values())
         self.query(sql, escapes)
 
-    def update(self, table, updated_values, where=None, **where_conditions):
+    def insert_many(self, table, rows, columns=None, chunk_size=500):
+        """ Insert multiple rows into table, sending and committing rows in chunks.
+
+        Arguments:
+            :table (str): Table to be inserted into.
+            :rows: Iterable of dicts or tuples representing rows.
+            :columns: Optional, tuple of column names. Required when rows are tuples,
+                      if not provided columns of the first row are used.
+            :chunk_size (int): Number of rows executed and committed at once.
+
+        Returns:
+            Number of inserted rows.
+
+        Raises:
+            BeeSQLError, BeeSQLDatabaseError.
+
+        Example::
+
+            connection.insert_many('beesql_version', [('0.1', 'Kasun Herath'), ('0.2', 'John Doe')], ('version', 'release_manager'))
+            sql - INSERT INTO beesql_version (version, release_manager) VALUES (?, ?) executed once per row """
+
+        columns, escapes_list = self._row_tuples(rows, columns)
+        if not columns:
+            return 0
+        sql = "INSERT INTO %s (%s) VALUES (%s)" % (table, ', '.join(columns), ', '.join(['?'] * len(columns)))
+        inserted = 0
+        try:
+            self.last_sql = sql
+            for chunk in chunks(escapes_list, chunk_size):
+                self.last_escapes = chunk[-1]
+                inserted += self._run_many(sql, chunk)
+        except sqlite3.OperationalError, oe:
+            raise self._database_error(oe)
+        return inserted
+
+    def upsert_many(self, table, rows, key_columns, update_columns=None, columns=None, chunk_size=500):
+        """ Insert multiple rows into table, updating rows whose key already exists, in chunks committed at once.
+            Uses INSERT ... ON CONFLICT DO UPDATE, which requires a PRIMARY KEY or UNIQUE constraint on key_columns.
+            With sqlite older than 3.24 INSERT OR REPLACE is used instead, which replaces whole rows.
+
+        Arguments:
+            :table (str): Table to be upserted into.
+            :rows: Iterable of dicts or tuples representing rows.
+            :key_columns: Column name or tuple of column names identifying a row.
+            :update_columns: Optional, tuple of columns updated when a row exists; Default to all columns but
+                             key_columns. When empty existing rows are left untouched.
+            :columns: Optional, tuple of column names. Required when rows are tuples,
+                      if not provided columns of the first row are used.
+            :chunk_size (int): Number of rows executed and committed at once.
+
+        Returns:
+            Dict of inserted and updated row counts. Rows are counted as updated when their key was present
+            before their chunk was written.
+
+        Raises:
+            BeeSQLError, BeeSQLDatabaseError.
+
+        Example::
+
+            connection.upsert_many('beesql_version', [(1, '0.1'), (2, '0.2')], 'id', columns=('id', 'version'))
+            sql - INSERT INTO beesql_version (id, version) VALUES (?, ?) ON CONFLICT (id) DO UPDATE SET version=excluded.version """
+
+        columns, escapes_list = self._row_tuples(rows, columns)
+        counts = dict(inserted=0, updated=0)
+        if not columns:
+            return counts
+        key_columns = self._key_columns(key_columns, columns)
+        if update_columns is None:
+            update_columns = [column for column in columns if column not in key_columns]
+        key_indexes = [list(columns).index(column) for column in key_columns]
+        values = "%s (%s) VALUES (%s)" % (table, ', '.join(columns), ', '.join(['?'] * len(columns)))
+        if sqlite3.sqlite_version_info >= UPSERT_VERSION:
+            if update_columns:
+                sql = "INSERT INTO %s ON CONFLICT (%s) DO UPDATE SET %s" % (values, ', '.join(key_columns),
+                      ', '.join(['%s=excluded.%s' % (column, column) for column in update_columns]))
+            else:
+                sql = "INSERT INTO %s ON CONFLICT (%s) DO NOTHING" % (values, ', '.join(key_columns))
+        else:
+            sql = "INSERT OR %s INTO %s" % ('REPLACE' if update_columns else 'IGNORE', values)
+        # Existing keys of a chunk are looked up in a single statement.
+        chunk_size = max(1, min(chunk_size, MAX_VARIABLES / len(key_columns)))
+        row_values = sqlite3.sqlite_version_info >= ROW_VALUES_VERSION
+        if len(key_columns) > 1 and not row_values:
+            chunk_size = min(chunk_size, MAX_EXPR_DEPTH - 10)
+        try:
+            for chunk in chunks(escapes_list, chunk_size):
+                keys = [tuple([row[index] for index in key_indexes]) for row in chunk]
+                inserted, updated = self._upsert_counts(keys, self._existing_keys(table, key_columns, keys, '?', row_values))
+                self.last_sql = sql
+                self.last_escapes = chunk[-1]
+                self._run_many(sql, chunk)
+                counts['inserted'] += inserted
+                counts['updated'] += updated
+        except sqlite3.OperationalError, oe:
+            raise self._database_error(oe)
+        return counts
+
+    def update(self, table, updated_values, where=None, explain=False, **where_conditions):
         """ Update table with provided updated values.
 
         Arguments:
@@ -178,6 +573,7 @@ class SQLITEConnection(BeeSQLBaseConnection):
             :where: Optional, where condition as a string.
             :where_conditions: Optional, condition pairs to contruct where conditional clause
                               if where is not provided. 
+            :explain (bool): Return the query plan of the statement instead of running it, see explain.
 
         Raises:
             BeeSQLDatabaseError.
@@ -194,16 +590,67 @@ class SQLITEConnection(BeeSQLBaseConnection):
 
         if not type(updated_values) is dict:
             raise TypeError('updated_values should be of type dict')
-        sql = 'UPDATE %s SET ' % (table) + ' , '.join([k + '=?' for k in updated_values.keys()])
         escapes_list = updated_values.values()
-        if where:
-            sql = sql + ' WHERE %s' % (where)
-        elif where_conditions:
-            sql = sql + ' WHERE ' + ' AND '.join([k + '=?' for k in where_conditions.keys()])
+        if not where and where_conditions:
             escapes_list.extend(where_conditions.values())
+        key = ('update', table, tuple(updated_values), where, tuple(where_conditions))
+        sql = self.statement_cache.get(key)
+        if sql is None:
+            sql = 'UPDATE %s SET ' % (table) + ' , '.join([k + '=?' for k in updated_values.keys()])
+            if where:
+                sql = sql + ' WHERE %s' % (where)
+            elif where_conditions:
+                sql = sql + ' WHERE ' + ' AND '.join([k + '=?' for k in where_conditions.keys()])
+            self.statement_cache.put(key, sql)
+        if explain:
+            return self.explain(sql, tuple(escapes_list))
+        self._advise(table, where, where_conditions, sql, tuple(escapes_list))
         self.query(sql, tuple(escapes_list))
 
-    def delete(self, table, where=None, **where_conditions):
+    def update_many(self, table, rows, key='id', columns=None, chunk_size=500):
+        """ Update rows of table to per row values, identified by key. Rows updating the same columns are
+            run with executemany, chunk_size rows and one commit at a time.
+
+        Arguments:
+            :table (str): Table to be updated.
+            :rows: Iterable of dicts holding key and updated columns, or of tuples when columns are provided.
+            :key: Column name or tuple of column names identifying a row; Default to id.
+            :columns: Optional, tuple of column names of tuple rows.
+            :chunk_size (int): Maximum number of rows updated by one batch.
+
+        Returns:
+            Dict of total updated row count and list of updated row counts per batch.
+
+        Raises:
+            BeeSQLError, BeeSQLDatabaseError.
+
+        Example::
+
+            connection.update_many('beesql_version', [{'id': 1, 'version': '0.1'}, {'id': 2, 'version': '0.2'}])
+            sql - UPDATE beesql_version SET version=? WHERE id=? executed once per row """
+
+        if isinstance(key, basestring):
+            key = (key,)
+        result = dict(updated=0, batches=[])
+        try:
+            for update_columns, keys, values in self._update_batches(rows, key, columns, chunk_size):
+                cache_key = ('update_many', table, update_columns, key)
+                sql = self.statement_cache.get(cache_key)
+                if sql is None:
+                    sql = "UPDATE %s SET %s WHERE %s" % (table, ', '.join(['%s=?' % (column) for column in update_columns]),
+                                                         ' AND '.join(['%s=?' % (column) for column in key]))
+                    self.statement_cache.put(cache_key, sql)
+                escapes_list = [value + row_key for value, row_key in zip(values, keys)]
+                self.last_sql = sql
+                self.last_escapes = escapes_list[-1]
+                updated = self._run_many(sql, escapes_list)
+                result['updated'] += updated
+                result['batches'].append(updated)
+        except sqlite3.OperationalError, oe:
+            raise self._database_error(oe)
+        return result
+
+    def delete(self, table, where=None, explain=False, **where_conditions):
         """ Delete values from table.
 
         Arguments:
@@ -211,6 +658,7 @@ class SQLITEConnection(BeeSQLBaseConnection):
             :where: Optional, where condition as a string.
             :where_conditions: Optional, condition pairs to contruct where conditional clause,
                               if where is not provided.
+            :explain (bool): Return the query plan of the statement instead of running it, see explain.
         Raises:
             BeeSQLDatabaseError.
 
@@ -223,13 +671,21 @@ class SQLITEConnection(BeeSQLBaseConnection):
             sql - DELETE FROM beesql_version WHERE version=2.0 and release_name='bumblebee' LIMIT 2 """
 
         escapes = None
-        sql = 'DELETE FROM %s' % (table)
-        if where:
-            sql = sql + ' WHERE %s' % (where)
-        # If where condition is not supplied as a string derive it using where_conditions.
-        elif where_conditions:
-            sql = sql + ' WHERE ' + ' AND '.join(['%s=%s' % (k, '?') for k in where_conditions.keys()])
+        if not where and where_conditions:
             escapes = tuple(where_conditions.values())
+        key = ('delete', table, where, tuple(where_conditions))
+        sql = self.statement_cache.get(key)
+        if sql is None:
+            sql = 'DELETE FROM %s' % (table)
+            if where:
+                sql = sql + ' WHERE %s' % (where)
+            # If where condition is not supplied as a string derive it using where_conditions.
+            elif where_conditions:
+                sql = sql + ' WHERE ' + ' AND '.join(['%s=%s' % (k, '?') for k in where_conditions.keys()])
+            self.statement_cache.put(key, sql)
+        if explain:
+            return self.explain(sql, escapes)
+        self._advise(table, where, where_conditions, sql, escapes)
         self.query(sql, escapes)
 
     def tables(self):
@@ -238,8 +694,58 @@ class SQLITEConnection(BeeSQLBaseConnection):
         Raises:
             BeeSQLDatabaseError """
         sql = "select name from sqlite_master where type = 'table'"
-        table_dicts = self.query(sql)
-        return [table_dict['name'] for table_dict in table_dicts]
+        return [row[0] for row in self.query(sql, row_format='tuple')]
+
+    def explain(self, sql, escapes=None):
+        """ Return the query plan of a statement, run with EXPLAIN QUERY PLAN. The statement is not run,
+            lastsql and the commit policy are not affected.
+
+        Arguments:
+            :sql (str): Statement to explain.
+            :escapes: Optional, A tuple of escape values to escape provided sql.
+
+        Returns:
+            List of plan steps as dicts of id, parent, detail, table read, index used, scan, True if the step
+            reads the whole table or index, and rows, None as sqlite does not estimate rows.
+
+        Raises:
+            BeeSQLDatabaseError.
+
+        Example::
+
+            connection.explain('SELECT * FROM beesql_version WHERE version = ?', ('0.1',))
+            [{'id': 2, 'parent': 0, 'detail': 'SCAN beesql_version', 'table': 'beesql_version', 'index': None,
+              'scan': True, 'rows': None}] """
+        plan = []
+        for row in self._inspect('EXPLAIN QUERY PLAN ' + sql, escapes, 'tuple'):
+            step = dict(id=row[0], parent=row[1], detail=row[-1], table=None, index=None, scan=False, rows=None)
+            match = PLAN_STEP.match(row[-1])
+            if match is not None:
+                step.update(table=match.group(2), index=match.group(3) or match.group(4), scan=match.group(1) == 'SCAN')
+            plan.append(step)
+        return plan
+
+    def indexes(self, table):
+        """ Return dict mapping index names of table to tuples of their columns, in index order.
+            An INTEGER PRIMARY KEY, the rowid, is named PRIMARY.
+
+        Raises:
+            BeeSQLDatabaseError. """
+        indexes = {}
+        for row in self._inspect('PRAGMA index_list(%s)' % (table), row_format='tuple'):
+            info = self._inspect('PRAGMA index_info(%s)' % (row[1]), row_format='tuple')
+            indexes[row[1]] = tuple([column[2] for column in sorted(info)])
+        keys = [row for row in self._inspect('PRAGMA table_info(%s)' % (table), row_format='tuple') if row[5]]
+        if len(keys) == 1 and keys[0][2].upper() == 'INTEGER':
+            indexes['PRIMARY'] = (keys[0][1],)
+        return indexes
+
+    def table_rows(self, table):
+        """ Return number of rows of table, counted.
+
+        Raises:
+            BeeSQLDatabaseError. """
+        return self._inspect('SELECT COUNT(*) FROM %s' % (table), row_format='tuple')[0][0]
 
     def drop_table(self, table, **kargs):
         """ Drop tables provided.
@@ -273,6 +779,83 @@ class SQLITEConnection(BeeSQLBaseConnection):
         ''' Return lastly used escape values as a tuple. '''
         return self.last_escapes
 
+    def _connection_failed(self, error):
+        ''' Return True if error reports a closed connection or a database file which can not be used. '''
+        if isinstance(error, sqlite3.ProgrammingError):
+            return 'closed database' in str(error)
+        return str(error).startswith(FILE_ERRORS)
+
+    def ping(self):
+        ''' Check that the connection is usable.
+
+        Raises:
+            BeeSQLDatabaseError. '''
+        self._check_fork()
+        try:
+            self.db_connection.execute('SELECT 1')
+        except sqlite3.Error, e:
+            raise self._database_error(e)
+
+    @contextlib.contextmanager
+    def fast_ingest(self, table=None, cache_size=-262144):
+        ''' Context manager for bulk loads. Within the block the rollback journal is kept in memory,
+            writes are not synced to disk and the page cache is enlarged; non unique indexes of table are
+            dropped and created again on exit, unique indexes are kept so that duplicates are rejected.
+            Previous settings are restored on exit. A crash within the block may leave the database corrupt.
+
+        Arguments:
+            :table (str): Optional, table whose non unique indexes are created after the block.
+            :cache_size (int): Page cache size within the block, in KiB when negative; Default to 256 MiB.
+
+        Raises:
+            BeeSQLError, BeeSQLDatabaseError.
+
+        Example::
+
+            with connection.fast_ingest('beesql_downloads'):
+                connection.insert_many('beesql_downloads', rows, columns) '''
+        if self.in_transaction:
+            raise BeeSQLError('fast_ingest can not be used in a transaction')
+        self.flush()
+        settings = [(pragma, self.query('PRAGMA %s' % (pragma), row_format='tuple')[0][0])
+                    for pragma in ('journal_mode', 'synchronous', 'cache_size')]
+        indexes = []
+        if table is not None:
+            # Indexes sqlite creates for constraints have no sql and can not be dropped.
+            indexes = self.query("SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL",
+                                 (table,), row_format='tuple')
+            unique = set([row[1] for row in self.query('PRAGMA index_list(%s)' % (table), row_format='tuple') if row[2]])
+            indexes = [(name, sql) for name, sql in indexes if name not in unique]
+        self.query('PRAGMA journal_mode=MEMORY')
+        self.query('PRAGMA synchronous=OFF')
+        self.query('PRAGMA cache_size=%d' % (cache_size))
+        dropped = []
+        try:
+            for name, sql in indexes:
+                self.query('DROP INDEX %s' % (name))
+                dropped.append((name, sql))
+            self.commit()
+            yield self
+        finally:
+            try:
+                self.flush()
+                # Every index is created again even if an earlier one fails.
+                failed = []
+                for name, sql in dropped:
+                    try:
+                        self.db_connection.execute(sql)
+                    except sqlite3.DatabaseError, e:
+                        failed.append('%s (%s)' % (name, e))
+                self.commit()
+            finally:
+                for pragma, value in settings:
+                    self.query('PRAGMA %s=%s' % (pragma, value))
+            if failed:
+                raise BeeSQLDatabaseError('Indexes of %s could not be created again: %s' % (table, ', '.join(failed)))
+
     def close(self):
-        ''' Close connection to Database. '''
-        self.db_connection.close()
+        ''' Close connection to Database. Statements held back by the commit policy are committed first. '''
+        self._check_fork()
+        if self.connected:
+            self.flush()
+            self.db_connection.close()
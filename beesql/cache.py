@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+
+''' BeeSQL caches. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import re
+import sys
+import threading
+import time
+
+# Indexes of a link in the doubly linked list used by LRUCache.
+PREV, NEXT, KEY, VALUE = 0, 1, 2, 3
+
+class LRUCache(object):
+    ''' Bounded mapping which discards least recently used entries once maxsize is reached.
+        Counts cache hits and misses. '''
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._links = {}
+        # Circular doubly linked list, root.NEXT is the least recently used link.
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+
+    def get(self, key, default=None):
+        ''' Return value stored for key and mark it as most recently used, default if key is not cached. '''
+        link = self._links.get(key)
+        if link is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        link_prev, link_next = link[PREV], link[NEXT]
+        link_prev[NEXT] = link_next
+        link_next[PREV] = link_prev
+        root = self._root
+        last = root[PREV]
+        last[NEXT] = root[PREV] = link
+        link[PREV] = last
+        link[NEXT] = root
+        return link[VALUE]
+
+    def put(self, key, value):
+        ''' Store value for key, discarding the least recently used entry if the cache is full. '''
+        if self.maxsize <= 0:
+            return
+        if key in self._links:
+            self.pop(key)
+        elif len(self._links) >= self.maxsize:
+            self.pop(self._root[NEXT][KEY])
+            self.evictions += 1
+        root = self._root
+        last = root[PREV]
+        link = [last, root, key, value]
+        last[NEXT] = root[PREV] = self._links[key] = link
+
+    def pop(self, key, default=None):
+        ''' Remove key from cache and return its value, default if key is not cached. '''
+        link = self._links.pop(key, None)
+        if link is None:
+            return default
+        link_prev, link_next = link[PREV], link[NEXT]
+        link_prev[NEXT] = link_next
+        link_next[PREV] = link_prev
+        return link[VALUE]
+
+    def popitem(self):
+        ''' Remove and return the least recently used (key, value) pair. '''
+        if not self._links:
+            raise KeyError('popitem(): cache is empty')
+        key = self._root[NEXT][KEY]
+        return key, self.pop(key)
+
+    def keys(self):
+        ''' Return cached keys, least recently used first. '''
+        keys = []
+        link = self._root[NEXT]
+        while link is not self._root:
+            keys.append(link[KEY])
+            link = link[NEXT]
+        return keys
+
+    def clear(self):
+        ''' Remove all entries. Counters are kept. '''
+        self._links.clear()
+        self._root[:] = [self._root, self._root, None, None]
+
+    def __contains__(self, key):
+        return key in self._links
+
+    def __len__(self):
+        return len(self._links)
+
+# Leading keywords of statements which do not change data.
+READ_STATEMENTS = frozenset(['SELECT', 'SHOW', 'EXPLAIN', 'DESCRIBE', 'DESC', 'PRAGMA',
+                             'BEGIN', 'START', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE', 'SET'])
+WRITE_STATEMENT = re.compile(r'''^\s*(?:INSERT(?:\s+OR\s+\w+)?(?:\s+IGNORE)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?
+                                 |DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?|DROP\s+(?:TEMPORARY\s+)?TABLE(?:\s+IF\s+EXISTS)?|ALTER\s+TABLE
+                                 |CREATE\s+TEMP(?:ORARY)?\s+TABLE(?:\s+IF\s+NOT\s+EXISTS)?)
+                                 \s+([\w.`"\[\]]+(?:\s*,\s*[\w.`"\[\]]+)*)''', re.I | re.X)
+
+def table_key(table):
+    ''' Return normalized table name used to tag cached results. '''
+    return table.strip().strip('`"[]').lower()
+
+def written_tables(sql):
+    ''' Return tables changed by a statement, an empty list for statements which do not change data
+        and None if changed tables can not be determined. '''
+    words = sql.split(None, 1)
+    if not words or words[0].upper() in READ_STATEMENTS:
+        return []
+    match = WRITE_STATEMENT.match(sql)
+    if match is None:
+        return None
+    return [table_key(table) for table in match.group(1).split(',')]
+
+# Tables named after FROM and JOIN, including comma separated lists and tables of subqueries.
+READ_TABLES = re.compile(r'''\b(?:FROM|JOIN|STRAIGHT_JOIN)\s+([\w.`"\[\]]+(?:\s+(?:AS\s+)?\w+)?
+                             (?:\s*,\s*[\w.`"\[\]]+(?:\s+(?:AS\s+)?\w+)?)*)''', re.I | re.X)
+
+def read_tables(sql):
+    ''' Return tables a SELECT statement reads from, including joined tables and tables of subqueries. '''
+    tables = []
+    for match in READ_TABLES.finditer(sql):
+        for table in match.group(1).split(','):
+            table = table_key(table.split()[0])
+            if table not in tables:
+                tables.append(table)
+    return tables
+
+def copy_result(result):
+    ''' Return a copy of a result list, dict rows are copied and other row formats are immutable. '''
+    return [dict(row) if isinstance(row, dict) else row for row in result]
+
+def result_size(result):
+    ''' Return approximate size in bytes of a result list and its rows. '''
+    size = sys.getsizeof(result)
+    for row in result:
+        size += sys.getsizeof(row)
+        values = row.itervalues() if isinstance(row, dict) else row
+        for value in values:
+            size += sys.getsizeof(value)
+    return size
+
+class ResultCache(object):
+    ''' Thread safe cache of query results, bounded by number of entries and bytes held.
+
+    Results are tagged with the tables they were read from and expire after the shortest ttl of
+    these tables. A connection invalidates entries of a table whenever it writes to the table. One
+    cache can be shared by several connections, for example by passing it to beesql.pool.
+
+    Results are copied when they are cached and when they are served, callers may modify them. '''
+    def __init__(self, max_entries=1024, max_bytes=None, ttl=None, table_ttls=None):
+        ''' Initialize cache.
+
+        Arguments:
+            :max_entries (int): Maximum number of cached results.
+            :max_bytes (int): Optional, maximum approximate size of cached results in bytes.
+            :ttl (float): Optional, seconds a result stays valid; Default to until invalidated.
+            :table_ttls (dict): Optional, ttl per table overriding ttl. '''
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.table_ttls = dict((table_key(table), table_ttl) for table, table_ttl in (table_ttls or {}).items())
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        # Entries are (result, tables, size, expires) tuples.
+        self._entries = LRUCache(max_entries + 1)
+        self._tables = {}
+
+    def get(self, key):
+        ''' Return cached result for key, None if it is not cached or has expired. '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[3] is not None and entry[3] < time.time():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            result = entry[0]
+        return copy_result(result)
+
+    def put(self, key, result, tables):
+        ''' Cache result read from tables, a table name or a list of them.
+            Results larger than max_bytes are not cached. '''
+        if isinstance(tables, basestring):
+            tables = [tables]
+        tables = tuple(set([table_key(table) for table in tables]))
+        ttls = [self.table_ttls.get(table, self.ttl) for table in tables]
+        ttls = [ttl for ttl in ttls if ttl is not None]
+        ttl = min(ttls) if ttls else None
+        if ttl is not None and ttl <= 0:
+            return
+        result = copy_result(result)
+        size = result_size(result)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            while self._entries and (len(self._entries) >= self.max_entries or
+                                     (self.max_bytes is not None and self.bytes + size > self.max_bytes)):
+                self._forget(*self._entries.popitem())
+                self.evictions += 1
+            expires = time.time() + ttl if ttl is not None else None
+            self._entries.put(key, (result, tables, size, expires))
+            for table in tables:
+                self._tables.setdefault(table, set()).add(key)
+            self.bytes += size
+
+    def _remove(self, key):
+        ''' Remove entry of key, lock must be held. '''
+        entry = self._entries.pop(key)
+        if entry is not None:
+            self._forget(key, entry)
+
+    def _forget(self, key, entry):
+        ''' Update byte count and table index for a removed entry, lock must be held. '''
+        self.bytes -= entry[2]
+        for table in entry[1]:
+            keys = self._tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tables[table]
+
+    def invalidate(self, table=None):
+        ''' Remove cached results read from table, all cached results if table is not provided. '''
+        with self._lock:
+            if table is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._tables.clear()
+                self.bytes = 0
+                return
+            for key in list(self._tables.get(table_key(table), ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def stats(self):
+        ''' Return a dict of cache statistics. '''
+        with self._lock:
+            lookups = self.hits + self.misses
+            return dict(entries=len(self._entries), bytes=self.bytes, hits=self.hits, misses=self.misses,
+                        hit_ratio=float(self.hits) / lookups if lookups else 0.0, evictions=self.evictions,
+                        expirations=self.expirations, invalidations=self.invalidations)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+''' BeeSQL columnar results. Results are returned as numpy arrays when numpy is installed
+    and as array.array (or lists for non numeric columns) otherwise. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import array
+from itertools import izip
+
+# numpy is slow to import, it is imported when the first result is built. False until then.
+_numpy = False
+
+def numpy_module():
+    ''' Return numpy module, None if numpy is not installed. '''
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+# array.array type codes used for integer and float columns.
+INTEGER = 'l'
+FLOAT = 'd'
+
+class Columns(dict):
+    ''' Mapping of column name to an array of column values.
+
+    Attributes:
+        :names: Column names in result order.
+        :masks: Mapping of column name to a boolean array which is true where the value is NULL.
+                Only columns which contained NULL values have a mask. NULL values are stored
+                as 0 in numeric columns and None in other columns. '''
+    def __init__(self, names):
+        dict.__init__(self)
+        self.names = names
+        self.masks = {}
+
+    @property
+    def rows(self):
+        ''' Number of rows. '''
+        if not self.names:
+            return 0
+        return len(self[self.names[0]])
+
+class ColumnBuilder(object):
+    ''' Fills typed per column buffers from batches of row tuples.
+
+    A column starts as an integer buffer, is widened to a float buffer when a float value
+    is seen and falls back to a list of objects for any other type. '''
+    def __init__(self, names):
+        self.names = names
+        self.count = 0
+        self._buffers = [None] * len(names)
+        self._masks = [None] * len(names)
+
+    def add(self, rows):
+        ''' Add a batch of row tuples. '''
+        if not rows:
+            return self
+        for index, values in enumerate(izip(*rows)):
+            self._extend(index, values)
+        self.count += len(rows)
+        return self
+
+    def _extend(self, index, values):
+        ''' Append values of a column batch to the column's buffer. '''
+        nulls = None in values
+        mask = self._masks[index]
+        if nulls and mask is None:
+            mask = self._masks[index] = array.array('b', [0]) * self.count
+        if mask is not None:
+            mask.extend([value is None for value in values])
+        buf = self._buffers[index]
+        if buf is None:
+            buf = self._buffers[index] = self._new_buffer(values)
+            if buf is None:
+                # Only NULL values so far, the mask already records them.
+                return
+        size = len(buf)
+        try:
+            buf.extend(_fill_nulls(buf, values) if nulls else values)
+        except (TypeError, OverflowError):
+            # array.extend appends item by item, drop whatever was appended before widening.
+            del buf[size:]
+            buf = self._buffers[index] = self._widen(buf, values, mask)
+            buf.extend(_fill_nulls(buf, values) if nulls else values)
+
+    def _new_buffer(self, values):
+        ''' Return a buffer for the type of the first non NULL value, prefilled for rows added before.
+            Return None if all values are NULL. '''
+        for value in values:
+            if value is not None:
+                kind = type(value)
+                break
+        else:
+            return None
+        if kind in (int, long, bool):
+            return array.array(INTEGER, [0]) * self.count
+        if kind is float:
+            return array.array(FLOAT, [0]) * self.count
+        return [None] * self.count
+
+    def _widen(self, buf, values, mask):
+        ''' Return buf converted to a buffer able to hold values. '''
+        if type(buf) is not list and buf.typecode == INTEGER and float in [type(value) for value in values]:
+            try:
+                array.array(FLOAT, _fill_nulls(buf, values))
+                return array.array(FLOAT, buf)
+            except (TypeError, OverflowError):
+                pass
+        if mask is None:
+            return list(buf)
+        # NULL values were stored as 0 in the numeric buffer.
+        return [None if null else value for value, null in izip(buf, mask)]
+
+    def finish(self):
+        ''' Return built columns as a Columns mapping. '''
+        columns = Columns(self.names)
+        numpy = numpy_module()
+        for name, buf, mask in izip(self.names, self._buffers, self._masks):
+            if buf is None:
+                buf = [None] * self.count
+            columns[name] = _to_array(buf)
+            if mask is not None:
+                columns.masks[name] = numpy.array(mask, dtype=bool) if numpy is not None else mask
+        return columns
+
+def _fill_nulls(buf, values):
+    ''' Return values with NULL values replaced by the fill value of buf. '''
+    if type(buf) is list:
+        return values
+    return [0 if value is None else value for value in values]
+
+def _to_array(buf):
+    ''' Return buffer as a numpy array if numpy is installed. '''
+    numpy = numpy_module()
+    if numpy is None:
+        return buf
+    if type(buf) is list:
+        values = numpy.empty(len(buf), dtype=object)
+        values[:] = buf
+        return values
+    return numpy.frombuffer(buf, dtype=buf.typecode) if len(buf) else numpy.array([], dtype=buf.typecode)
+
+def column_names(description):
+    ''' Return column names of a cursor description. '''
+    return tuple([column[0] for column in description or ()])
@@ -5,9 +5,64 @@
 # Author: Kasun Herath <kasunh01@gmail.com>
 # Source: https://github.com/kasun/BeeSQL
 
+import threading
+
 import beesql
+from pooling import ConnectionPool
+from routing import RoutedConnection
+from sharing import SharedConnection
+from specs import ConnectionSpec
+
+# Connection classes of engines as 'module:class' paths, imported on first use.
+BACKENDS = {
+    'mysql': 'beesql.backends.mysql:MYSQLConnection',
+    'sqlite': 'beesql.backends.sqlite:SQLITEConnection',
+}
+# Connection classes of engines which were already imported.
+_backend_classes = {}
+_backends_lock = threading.Lock()
+
+def register_backend(engine, backend):
+    ''' Register a connection class for engine, replacing any registered one.
+
+    Arguments:
+        :engine (str): Engine name passed to connection.
+        :backend: Connection class, or its 'module:class' path to import it on first use. The class is
+                  called with username, password, host, port, db, unix_socket and connection options. '''
+    with _backends_lock:
+        _backend_classes.pop(engine, None)
+        if isinstance(backend, basestring):
+            BACKENDS[engine] = backend
+        else:
+            BACKENDS[engine] = '%s:%s' % (backend.__module__, backend.__name__)
+            _backend_classes[engine] = backend
+
+def backend(engine):
+    ''' Return connection class of engine, importing its module and database driver on first use.
 
-def connection(engine='mysql', username=None, password=None, host='localhost', port=3306, db=None, unix_socket=None):
+    Raises:
+        beesql.BeeSQLError. '''
+    try:
+        return _backend_classes[engine]
+    except KeyError:
+        pass
+    with _backends_lock:
+        if engine not in _backend_classes:
+            try:
+                module_name, class_name = BACKENDS[engine].split(':')
+            except KeyError:
+                raise beesql.BeeSQLError('Invalid engine: %s' % (engine))
+            try:
+                module = __import__(module_name, fromlist=[class_name])
+            except ImportError, ie:
+                raise beesql.BeeSQLError('Engine %s is not available: %s' % (engine, ie))
+            try:
+                _backend_classes[engine] = getattr(module, class_name)
+            except AttributeError:
+                raise beesql.BeeSQLError('Invalid engine: %s' % (engine))
+        return _backend_classes[engine]
+
+def connection(engine='mysql', username=None, password=None, host='localhost', port=3306, db=None, unix_socket=None, **options):
     ''' Create and return a connection to a Database using specified engine.
 
     Arguments:
@@ -18,6 +73,17 @@ def connection(engine='mysql', username=None, password=None, host='localhost', p
         :port: port to connect to Database; Default to 3306, Not used with sqlite.
         :db: Database name; Optional, if engine is sqlite a filename is expected.
         :unix_socket: Used to connect to the Database through a unix socket; Optional, not used with sqlite. 
+        :statement_cache_size: Number of compiled statements cached by CRUD methods; Default to 256, 0 disables caching.
+        :row_format: Format of returned rows, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to dict.
+        :result_cache: Optional, beesql.cache.ResultCache caching results of get and select. A cache can be shared by connections.
+        :commit_every: Optional, outside transactions commit once every commit_every writing statements.
+        :commit_interval: Optional, outside transactions commit once commit_interval milliseconds passed since last commit,
+                          checked whenever a statement runs.
+        :query_stats: Optional, beesql.stats.QueryStats collecting per statement latency statistics. Can be shared by connections.
+        :lazy: Optional, if True the database is connected to (and db selected) on first use instead of upfront.
+        :cached_statements: Number of parsed statements kept for reuse by sqlite; Default to 100, only used with sqlite.
+        :profile: Preset of sqlite pragmas, one of 'default', 'durable', 'throughput' or 'readonly'; only used with sqlite.
+        :pragmas: Optional, dict of sqlite pragmas set on connect, overriding those of profile; only used with sqlite.
 
     Returns:
         Instance of BeeSQLDatabase Connection.
@@ -25,11 +91,96 @@ def connection(engine='mysql', username=None, password=None, host='localhost', p
     Raises:
         beesql.BeeSQLError. '''
 
-    try:
-        mod = __import__('beesql.backends.%s' % (engine), fromlist=['beesql.backends'])
-        connection = getattr(mod, '%sConnection' % (engine.upper()))(username, password, host, port, db, unix_socket)
-        return connection
-    except ImportError:
-        raise beesql.BeeSQLError('Invalid engine: %s' % (engine))
-    except AttributeError:
-        raise beesql.BeeSQLError('Invalid engine: %s' % (engine))
+    return backend(engine)(username, password, host, port, db, unix_socket, **options)
+
+def pool(engine='mysql', min_size=1, max_size=10, **options):
+    ''' Create and return a pool of connections to a Database using specified engine.
+
+    Arguments:
+        :engine: Database to use; Default to mysql.
+        :min_size: Number of connections opened upfront and kept open; Default to 1.
+        :max_size: Maximum number of open connections; Default to 10.
+        :options: Pool options (timeout, idle_timeout, max_lifetime, ping_interval) and
+                  connection options accepted by connection.
+
+    Returns:
+        Instance of beesql.pooling.ConnectionPool.
+
+    Raises:
+        beesql.BeeSQLError, beesql.BeeSQLDatabaseError.
+
+    Example::
+
+        pool = beesql.pool(username='root', password='rootpass', db='beesql', max_size=20)
+        with pool.connection() as db:
+            db.select('beesql_version') '''
+    return ConnectionPool(engine, min_size, max_size, **options)
+
+def spec(engine='mysql', **options):
+    ''' Create and return a picklable spec of a connection, to send to worker processes which open
+        connections of their own from it.
+
+    Arguments:
+        :engine: Database to use; Default to mysql.
+        :options: Connection options accepted by connection, except result_cache and query_stats.
+
+    Returns:
+        Instance of beesql.specs.ConnectionSpec.
+
+    Raises:
+        beesql.BeeSQLError.
+
+    Example::
+
+        spec = beesql.spec(username='root', password='rootpass', db='beesql')
+        pool.map(count_downloads, [(spec, year) for year in range(2010, 2020)])
+        # In count_downloads.
+        spec.connection().query('SELECT COUNT(*) FROM beesql_downloads WHERE year=%s', (year,)) '''
+    return ConnectionSpec(engine, **options)
+
+def shared(engine='mysql', connections=4, **options):
+    ''' Create and return a connection which threads can use at once, spreading their statements over
+        up to connections underlying connections.
+
+    Arguments:
+        :engine: Database to use; Default to mysql.
+        :connections: Maximum number of underlying connections; Default to 4.
+        :options: timeout, seconds a call waits for a free connection, and connection options accepted by connection.
+
+    Returns:
+        Instance of beesql.sharing.SharedConnection.
+
+    Raises:
+        beesql.BeeSQLError, beesql.BeeSQLDatabaseError.
+
+    Example::
+
+        db = beesql.shared(username='root', password='rootpass', db='beesql', connections=8)
+        # From any thread.
+        db.insert('beesql_downloads', version='0.1')
+        db.lastrowid '''
+    return SharedConnection(engine, connections, **options)
+
+def routed(primary, replicas, strategy='least_outstanding', sticky=1.0, fallback=True):
+    ''' Create and return a connection sending writes to a primary and reads to replicas.
+
+    Arguments:
+        :primary: Connection, or dict of connection options, of the primary.
+        :replicas: List of connections, or dicts of connection options, of replicas.
+        :strategy: 'least_outstanding' or 'round_robin' replica selection; Default to least_outstanding.
+        :sticky: Seconds after a write reads go to the primary; Default to 1.
+        :fallback: Retry reads failing on a replica on the primary; Default to True.
+
+    Returns:
+        Instance of beesql.routing.RoutedConnection.
+
+    Raises:
+        beesql.BeeSQLError, beesql.BeeSQLDatabaseError.
+
+    Example::
+
+        db = beesql.routed(dict(username='root', password='rootpass', host='primary', db='beesql'),
+                           [dict(username='root', password='rootpass', host='replica1', db='beesql')])
+        db.insert('beesql_version', version='0.2')
+        db.select('beesql_version') '''
+    return RoutedConnection(primary, replicas, strategy, sticky, fallback)
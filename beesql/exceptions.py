@@ -11,4 +11,7 @@ class BeeSQLError(Exception):
 class BeeSQLDatabaseError(Exception):
     ''' Database operation related BeeSQL Error. '''
 
+class BeeSQLConnectionError(BeeSQLDatabaseError):
+    ''' Failed or lost database connection related BeeSQL Error. '''
+
 
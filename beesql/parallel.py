@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+''' BeeSQL parallel reads.
+
+parallel_select splits a table into ranges of a partition key and reads the ranges concurrently,
+each worker thread on a connection of its own opened with connection.clone(). MySQL runs the
+range queries on separate server threads. sqlite reads a database file from several connections
+concurrently, in WAL journal mode readers are not blocked by a writer either. In memory sqlite
+databases can not be read in parallel.
+
+map_query runs a query once per partition in a pool of worker processes, each opening a connection
+of its own from a picklable ConnectionSpec, for work which is limited by Python rather than the database. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import multiprocessing
+import Queue
+import threading
+
+from beesql.exceptions import BeeSQLError
+from beesql.rows import ROW_FORMATS
+from beesql.rows import converter
+from beesql.specs import ConnectionSpec
+
+# Seconds a worker waits on a full queue before checking whether reading was stopped.
+PUT_TIMEOUT = 0.1
+# Marks the end of a partition in a result queue.
+DONE = object()
+
+class _Failure(object):
+    ''' Exception raised by a worker, re-raised by the reading thread. '''
+    def __init__(self, exception):
+        self.exception = exception
+
+def partition_bounds(connection, table, partition_key, partitions, where=None, where_conditions=None):
+    ''' Return sorted list of partitions + 1 bounds of partition_key splitting table's rows into partitions ranges.
+        Numeric keys are split into equally wide ranges between their minimum and maximum, other keys
+        at quantiles. Return an empty list if the table has no rows. '''
+    conditions, escapes = connection._conditions(connection.placeholder, where, where_conditions)
+    where_sql = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+    low, high, count = connection.query('SELECT MIN(%s), MAX(%s), COUNT(%s) FROM %s%s' % (
+        partition_key, partition_key, partition_key, table, where_sql), tuple(escapes) or None, row_format='tuple')[0]
+    if not count:
+        return []
+    if isinstance(low, (int, long, float)) and not isinstance(low, bool):
+        step = (high - low) / float(partitions)
+        bounds = [low] + [low + step * i for i in range(1, partitions)] + [high]
+        if isinstance(low, (int, long)):
+            bounds = [int(bound) for bound in bounds]
+    else:
+        sql = 'SELECT %s FROM %s%s ORDER BY %s LIMIT 1 OFFSET %%d' % (partition_key, table, where_sql, partition_key)
+        bounds = [low]
+        for i in range(1, partitions):
+            bounds.append(connection.query(sql % (count * i / partitions), tuple(escapes) or None, row_format='tuple')[0][0])
+        bounds.append(high)
+    # Drop empty ranges of small or skewed key spaces.
+    unique = [bounds[0]]
+    for bound in bounds[1:]:
+        if bound != unique[-1]:
+            unique.append(bound)
+    return unique if len(unique) > 1 else [low, high]
+
+def _put(output, item, stop):
+    ''' Put item in output queue unless reading was stopped. Return False if reading was stopped. '''
+    while not stop.is_set():
+        try:
+            output.put(item, timeout=PUT_TIMEOUT)
+            return True
+        except Queue.Full:
+            pass
+    return False
+
+def _work(connection, tasks, outputs, stop, sql, escapes, batch_size, row_format):
+    ''' Worker thread, read partitions taken from tasks on a clone of connection. '''
+    clone = None
+    try:
+        while not stop.is_set():
+            try:
+                index, bounds = tasks.get_nowait()
+            except Queue.Empty:
+                return
+            output = outputs[index]
+            try:
+                if clone is None:
+                    clone = connection.clone()
+                batch = []
+                for row in clone.iter_query(sql[index], tuple(escapes) + bounds, batch_size, row_format):
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        if not _put(output, batch, stop):
+                            return
+                        batch = []
+                if batch and not _put(output, batch, stop):
+                    return
+                _put(output, DONE, stop)
+            except Exception, e:
+                _put(output, _Failure(e), stop)
+                return
+    finally:
+        if clone is not None:
+            clone.close()
+
+def parallel_select(connection, table, partition_key, partitions=4, workers=4, columns=None, ordered=False,
+                    batch_size=1000, row_format=None, where=None, queue_size=4, **where_conditions):
+    ''' Read rows of table concurrently, split into partitions ranges of partition_key, and stream them back.
+
+    Arguments:
+        :connection: Connection to the database, partitions are read on clones of it.
+        :table (str): Table to read.
+        :partition_key (str): Column to split rows on, ideally indexed. Rows where it is NULL are not read.
+        :partitions (int): Number of ranges to split rows into.
+        :workers (int): Number of worker threads, each reading on a connection of its own.
+        :columns: Optional, tuple of columns to retrieve; Default to all.
+        :ordered (bool): Return rows in partition_key order. Otherwise rows are returned as they are read.
+        :batch_size (int): Number of rows handed from workers to the reading thread at once.
+        :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the connection's row format.
+        :where: Optional, where conditional clause as a string.
+        :queue_size (int): Number of batches a partition may read ahead of the reading thread.
+        :where_conditions: Optional, condition pairs to contruct where conditional clause if where is not provided.
+
+    Returns:
+        Generator of rows. Closing it stops the workers.
+
+    Raises:
+        BeeSQLError, BeeSQLDatabaseError. '''
+    if partitions < 1 or workers < 1:
+        raise BeeSQLError('partitions and workers should be at least 1')
+    bounds = partition_bounds(connection, table, partition_key, partitions, where, where_conditions)
+    if not bounds:
+        return
+    placeholder = connection.placeholder
+    conditions, escapes = connection._conditions(placeholder, where, where_conditions)
+    select = 'SELECT %s FROM %s WHERE ' % (connection._select_columns(partition_key, columns), table)
+    order = ' ORDER BY %s' % (partition_key) if ordered else ''
+    tasks = Queue.Queue()
+    sql = []
+    for index in range(len(bounds) - 1):
+        # Ranges include their lower bound, the last range also its upper bound.
+        upper = '<=' if index == len(bounds) - 2 else '<'
+        range_conditions = conditions + ['%s >= %s' % (partition_key, placeholder),
+                                         '%s %s %s' % (partition_key, upper, placeholder)]
+        sql.append(select + ' AND '.join(range_conditions) + order)
+        tasks.put((index, (bounds[index], bounds[index + 1])))
+    count = len(sql)
+    stop = threading.Event()
+    if ordered:
+        outputs = [Queue.Queue(queue_size) for i in range(count)]
+    else:
+        outputs = [Queue.Queue(queue_size * workers)] * count
+    threads = []
+    for i in range(min(workers, count)):
+        thread = threading.Thread(target=_work, name='beesql-parallel-%s' % (i),
+                                  args=(connection, tasks, outputs, stop, sql, escapes, batch_size, row_format))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    try:
+        if ordered:
+            for output in outputs:
+                for batch in _batches(output, 1):
+                    for row in batch:
+                        yield row
+        else:
+            for batch in _batches(outputs[0], count):
+                for row in batch:
+                    yield row
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+def _batches(output, partitions):
+    ''' Yield batches read from output until partitions partitions are done. Raise worker failures. '''
+    while partitions:
+        item = output.get()
+        if item is DONE:
+            partitions -= 1
+        elif isinstance(item, _Failure):
+            raise item.exception
+        else:
+            yield item
+
+def _query_partition(task):
+    ''' Run query of a partition in a worker process and return its column names and row tuples. '''
+    spec, sql, escapes = task
+    connection = spec.connection()
+    rows = connection.query(sql, escapes, row_format='tuple')
+    return [column[0] for column in connection.cursor.description or ()], rows
+
+def map_query(spec, sql, partitions, processes=4, ordered=True, row_format=None):
+    ''' Run a query once for each partition in a pool of worker processes and stream back the rows.
+        Each worker opens a connection of its own from spec on first use and keeps it for later partitions.
+
+    Arguments:
+        :spec: beesql.specs.ConnectionSpec, or a connection whose spec is used.
+        :sql (str): Query run for each partition.
+        :partitions: Iterable of tuples of escape values of sql, one per partition.
+        :processes (int): Number of worker processes.
+        :ordered (bool): Return rows of partitions in order of partitions. Otherwise rows of a partition
+                         are returned as soon as it is read.
+        :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the spec's row format.
+
+    Returns:
+        Generator of rows. Closing it terminates the workers.
+
+    Raises:
+        BeeSQLError, BeeSQLDatabaseError.
+
+    Example::
+
+        bounds = partition_bounds(connection, 'beesql_downloads', 'id', 16)
+        ranges = [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+        sql = 'SELECT * FROM beesql_downloads WHERE id >= %s AND id < %s'
+        for row in map_query(connection.spec(), sql, ranges, processes=8):
+            process(row) '''
+    if not isinstance(spec, ConnectionSpec):
+        spec = spec.spec()
+    if spec.engine == 'sqlite' and spec.options.get('db') == ':memory:':
+        raise BeeSQLError('In memory sqlite databases can not be read by other processes')
+    row_format = row_format or spec.options.get('row_format') or 'dict'
+    if row_format not in ROW_FORMATS:
+        raise BeeSQLError('Invalid row format %s, should be one of %s' % (row_format, ', '.join(ROW_FORMATS)))
+    pool = multiprocessing.Pool(processes)
+    try:
+        tasks = ((spec, sql, tuple(escapes) if escapes is not None else None) for escapes in partitions)
+        results = pool.imap(_query_partition, tasks) if ordered else pool.imap_unordered(_query_partition, tasks)
+        for names, rows in results:
+            for row in converter(row_format, [(name,) for name in names])(rows):
+                yield row
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+''' BeeSQL connection pool. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import contextlib
+import threading
+import time
+
+import beesql
+from beesql.exceptions import BeeSQLError
+from beesql.exceptions import BeeSQLDatabaseError
+
+class ConnectionPool(object):
+    ''' Thread safe pool of BeeSQL connections.
+
+    Connections are created using beesql.connection with the engine and connection options
+    provided to the pool. Idle connections are reused most recently released first, so that
+    surplus connections stay idle long enough to be evicted. '''
+    def __init__(self, engine='mysql', min_size=1, max_size=10, timeout=None, idle_timeout=300,
+                 max_lifetime=3600, ping_interval=1, **options):
+        ''' Initialize pool and open min_size connections.
+
+        Arguments:
+            :engine: Database to use; Default to mysql.
+            :min_size (int): Number of connections opened upfront and kept open while idle.
+            :max_size (int): Maximum number of connections open at a time.
+            :timeout (float): Seconds acquire waits for a free connection; Default to wait forever.
+            :idle_timeout (float): Seconds after which idle connections above min_size are closed; None disables.
+            :max_lifetime (float): Seconds after which a connection is closed and replaced; None disables.
+            :ping_interval (float): Connections idle longer than this are checked to be alive before being handed out.
+            :options: Connection options passed to beesql.connection. '''
+        if min_size > max_size:
+            raise BeeSQLError('min_size should not be larger than max_size')
+        if engine == 'sqlite':
+            # Pooled sqlite connections are created and used by different threads.
+            options.setdefault('check_same_thread', False)
+        self.engine = engine
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.options = options
+        self.closed = False
+        self._cond = threading.Condition(threading.Lock())
+        # Idle connections as [connection, created, released] entries, most recently released last.
+        self._idle = []
+        # Created time of checked out connections.
+        self._in_use = {}
+        self._size = 0
+        self._stats = dict(checkouts=0, waits=0, wait_time=0.0, max_wait_time=0.0, timeouts=0,
+                           created=0, closed=0, recycled=0, evicted=0, failed_pings=0, broken=0)
+        for i in range(min_size):
+            self._size += 1
+            self._idle.append([self._connect(), time.time(), time.time()])
+
+    def _connect(self):
+        ''' Open a new connection. '''
+        connection = beesql.connection(engine=self.engine, **self.options)
+        with self._cond:
+            self._stats['created'] += 1
+        return connection
+
+    def _discard(self, connection, reason=None):
+        ''' Close connection and free its slot in the pool. '''
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats['closed'] += 1
+            if reason:
+                self._stats[reason] += 1
+            self._cond.notify()
+
+    def _idle_expired(self, now):
+        ''' Remove and return idle connections above min_size idle for longer than idle_timeout, lock must be held. '''
+        evicted = []
+        # Least recently released connections are at the front of the idle list.
+        while (self.idle_timeout is not None and self._idle and self._size - len(evicted) > self.min_size
+               and now - self._idle[0][2] > self.idle_timeout):
+            evicted.append(self._idle.pop(0)[0])
+        return evicted
+
+    def _expired(self, created, now):
+        ''' Return True if a connection created at created has outlived max_lifetime. '''
+        return self.max_lifetime is not None and now - created > self.max_lifetime
+
+    def acquire(self, timeout=None):
+        ''' Check out a connection, waiting for one to be released if max_size connections are in use.
+
+        Arguments:
+            :timeout (float): Seconds to wait; Default to the pool's timeout.
+
+        Returns:
+            Instance of BeeSQLDatabase Connection.
+
+        Raises:
+            BeeSQLError if the pool is closed or timeout is reached, BeeSQLDatabaseError. '''
+        if timeout is None:
+            timeout = self.timeout
+        start = time.time()
+        waited = False
+        # Idle connections are also evicted on checkout, so that a pool which is not released to shrinks.
+        with self._cond:
+            evicted = self._idle_expired(start)
+        for idle_connection in evicted:
+            self._discard(idle_connection, 'evicted')
+        while True:
+            entry = None
+            with self._cond:
+                while True:
+                    if self.closed:
+                        raise BeeSQLError('Connection pool is closed')
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    waited = True
+                    remaining = None
+                    if timeout is not None:
+                        remaining = timeout - (time.time() - start)
+                        if remaining <= 0:
+                            self._stats['timeouts'] += 1
+                            raise BeeSQLError('Timed out waiting for a pooled connection')
+                    self._cond.wait(remaining)
+            now = time.time()
+            if entry is None:
+                try:
+                    connection = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                created = now
+            else:
+                connection, created, released = entry
+                if self._expired(created, now):
+                    self._discard(connection, 'recycled')
+                    continue
+                if now - released > self.ping_interval:
+                    try:
+                        connection.ping()
+                    except BeeSQLDatabaseError:
+                        self._discard(connection, 'failed_pings')
+                        continue
+            wait_time = time.time() - start
+            with self._cond:
+                self._in_use[connection] = created
+                self._stats['checkouts'] += 1
+                if waited:
+                    self._stats['waits'] += 1
+                self._stats['wait_time'] += wait_time
+                self._stats['max_wait_time'] = max(self._stats['max_wait_time'], wait_time)
+            return connection
+
+    def release(self, connection):
+        ''' Return a checked out connection to the pool. An open transaction is rolled back, statements held
+            back by the commit policy are committed. A connection failing to commit is closed and the error raised.
+
+        Raises:
+            BeeSQLError if connection is not checked out from this pool, BeeSQLDatabaseError. '''
+        with self._cond:
+            created = self._in_use.pop(connection, None)
+        if created is None:
+            raise BeeSQLError('Connection is not checked out from this pool')
+        try:
+            if connection.in_transaction:
+                try:
+                    connection.rollback()
+                except BeeSQLDatabaseError:
+                    pass
+                connection.transaction_off()
+            else:
+                connection.flush()
+        except:
+            self._discard(connection, 'broken')
+            raise
+        now = time.time()
+        if self.closed or self._expired(created, now):
+            self._discard(connection, None if self.closed else 'recycled')
+            return
+        with self._cond:
+            self._idle.append([connection, created, now])
+            evicted = self._idle_expired(now)
+            self._cond.notify()
+        for idle_connection in evicted:
+            self._discard(idle_connection, 'evicted')
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        ''' Context manager checking out a connection and releasing it on exit.
+
+        Example::
+
+            with pool.connection() as db:
+                db.get('beesql_version', version='0.1') '''
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def stats(self):
+        ''' Return a dict of pool size and checkout statistics. '''
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(size=self._size, idle=len(self._idle), in_use=len(self._in_use))
+        stats['avg_wait_time'] = stats['wait_time'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        return stats
+
+    def close(self):
+        ''' Close idle connections. Checked out connections are closed when released. '''
+        with self._cond:
+            self.closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for connection, created, released in idle:
+            self._discard(connection)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+''' BeeSQL prepared statements. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import os
+
+from beesql.exceptions import BeeSQLError
+
+class PreparedStatement(object):
+    ''' Statement prepared once with connection.prepare and executed many times on a dedicated cursor.
+        Executions go through the connection, so commit policy, transactions, hooks and result
+        cache invalidation apply as they do to query. '''
+    def __init__(self, connection, sql, cursor):
+        self.connection = connection
+        self.sql = sql
+        self.cursor = cursor
+        self.closed = False
+        # Process the statement's cursor belongs to.
+        self.pid = os.getpid()
+
+    def _check(self):
+        if self.closed:
+            raise BeeSQLError('Prepared statement is closed')
+        if self.pid != os.getpid():
+            raise BeeSQLError('Prepared statement was prepared by another process, prepare it again after fork')
+
+    def execute(self, escapes=None, row_format=None):
+        ''' Execute the statement with escape values.
+
+        Arguments:
+            :escapes: Optional, A tuple of escape values.
+            :row_format: Optional, one of 'dict', 'tuple', 'namedtuple' or 'row'; Default to the connection's row format.
+
+        Returns:
+            List of rows, empty for statements which return no rows.
+
+        Raises:
+            BeeSQLError, BeeSQLDatabaseError. '''
+        self._check()
+        connection = self.connection
+        connection.last_sql = self.sql
+        connection.last_escapes = escapes
+        try:
+            return connection._run_query(self.sql, escapes, row_format, self.cursor)
+        except connection.database_errors, e:
+            raise connection._database_error(e)
+
+    def executemany(self, escapes_list):
+        ''' Execute the statement once for each tuple of escape values and commit once.
+
+        Returns:
+            Number of affected rows.
+
+        Raises:
+            BeeSQLError, BeeSQLDatabaseError. '''
+        self._check()
+        connection = self.connection
+        connection.last_sql = self.sql
+        connection.last_escapes = None
+        try:
+            return connection._run_many(self.sql, escapes_list, self.cursor)
+        except connection.database_errors, e:
+            raise connection._database_error(e)
+
+    def iter(self, escapes=None, batch_size=1000, row_format=None):
+        ''' Execute the statement and iterate over resulting rows, fetching batch_size rows at a time.
+            Rows are read through a cursor of their own, so the statement can be executed meanwhile. '''
+        self._check()
+        return self.connection.iter_query(self.sql, escapes, batch_size, row_format)
+
+    @property
+    def lastrowid(self):
+        ''' Return row ID of last insert executed by the statement. '''
+        return self.cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        ''' Return number of rows affected by last execution. '''
+        return self.cursor.rowcount
+
+    def close(self):
+        ''' Close the statement's cursor. '''
+        if not self.closed:
+            self.closed = True
+            if self.pid == os.getpid():
+                self.cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+''' BeeSQL read/write splitting across a primary and replicas. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import contextlib
+import itertools
+import re
+import threading
+import time
+
+import beesql
+from beesql.exceptions import BeeSQLConnectionError
+from beesql.exceptions import BeeSQLError
+
+# Leading keywords of queries which may run on a replica.
+READ_QUERIES = frozenset(['SELECT', 'SHOW', 'EXPLAIN', 'DESCRIBE', 'DESC'])
+# Locking reads run on the primary.
+LOCKING_READ = re.compile(r'\bFOR\s+UPDATE\b|\bLOCK\s+IN\s+SHARE\s+MODE\b|\bFOR\s+SHARE\b', re.I)
+# Methods which only read and run on a replica.
+READ_METHODS = frozenset(['get', 'get_many', 'select', 'query_columns', 'tables', 'explain', 'indexes', 'table_rows'])
+# Methods returning generators of rows read from a replica.
+ITER_METHODS = frozenset(['iter_query', 'iter_select', 'paginate'])
+# Methods which neither read nor write data, called on the primary without keeping reads on it.
+PRIMARY_METHODS = frozenset(['stats', 'enable_stats', 'disable_stats', 'add_hook', 'remove_hook', 'enable_result_cache',
+                             'enable_index_advisor', 'disable_index_advisor', 'index_advice', 'settings', 'spec'])
+STRATEGIES = ('least_outstanding', 'round_robin')
+
+def is_read_only(sql):
+    ''' Return True if sql is a query which does not change data or take locks. '''
+    words = sql.split(None, 1)
+    return bool(words) and words[0].upper() in READ_QUERIES and LOCKING_READ.search(sql) is None
+
+class _Node(object):
+    ''' A connection of a RoutedConnection with its load and latency statistics. '''
+    def __init__(self, name, connection):
+        self.name = name
+        self.connection = connection
+        self.outstanding = 0
+        self.queries = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def stats(self):
+        return dict(queries=self.queries, errors=self.errors, outstanding=self.outstanding,
+                    avg_ms=self.total_time / self.queries * 1000 if self.queries else 0.0, max_ms=self.max_time * 1000)
+
+class RoutedConnection(object):
+    ''' Connection sending writes to a primary and reads to replicas.
+
+    get, get_many, select, query_columns, tables, explain, indexes, table_rows, iter_query, iter_select, paginate
+    and query of read only statements run on a replica. Everything else, including locking reads, runs on the primary.
+    Reads run on the primary too within a transaction and for sticky seconds after a write, so that
+    writes are read back. Attributes which are not methods, such as lastrowid, and methods which neither read nor
+    write data, such as stats, are the primary's. '''
+    def __init__(self, primary, replicas, strategy='least_outstanding', sticky=1.0, fallback=True):
+        ''' Initialize routed connection.
+
+        Arguments:
+            :primary: Connection, or dict of beesql.connection options, of the primary.
+            :replicas: List of connections, or dicts of beesql.connection options, of replicas.
+            :strategy (str): 'least_outstanding' picks the replica running fewest queries, 'round_robin' takes turns.
+            :sticky (float): Seconds after a write reads stay on the primary; 0 disables.
+            :fallback (bool): Retry reads on the primary when the connection to a replica fails.
+
+        Raises:
+            BeeSQLError, BeeSQLDatabaseError. '''
+        if strategy not in STRATEGIES:
+            raise BeeSQLError('Invalid routing strategy %s, should be one of %s' % (strategy, ', '.join(STRATEGIES)))
+        self._primary = _Node('primary', self._open(primary))
+        self._replicas = [_Node('replica-%s' % (i), self._open(replica)) for i, replica in enumerate(replicas)]
+        self.strategy = strategy
+        self.sticky = sticky
+        self.fallback = fallback
+        self._last_write = None
+        self._turns = itertools.cycle(range(len(self._replicas)))
+        self._lock = threading.Lock()
+
+    def _open(self, connection):
+        ''' Return connection, opened with beesql.connection if it is a dict of options. '''
+        if isinstance(connection, dict):
+            return beesql.connection(**connection)
+        return connection
+
+    def _read_node(self):
+        ''' Return node a read should run on. '''
+        if not self._replicas or self._primary.connection.in_transaction:
+            return self._primary
+        if self._last_write is not None and time.time() - self._last_write < self.sticky:
+            return self._primary
+        with self._lock:
+            if self.strategy == 'round_robin':
+                return self._replicas[next(self._turns)]
+            # Ties go to the replica which ran fewest queries.
+            return min(self._replicas, key=lambda node: (node.outstanding, node.queries))
+
+    def _begin(self, node):
+        with self._lock:
+            node.outstanding += 1
+        return time.time()
+
+    def _end(self, node, start, failed=False):
+        elapsed = time.time() - start
+        with self._lock:
+            node.outstanding -= 1
+            node.queries += 1
+            node.total_time += elapsed
+            node.max_time = max(node.max_time, elapsed)
+            if failed:
+                node.errors += 1
+
+    def _call(self, node, name, args, kwargs):
+        ''' Run method name on node's connection, recording its statistics. '''
+        start = self._begin(node)
+        try:
+            result = getattr(node.connection, name)(*args, **kwargs)
+        except:
+            self._end(node, start, True)
+            raise
+        self._end(node, start)
+        return result
+
+    def _read(self, name, args, kwargs):
+        ''' Run read method name on a replica, on the primary if the replica's connection fails and fallback
+            is set. Errors of the statement itself are raised. '''
+        node = self._read_node()
+        try:
+            return self._call(node, name, args, kwargs)
+        except (BeeSQLConnectionError,) + node.connection.connection_errors:
+            if node is self._primary or not self.fallback:
+                raise
+        return self._call(self._primary, name, args, kwargs)
+
+    def _iter(self, node, name, args, kwargs):
+        ''' Iterate over rows of generator method name on node, counted as outstanding until exhausted or closed. '''
+        start = self._begin(node)
+        failed = True
+        try:
+            for row in getattr(node.connection, name)(*args, **kwargs):
+                yield row
+            failed = False
+        except GeneratorExit:
+            failed = False
+            raise
+        finally:
+            self._end(node, start, failed)
+
+    def _write(self, name, args, kwargs):
+        ''' Run method name on the primary and keep reads on it for sticky seconds. '''
+        try:
+            return self._call(self._primary, name, args, kwargs)
+        finally:
+            self._last_write = time.time()
+
+    def query(self, sql, escapes=None, row_format=None):
+        ''' Run provided query, on a replica if it is read only. See the connection's query. '''
+        if is_read_only(sql):
+            return self._read('query', (sql, escapes, row_format), {})
+        return self._write('query', (sql, escapes, row_format), {})
+
+    def __getattr__(self, name):
+        # Private attributes, also those missing from a partly initialized instance, are not the primary's.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        attribute = getattr(self._primary.connection, name)
+        if not callable(attribute) or name in PRIMARY_METHODS:
+            return attribute
+        if name in READ_METHODS:
+            return lambda *args, **kwargs: self._read(name, args, kwargs)
+        if name in ITER_METHODS:
+            return lambda *args, **kwargs: self._iter(self._read_node(), name, args, kwargs)
+        return lambda *args, **kwargs: self._write(name, args, kwargs)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        ''' Context manager running the block in a transaction on the primary, reads included.
+            Reads stay on the primary for sticky seconds after the block ends. '''
+        self._last_write = time.time()
+        try:
+            with self._primary.connection.transaction() as connection:
+                yield connection
+        finally:
+            self._last_write = time.time()
+
+    def routing_stats(self):
+        ''' Return dict of query count, errors, outstanding queries and latency in milliseconds per connection. '''
+        with self._lock:
+            return dict((node.name, node.stats()) for node in [self._primary] + self._replicas)
+
+    def close(self):
+        ''' Close primary and replica connections. '''
+        for node in [self._primary] + self._replicas:
+            node.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
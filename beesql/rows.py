@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+''' BeeSQL row formats. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import collections
+from itertools import izip
+
+from beesql.cache import LRUCache
+
+ROW_FORMATS = ('dict', 'tuple', 'namedtuple', 'row')
+
+class Row(tuple):
+    ''' Lazy row which is a tuple of column values and can also be accessed by column name,
+        like sqlite3.Row. Subclasses carrying the column names are created per result shape. '''
+    __slots__ = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, basestring):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        ''' Return value of column key, default if there is no such column. '''
+        index = self._index.get(key)
+        if index is None:
+            return default
+        return tuple.__getitem__(self, index)
+
+    def keys(self):
+        ''' Return column names. '''
+        return list(self._fields)
+
+    def items(self):
+        ''' Return (column name, value) pairs. '''
+        return zip(self._fields, self)
+
+    def asdict(self):
+        ''' Return row as a dict. '''
+        return dict(izip(self._fields, self))
+
+# Namedtuple and Row classes are expensive to create, reuse them for results of the same shape.
+_row_classes = LRUCache(128)
+
+def _row_class(row_format, names):
+    ''' Return namedtuple or Row class for provided column names. '''
+    key = (row_format, names)
+    row_class = _row_classes.get(key)
+    if row_class is None:
+        if row_format == 'namedtuple':
+            row_class = collections.namedtuple('Row', names, rename=True)
+        else:
+            index = {}
+            for position, name in enumerate(names):
+                index.setdefault(name, position)
+            row_class = type('Row', (Row,), dict(__slots__=(), _fields=names, _index=index))
+        _row_classes.put(key, row_class)
+    return row_class
+
+def converter(row_format, description):
+    ''' Return a function converting a list of row tuples to rows of row_format.
+        Column names are taken from the cursor description once per result. '''
+    if row_format == 'tuple':
+        return lambda rows: rows
+    names = tuple([column[0] for column in description])
+    if row_format == 'dict':
+        return lambda rows: [dict(izip(names, row)) for row in rows]
+    make = _row_class(row_format, names)
+    if row_format == 'namedtuple':
+        make = make._make
+    return lambda rows: map(make, rows)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+
+''' BeeSQL connection shared by threads. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import contextlib
+import threading
+
+import beesql
+from beesql.advisor import IndexAdvisor
+from beesql.cache import ResultCache
+from beesql.exceptions import BeeSQLError
+from beesql.pooling import ConnectionPool
+from beesql.stats import QueryStats
+
+# Methods returning generators, the connection is held until they are exhausted or closed.
+ITER_METHODS = frozenset(['iter_query', 'iter_select', 'paginate', 'parallel_select'])
+# Methods whose effect lasts beyond the call, they are only available within a session.
+SESSION_METHODS = frozenset(['prepare', 'transaction_on', 'transaction_off', 'commit', 'rollback', 'fast_ingest',
+                             'batched_commits', 'use'])
+
+class SharedConnection(object):
+    ''' Connection which can be used by many threads at once.
+
+    Each call checks out one of a fixed number of underlying connections from a pool, runs on it and
+    returns it, so threads run statements concurrently without sharing cursors. lastsql, lastescapes
+    and lastrowid are those of the calling thread's last statement. Transactions and sessions hold
+    one connection for the calling thread until they end. Hooks, statistics, the result cache and the index
+    advisor enabled on the shared connection apply to all underlying connections and are shared by them. '''
+    def __init__(self, engine='mysql', connections=4, timeout=None, **options):
+        ''' Initialize shared connection.
+
+        Arguments:
+            :engine: Database to use; Default to mysql.
+            :connections (int): Maximum number of underlying connections, opened as threads need them.
+            :timeout (float): Seconds a call waits for a free connection; Default to wait forever.
+            :options: Connection options passed to beesql.connection.
+
+        Raises:
+            BeeSQLError, BeeSQLDatabaseError. '''
+        if engine == 'sqlite' and options.get('db') == ':memory:' and connections > 1:
+            raise BeeSQLError('In memory sqlite databases can not be shared by several connections')
+        self._backend = beesql.core.backend(engine)
+        self._lock = threading.Lock()
+        # Settings applied to underlying connections, replaced as a whole whenever one changes.
+        self._settings = dict(hooks=(), query_stats=None, stats_hook=None, result_cache=options.get('result_cache'),
+                              index_advisor=None)
+        query_stats = options.pop('query_stats', None)
+        if query_stats is not None:
+            self.enable_stats(stats=query_stats)
+        self.pool = ConnectionPool(engine, min_size=1, max_size=connections, timeout=timeout, idle_timeout=None,
+                                   **options)
+        self._local = threading.local()
+
+    def _checkout(self):
+        ''' Return connection of the thread's session, or one checked out from the pool, and whether it was checked out. '''
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            return self._configure(connection), False
+        return self._configure(self.pool.acquire()), True
+
+    def _configure(self, connection):
+        ''' Apply current settings to connection, unless they were applied already. '''
+        settings = self._settings
+        if getattr(connection, '_shared_settings', None) is not settings:
+            connection.hooks = list(settings['hooks'])
+            connection.query_stats = settings['query_stats']
+            connection._stats_hook = settings['stats_hook']
+            connection.result_cache = settings['result_cache']
+            connection.index_advisor = settings['index_advisor']
+            connection._shared_settings = settings
+        return connection
+
+    def _update(self, **settings):
+        ''' Change settings, underlying connections pick them up when they are next checked out. '''
+        with self._lock:
+            self._settings = dict(self._settings, **settings)
+
+    def _set_hooks(self, add=None, remove=None, **settings):
+        ''' Add hook add and remove hook remove along with changing settings. '''
+        with self._lock:
+            hooks = [hook for hook in self._settings['hooks'] if hook is not remove]
+            if remove is not None and len(hooks) == len(self._settings['hooks']):
+                raise ValueError('hook is not registered')
+            if add is not None:
+                hooks.append(add)
+            self._settings = dict(self._settings, hooks=tuple(hooks), **settings)
+
+    def _record(self, connection):
+        ''' Keep last statement of connection as the calling thread's. '''
+        sql = getattr(connection, 'last_sql', None)
+        self._local.last_sql = sql
+        self._local.last_escapes = getattr(connection, 'last_escapes', None)
+        # Row ID of the connection may be of another thread's insert unless this statement was an insert.
+        if sql and sql.split(None, 1)[0].upper() in ('INSERT', 'REPLACE'):
+            self._local.lastrowid = connection.lastrowid
+
+    def _run(self, name, args, kwargs):
+        ''' Call method name on a connection. '''
+        connection, acquired = self._checkout()
+        try:
+            return getattr(connection, name)(*args, **kwargs)
+        finally:
+            self._record(connection)
+            if acquired:
+                self.pool.release(connection)
+
+    def _iter(self, name, args, kwargs):
+        ''' Iterate over rows of generator method name, holding a connection until exhausted or closed. '''
+        connection, acquired = self._checkout()
+        try:
+            for row in getattr(connection, name)(*args, **kwargs):
+                yield row
+        finally:
+            self._record(connection)
+            if acquired:
+                self.pool.release(connection)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        attribute = getattr(self._backend, name)
+        if name in ITER_METHODS:
+            return lambda *args, **kwargs: self._iter(name, args, kwargs)
+        if name in SESSION_METHODS and getattr(self._local, 'connection', None) is None:
+            raise BeeSQLError('%s is only available within a session, use "with connection.session() as db"' % (name))
+        if callable(attribute):
+            return lambda *args, **kwargs: self._run(name, args, kwargs)
+        connection, acquired = self._checkout()
+        try:
+            return getattr(connection, name)
+        finally:
+            if acquired:
+                self.pool.release(connection)
+
+    @contextlib.contextmanager
+    def session(self):
+        ''' Context manager holding one connection for the calling thread within the block. Calls in the
+            block, by this thread, run on it, and it is yielded for methods needing a single connection.
+
+        Example::
+
+            with shared.session() as db:
+                statement = db.prepare('SELECT * FROM beesql_version WHERE id = ?')
+                rows = [statement.execute((i,)) for i in ids] '''
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            yield connection
+            return
+        connection = self._configure(self.pool.acquire())
+        self._local.connection = connection
+        try:
+            yield connection
+        finally:
+            self._local.connection = None
+            self._record(connection)
+            self.pool.release(connection)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        ''' Context manager running the calling thread's statements in the block in a transaction on one
+            connection. The transaction is committed on exit, rolled back if the block raises. '''
+        with self.session() as connection:
+            with connection.transaction():
+                yield self
+
+    @property
+    def lastsql(self):
+        ''' Return last sql statement run by the calling thread. '''
+        return getattr(self._local, 'last_sql', None)
+
+    @property
+    def lastescapes(self):
+        ''' Return escape values of the last statement run by the calling thread. '''
+        return getattr(self._local, 'last_escapes', None)
+
+    @property
+    def lastrowid(self):
+        ''' Return row ID of the last insert run by the calling thread. '''
+        return getattr(self._local, 'lastrowid', None)
+
+    @property
+    def in_transaction(self):
+        ''' Return True if the calling thread is in a transaction. '''
+        connection = getattr(self._local, 'connection', None)
+        return connection is not None and connection.in_transaction
+
+    def add_hook(self, before=None, after=None):
+        ''' Register callbacks run around every statement of the underlying connections, see add_hook of
+            connections. Callbacks are called by several threads at once.
+
+        Returns:
+            Handle which can be passed to remove_hook. '''
+        hook = (before, after)
+        self._set_hooks(add=hook)
+        return hook
+
+    def remove_hook(self, hook):
+        ''' Unregister callbacks registered with add_hook. '''
+        self._set_hooks(remove=hook)
+
+    def enable_stats(self, slow_query_threshold=None, stats=None):
+        ''' Collect statistics of statements of all underlying connections into one beesql.stats.QueryStats,
+            see enable_stats of connections.
+
+        Returns:
+            The beesql.stats.QueryStats. '''
+        if stats is None:
+            stats = QueryStats(slow_query_threshold)
+        hook = (None, stats.after)
+        self._set_hooks(add=hook, remove=self._settings['stats_hook'], query_stats=stats, stats_hook=hook)
+        return stats
+
+    def disable_stats(self):
+        ''' Stop collecting statistics. '''
+        if self._settings['stats_hook'] is not None:
+            self._set_hooks(remove=self._settings['stats_hook'], query_stats=None, stats_hook=None)
+
+    def stats(self):
+        ''' Return snapshot of statement statistics of all underlying connections, see stats of connections.
+            Empty if stats are not enabled. '''
+        query_stats = self._settings['query_stats']
+        if query_stats is None:
+            return {}
+        return query_stats.snapshot()
+
+    def pool_stats(self):
+        ''' Return pool statistics of the underlying connections, see beesql.pooling.ConnectionPool.stats. '''
+        return self.pool.stats()
+
+    def enable_result_cache(self, max_entries=1024, max_bytes=None, ttl=None, table_ttls=None):
+        ''' Cache results of get and select in one beesql.cache.ResultCache shared by the underlying connections,
+            see enable_result_cache of connections.
+
+        Returns:
+            The beesql.cache.ResultCache. '''
+        cache = ResultCache(max_entries, max_bytes, ttl, table_ttls)
+        self._update(result_cache=cache)
+        return cache
+
+    def enable_index_advisor(self, large_table_rows=10000, advisor=None):
+        ''' Observe calls of all underlying connections with one beesql.advisor.IndexAdvisor, see
+            enable_index_advisor of connections.
+
+        Returns:
+            The beesql.advisor.IndexAdvisor. '''
+        if advisor is None:
+            advisor = IndexAdvisor(large_table_rows)
+        self._update(index_advisor=advisor)
+        return advisor
+
+    def disable_index_advisor(self):
+        ''' Stop observing calls. '''
+        self._update(index_advisor=None)
+
+    def index_advice(self):
+        ''' Return report of the index advisor, see beesql.advisor.IndexAdvisor.report. Empty if it is not enabled. '''
+        advisor = self._settings['index_advisor']
+        if advisor is None:
+            return {}
+        return advisor.report()
+
+    def close(self):
+        ''' Close underlying connections. Connections in use are closed when their call returns. '''
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
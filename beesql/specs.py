@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+''' BeeSQL picklable connection specs. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import os
+
+import beesql
+from beesql.exceptions import BeeSQLError
+
+# Options holding objects shared within a process, they are not part of a spec.
+PROCESS_OPTIONS = ('result_cache', 'query_stats')
+
+# Connections opened by ConnectionSpec.connection in this process, keyed on spec.
+_connections = {}
+_connections_pid = os.getpid()
+
+class ConnectionSpec(object):
+    ''' Picklable engine and options of a connection, sent to other processes to open connections like it.
+
+    Example::
+
+        spec = beesql.spec(engine='sqlite', db='beesql.db', row_format='tuple')
+        # In a worker process.
+        spec.connection().select('beesql_version') '''
+    def __init__(self, engine='mysql', **options):
+        ''' Initialize spec with engine and options accepted by beesql.connection.
+
+        Raises:
+            BeeSQLError if options hold objects which can not be shared between processes. '''
+        for option in PROCESS_OPTIONS:
+            if options.get(option) is not None:
+                raise BeeSQLError('%s can not be shared between processes' % (option))
+            options.pop(option, None)
+        self.engine = engine
+        self.options = options
+
+    def _key(self):
+        # Option values such as pragmas may not be hashable.
+        return (self.engine, repr(sorted(self.options.items())))
+
+    def __eq__(self, other):
+        return isinstance(other, ConnectionSpec) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        options = ', '.join(['%s=%r' % (name, '***' if name == 'password' else value)
+                             for name, value in sorted(self.options.items())])
+        return 'ConnectionSpec(engine=%r%s)' % (self.engine, ', ' + options if options else '')
+
+    def connect(self):
+        ''' Open and return a new connection, lazily connected on first use. '''
+        options = dict(self.options)
+        options.setdefault('lazy', True)
+        return beesql.connection(engine=self.engine, **options)
+
+    def connection(self):
+        ''' Return the connection of this spec opened by the calling process, opening it on first call.
+            Connections opened by a parent process are not reused by forked children. '''
+        global _connections_pid
+        if _connections_pid != os.getpid():
+            # Connections of the parent keep their database connections unclosed, set aside by _check_fork.
+            for connection in _connections.values():
+                connection._check_fork()
+            _connections.clear()
+            _connections_pid = os.getpid()
+        key = self._key()
+        connection = _connections.get(key)
+        if connection is None:
+            connection = _connections[key] = self.connect()
+        return connection
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+''' BeeSQL query statistics. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import logging
+import math
+import re
+import threading
+
+from beesql.cache import LRUCache
+
+# Logger used for slow queries.
+slow_query_log = logging.getLogger('beesql.slow')
+
+# String and numeric literals and parameter placeholders.
+LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'|\b\d+(?:\.\d+)?\b|%s|\?")
+# Parenthesized lists of placeholders, as in IN (?, ?) or VALUES (?, ?).
+VALUE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+# Repeated value lists of multi row inserts.
+VALUE_LISTS = re.compile(r'\(\?\+\)(?:\s*,\s*\(\?\+\))+')
+WHITESPACE = re.compile(r'\s+')
+
+def statement_shape(sql):
+    ''' Return sql with literals and placeholders replaced by ?, lists of values collapsed
+        and whitespace normalized, so that statements differing only in values share a shape.
+
+    Example::
+
+        >>> statement_shape("SELECT * FROM beesql_version WHERE id IN (1, 2, 3) AND version = '0.1'")
+        'SELECT * FROM beesql_version WHERE id IN (?+) AND version = ?' '''
+    shape = LITERAL.sub('?', sql)
+    shape = VALUE_LIST.sub('(?+)', shape)
+    shape = VALUE_LISTS.sub('(?+), ...', shape)
+    return WHITESPACE.sub(' ', shape).strip()
+
+class Histogram(object):
+    ''' Latency histogram with logarithmic buckets, each bucket GROWTH times wider than the previous.
+        Percentiles are accurate to the bucket width, about 4 percent. '''
+    GROWTH = 1.08
+    # Smallest recorded value in seconds, smaller values share the first bucket.
+    MINIMUM = 1e-6
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._buckets = {}
+        self._log_growth = math.log(self.GROWTH)
+
+    def add(self, value):
+        ''' Record a value in seconds. '''
+        index = int(math.log(max(value, self.MINIMUM) / self.MINIMUM) / self._log_growth)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        ''' Return value below which percent of recorded values fall, None if nothing was recorded. '''
+        if not self.count:
+            return None
+        rank = self.count * percent / 100.0
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                upper = self.MINIMUM * self.GROWTH ** (index + 1)
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+class QueryStats(object):
+    ''' Thread safe per statement shape statistics collected from connection hooks:
+        number of executions, errors, rows and latency percentiles. Statements slower than
+        slow_query_threshold are logged to the beesql.slow logger.
+
+    A QueryStats can be shared by connections, for example by passing it to beesql.pool. '''
+    def __init__(self, slow_query_threshold=None, max_shapes=1000):
+        ''' Initialize statistics.
+
+        Arguments:
+            :slow_query_threshold (float): Optional, milliseconds above which a statement is logged as slow.
+            :max_shapes (int): Maximum number of statement shapes tracked, further shapes are counted as 'other'. '''
+        self.slow_query_threshold = slow_query_threshold
+        self.max_shapes = max_shapes
+        self.slow_queries = 0
+        self._lock = threading.Lock()
+        self._shapes = {}
+        self._shape_cache = LRUCache(1024)
+
+    def _entry(self, sql):
+        ''' Return statistics entry of sql's shape, lock must be held. '''
+        shape = self._shape_cache.get(sql)
+        if shape is None:
+            shape = statement_shape(sql)
+            self._shape_cache.put(sql, shape)
+        entry = self._shapes.get(shape)
+        if entry is None:
+            if len(self._shapes) >= self.max_shapes:
+                shape = 'other'
+                entry = self._shapes.get(shape)
+            if entry is None:
+                entry = self._shapes[shape] = {'histogram': Histogram(), 'rows': 0, 'errors': 0}
+        return entry
+
+    def after(self, connection, sql, escapes, elapsed, rows, error):
+        ''' Connection after hook recording a statement run. '''
+        with self._lock:
+            entry = self._entry(sql)
+            entry['histogram'].add(elapsed)
+            if rows is not None and rows > 0:
+                entry['rows'] += rows
+            if error is not None:
+                entry['errors'] += 1
+            slow = self.slow_query_threshold is not None and elapsed * 1000 >= self.slow_query_threshold
+            if slow:
+                self.slow_queries += 1
+        if slow:
+            slow_query_log.warning('Slow query (%.1f ms, %s rows): %s %r', elapsed * 1000, rows, sql, escapes)
+
+    def reset(self):
+        ''' Discard collected statistics. '''
+        with self._lock:
+            self._shapes = {}
+            self.slow_queries = 0
+
+    def snapshot(self):
+        ''' Return a dict mapping statement shape to a dict of count, errors, rows and
+            total, mean, min, max, p50, p95 and p99 latencies in milliseconds. '''
+        with self._lock:
+            snapshot = {}
+            for shape, entry in self._shapes.items():
+                histogram = entry['histogram']
+                snapshot[shape] = dict(count=histogram.count, errors=entry['errors'], rows=entry['rows'],
+                                       total=histogram.total * 1000, mean=histogram.total * 1000 / histogram.count,
+                                       min=histogram.min * 1000, max=histogram.max * 1000,
+                                       p50=histogram.percentile(50) * 1000, p95=histogram.percentile(95) * 1000,
+                                       p99=histogram.percentile(99) * 1000)
+            return snapshot
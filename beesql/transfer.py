@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+
+''' BeeSQL data transfer.
+
+export streams query results to CSV or JSON Lines files batch by batch, so memory use is bounded
+by the batch size rather than the size of the result. load parses CSV or JSON Lines files, or takes
+an iterable of rows, and inserts them in batches, optionally in a fast ingest session. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import collections
+import csv
+import cStringIO
+import datetime
+import decimal
+import gzip
+import json
+import time
+from itertools import izip
+
+from beesql.exceptions import BeeSQLError
+from beesql.utils import chunks
+
+FORMATS = ('csv', 'jsonl')
+# Bytes buffered by files opened by export.
+BUFFER_SIZE = 1 << 20
+
+class _CountingFile(object):
+    ''' File object wrapper counting bytes written to it. '''
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        self.fileobj.write(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+def _json_default(value):
+    ''' Serialize values json does not handle. '''
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (buffer, bytearray)):
+        return str(value).encode('base64').replace('\n', '')
+    raise TypeError('%r is not JSON serializable' % (value,))
+
+def _csv_writer(fields, header, encoding, options):
+    ''' Return function serializing a batch of rows as CSV. '''
+    output = cStringIO.StringIO()
+    writer = csv.writer(output, **options)
+    state = dict(header=header)
+
+    def write(rows):
+        if state['header']:
+            state['header'] = False
+            writer.writerow([field.encode(encoding) if isinstance(field, unicode) else field for field in fields])
+        for row in rows:
+            writer.writerow([value.encode(encoding) if isinstance(value, unicode) else value for value in row])
+        data = output.getvalue()
+        output.seek(0)
+        output.truncate()
+        return data
+    return write
+
+def _jsonl_writer(fields, header, encoding, options):
+    ''' Return function serializing a batch of rows as JSON objects, one per line. '''
+    encode = json.JSONEncoder(default=_json_default, separators=(',', ':'), encoding=encoding, **options).encode
+    # Keys are encoded once, objects are joined from them to keep column order.
+    keys = [encode(field) + ':' for field in fields]
+
+    def write(rows):
+        return ''.join(['{%s}\n' % ','.join([key + encode(value) for key, value in izip(keys, row)]) for row in rows])
+    return write
+
+WRITERS = dict(csv=_csv_writer, jsonl=_jsonl_writer)
+
+def export(connection, source, target, format='csv', batch_size=1000, escapes=None, compress=None, header=True,
+           encoding='utf-8', **format_options):
+    ''' Stream rows of a table or query to a CSV or JSON Lines file.
+
+    Arguments:
+        :connection: Connection to read rows through.
+        :source (str): Table name, or a query if it contains whitespace.
+        :target: Path of the file to write, or a file object opened for writing bytes.
+        :format (str): 'csv' or 'jsonl'; Default to 'csv'.
+        :batch_size (int): Number of rows fetched and written at once.
+        :escapes: Optional, A tuple of escape values to escape a source query.
+        :compress (bool): gzip the output; Default to True for paths ending with '.gz'.
+        :header (bool): Write column names as the first CSV line; Default to True. Not written for empty results.
+        :encoding (str): Encoding of unicode values; Default to 'utf-8'.
+        :format_options: Optional, csv.writer options such as delimiter, or json.JSONEncoder options.
+
+    Returns:
+        dict with the number of rows exported and bytes written to target.
+
+    Raises:
+        BeeSQLError, BeeSQLDatabaseError.
+
+    Example::
+
+        export(connection, 'beesql_downloads', 'downloads.jsonl.gz', format='jsonl')
+        {'rows': 120000, 'bytes': 1873421} '''
+    if format not in WRITERS:
+        raise BeeSQLError('Invalid export format %s, should be one of %s' % (format, ', '.join(FORMATS)))
+    sql = source if len(source.split()) > 1 else 'SELECT * FROM %s' % (source)
+    path = target if isinstance(target, basestring) else None
+    if compress is None:
+        compress = path is not None and path.endswith('.gz')
+    fileobj = open(path, 'wb', BUFFER_SIZE) if path is not None else target
+    counter = _CountingFile(fileobj)
+    output = gzip.GzipFile(fileobj=counter, mode='wb') if compress else counter
+    count = 0
+    try:
+        write = None
+        batch = []
+        for row in connection.iter_query(sql, escapes, batch_size, 'row'):
+            if write is None:
+                write = WRITERS[format](row._fields, header, encoding, format_options)
+            batch.append(row)
+            if len(batch) >= batch_size:
+                output.write(write(batch))
+                count += len(batch)
+                batch = []
+        if batch:
+            output.write(write(batch))
+            count += len(batch)
+    finally:
+        if compress:
+            output.close()
+        if path is not None:
+            fileobj.close()
+        else:
+            fileobj.flush()
+    return dict(rows=count, bytes=counter.bytes)
+
+def _open(path):
+    ''' Open path for reading, decompressing paths ending with '.gz'. '''
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb', BUFFER_SIZE)
+
+def _csv_rows(lines, columns, header, encoding, options):
+    ''' Return columns and a generator of row tuples parsed from CSV lines. '''
+    reader = csv.reader(lines, **options)
+    if header:
+        names = next(reader, None)
+        if columns is None and names is not None:
+            columns = tuple([name.decode(encoding) for name in names])
+    if columns is None:
+        raise BeeSQLError('columns are required when CSV source has no header')
+    return columns, (tuple([value.decode(encoding) for value in row]) for row in reader if row)
+
+def _jsonl_rows(lines, columns, encoding):
+    ''' Return columns and a generator of row tuples parsed from JSON Lines, missing keys are None. '''
+    lines = (line for line in lines if line.strip())
+    first = next(lines, None)
+    if first is None:
+        return columns, iter(())
+    # Column order of the first object is kept when columns are not provided.
+    first = json.loads(first, encoding=encoding, object_pairs_hook=collections.OrderedDict)
+    if columns is None:
+        columns = tuple(first.keys())
+
+    def rows():
+        yield tuple([first.get(column) for column in columns])
+        for line in lines:
+            row = json.loads(line, encoding=encoding)
+            yield tuple([row.get(column) for column in columns])
+    return columns, rows()
+
+def read_rows(source, columns=None, format=None, header=True, encoding='utf-8', **format_options):
+    ''' Parse rows of a CSV or JSON Lines file lazily.
+
+    Arguments:
+        :source: Path of the file, decompressed if it ends with '.gz', or a file object.
+        :columns: Optional, tuple of column names; Default to the CSV header or keys of the first JSON object.
+        :format (str): 'csv' or 'jsonl'; Default to 'jsonl' for paths containing '.jsonl', 'csv' otherwise.
+        :header (bool): The first CSV line holds column names, it is skipped; Default to True.
+        :encoding (str): Encoding of the file; Default to 'utf-8'.
+        :format_options: Optional, csv.reader options such as delimiter.
+
+    Returns:
+        Tuple of columns and a generator of row tuples. Paths are closed once the generator is exhausted.
+
+    Raises:
+        BeeSQLError. '''
+    path = source if isinstance(source, basestring) else None
+    if format is None:
+        format = 'jsonl' if path is not None and '.jsonl' in path else 'csv'
+    if format not in FORMATS:
+        raise BeeSQLError('Invalid load format %s, should be one of %s' % (format, ', '.join(FORMATS)))
+    fileobj = _open(path) if path is not None else source
+    try:
+        if format == 'csv':
+            columns, rows = _csv_rows(fileobj, columns, header, encoding, format_options)
+        else:
+            columns, rows = _jsonl_rows(fileobj, columns, encoding)
+    except:
+        if path is not None:
+            fileobj.close()
+        raise
+    if path is None:
+        return columns, rows
+    return columns, _closing(rows, fileobj)
+
+def _closing(rows, fileobj):
+    ''' Yield rows and close fileobj afterwards. '''
+    try:
+        for row in rows:
+            yield row
+    finally:
+        fileobj.close()
+
+def load(connection, table, source, columns=None, format=None, batch_size=1000, header=True, fast=False,
+         progress=None, encoding='utf-8', **format_options):
+    ''' Insert rows of a CSV or JSON Lines file, or of an iterable, into table in batches.
+
+    Arguments:
+        :connection: Connection to insert rows through.
+        :table (str): Table to be inserted into.
+        :source: Path or file object of a CSV or JSON Lines file, see read_rows, or an iterable of dicts or tuples.
+        :columns: Optional, tuple of column names. Required for tuples and CSV files without header.
+        :format (str): Optional, 'csv' or 'jsonl' for files; Default to the path's extension.
+        :batch_size (int): Number of rows inserted at once.
+        :header (bool): The first CSV line holds column names; Default to True.
+        :fast (bool): Load in a fast ingest session, see the connection's fast_ingest. MySQL connections opened with
+                      local_infile=True load CSV paths with LOAD DATA LOCAL INFILE.
+        :progress: Optional, function called with the number of rows loaded so far and seconds elapsed after each batch.
+        :encoding (str): Encoding of the file; Default to 'utf-8'.
+        :format_options: Optional, csv.reader options such as delimiter.
+
+    Returns:
+        dict with the number of rows loaded and seconds taken.
+
+    Raises:
+        BeeSQLError, BeeSQLDatabaseError.
+
+    Example::
+
+        load(connection, 'beesql_downloads', 'downloads.csv.gz', fast=True)
+        {'rows': 120000, 'seconds': 1.92} '''
+    start = time.time()
+    if not fast:
+        loaded = _load(connection, table, source, columns, format, batch_size, header, False, progress, encoding,
+                       format_options, start)
+    else:
+        with connection.fast_ingest(table):
+            loaded = _load(connection, table, source, columns, format, batch_size, header, True, progress, encoding,
+                           format_options, start)
+    return dict(rows=loaded, seconds=time.time() - start)
+
+def _load(connection, table, source, columns, format, batch_size, header, fast, progress, encoding, format_options, start):
+    ''' Insert rows of load's source and return their number. '''
+    if isinstance(source, basestring) or hasattr(source, 'read'):
+        if fast and isinstance(source, basestring) and format in (None, 'csv') and '.jsonl' not in source:
+            loaded = connection._load_file(table, source, columns, header, encoding, format_options)
+            if loaded is not None:
+                if progress is not None:
+                    progress(loaded, time.time() - start)
+                return loaded
+        columns, rows = read_rows(source, columns, format, header, encoding, **format_options)
+    else:
+        columns, rows = connection._row_tuples(source, columns)
+    loaded = 0
+    for batch in chunks(rows, batch_size):
+        loaded += connection.insert_many(table, batch, columns, batch_size)
+        if progress is not None:
+            progress(loaded, time.time() - start)
+    return loaded
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+''' BeeSQL helper functions shared by connection backends. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import base64
+import itertools
+import json
+
+from beesql.exceptions import BeeSQLError
+
+def chunks(iterable, size):
+    ''' Split iterable into lists of at most size items. '''
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+class Page(list):
+    ''' List of rows of a page returned by paginate.
+
+    Attributes:
+        :cursor: Token to pass as after to paginate to continue after this page. '''
+    cursor = None
+
+def encode_cursor(key_values, descending=False):
+    ''' Return an opaque token holding the key values of the last row of a page. '''
+    return base64.urlsafe_b64encode(json.dumps([list(key_values), bool(descending)], default=str))
+
+def decode_cursor(token, key_count, descending=False):
+    ''' Return key values held in a token made by encode_cursor for a scan over key_count
+        key columns in the same direction. Raise BeeSQLError if the token does not match. '''
+    try:
+        key_values, token_descending = json.loads(base64.urlsafe_b64decode(str(token)))
+    except (TypeError, ValueError):
+        raise BeeSQLError('Invalid cursor token: %s' % (token))
+    if len(key_values) != key_count or token_descending != bool(descending):
+        raise BeeSQLError('Cursor token does not match key columns or order: %s' % (token))
+    return tuple(key_values)
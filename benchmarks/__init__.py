@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+
+''' BeeSQL benchmarks.
+
+Run all benchmarks against in-memory sqlite and file-backed sqlite with the default, durable and
+throughput profiles, and write results as JSON::
+
+    python -m benchmarks.run --output results.json
+
+Compare against a saved baseline, exiting with status 1 on regressions::
+
+    python -m benchmarks.run --baseline baseline.json --threshold 0.1
+
+MySQL is benchmarked when connection options are given::
+
+    python -m benchmarks.run --engine mysql --mysql-user root --mysql-password rootpass
+
+Throughput of threads sharing a connection by thread count::
+
+    python -m benchmarks.concurrency --threads 1,2,4,8 '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+''' Benchmark throughput of threads sharing a connection, through beesql.shared and through a single
+    connection guarded by a lock, for increasing thread counts. Results are written as JSON.
+
+Usage::
+
+    python -m benchmarks.concurrency [--engine sqlite|mysql] [--threads 1,2,4,8] [--seconds 2]
+                                     [--connections 8] [--output FILE] [--mysql-user USER ...] '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import beesql
+from benchmarks.crud import TABLE
+from benchmarks.crud import populate
+
+class LockedConnection(object):
+    ''' Single connection serialized by a lock, the baseline. '''
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()
+
+    def query(self, sql, escapes=None):
+        with self.lock:
+            return self.connection.query(sql, escapes)
+
+def workload(db, placeholder):
+    ''' Return function running one operation, an aggregate scanning the benchmark table. Most of its time
+        is spent in the database, where threads can run in parallel. '''
+    sql = 'SELECT COUNT(*), AVG(score) FROM %s WHERE value = %s' % (TABLE, placeholder)
+    def operation(i):
+        db.query(sql, (i % 100,))
+    return operation
+
+def run_threads(operation, threads, seconds):
+    ''' Run operation in threads for seconds and return operations per second. '''
+    stop = threading.Event()
+    counts = [0] * threads
+    def worker(number):
+        i = number
+        while not stop.is_set():
+            operation(i)
+            i += threads
+            counts[number] += 1
+    workers = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+    started = time.time()
+    for thread in workers:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    return sum(counts) / (time.time() - started)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark threads sharing a BeeSQL connection.')
+    parser.add_argument('--engine', choices=('sqlite', 'mysql'), default='sqlite')
+    parser.add_argument('--threads', default='1,2,4,8', help='Comma separated thread counts; Default to 1,2,4,8.')
+    parser.add_argument('--seconds', type=float, default=2.0, help='Seconds each thread count runs; Default to 2.')
+    parser.add_argument('--connections', type=int, default=8, help='Underlying connections of beesql.shared; Default to 8.')
+    parser.add_argument('--output', help='File results are written to as JSON; Default to stdout.')
+    parser.add_argument('--mysql-user')
+    parser.add_argument('--mysql-password')
+    parser.add_argument('--mysql-host')
+    parser.add_argument('--mysql-port', type=int)
+    parser.add_argument('--mysql-db', help='Database holding the benchmark table; Default to beesql_bench.')
+    args = parser.parse_args(argv)
+    tmpdir = None
+    if args.engine == 'sqlite':
+        tmpdir = tempfile.mkdtemp(prefix='beesql-bench-')
+        options = dict(engine='sqlite', db=os.path.join(tmpdir, 'bench.db'), profile='throughput')
+        placeholder = '?'
+    else:
+        options = dict(username=args.mysql_user, password=args.mysql_password or '', host=args.mysql_host or 'localhost',
+                       port=args.mysql_port or 3306, db=args.mysql_db or 'beesql_bench')
+        placeholder = '%s'
+    results = {}
+    try:
+        single = beesql.connection(check_same_thread=False, **options) if tmpdir else beesql.connection(**options)
+        populate(single)
+        single.flush()
+        locked = LockedConnection(single)
+        shared = beesql.shared(connections=args.connections, **options)
+        for threads in [int(count) for count in args.threads.split(',')]:
+            for name, db in (('locked', locked), ('shared', shared)):
+                ops = run_threads(workload(db, placeholder), threads, args.seconds)
+                results['%s/%s' % (name, threads)] = dict(threads=threads, ops_per_sec=ops)
+                sys.stderr.write('%-8s %3d threads %12.1f ops/s\n' % (name, threads, ops))
+        shared.close()
+        single.close()
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir)
+    output = json.dumps(dict(engine=args.engine, python=sys.version.split()[0], results=results), indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        sys.stdout.write(output + '\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+''' Benchmarks of BeeSQL CRUD methods and row formats. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import collections
+import os
+import tempfile
+
+import beesql
+from beesql.rows import ROW_FORMATS
+from benchmarks.harness import measure
+
+ENGINES = ('sqlite-memory', 'sqlite-file', 'sqlite-file-durable', 'sqlite-file-throughput', 'mysql')
+TABLE = 'beesql_bench'
+# Number of rows of the table read, updated and deleted by benchmarks.
+TABLE_ROWS = 10000
+
+# Benchmarks keyed by name, values are (setup, iterations, ops_per_call) tuples. setup(db) prepares
+# the database and returns the function called once per iteration.
+CASES = collections.OrderedDict()
+
+def case(name, iterations=1000, ops_per_call=1):
+    ''' Register decorated setup function as benchmark name. '''
+    def register(setup):
+        CASES[name] = (setup, iterations, ops_per_call)
+        return setup
+    return register
+
+def connect(engine, options):
+    ''' Open a connection for engine and return it with a cleanup function. '''
+    if engine == 'sqlite-memory':
+        db = beesql.connection(engine='sqlite', db=':memory:')
+        return db, db.close
+    if engine.startswith('sqlite-file'):
+        # sqlite-file-<profile> engines open the file with a profile of pragmas.
+        profile = engine[len('sqlite-file-'):] or 'default'
+        handle, path = tempfile.mkstemp(suffix='.db', prefix='beesql-bench-')
+        os.close(handle)
+        db = beesql.connection(engine='sqlite', db=path, profile=profile)
+        def cleanup():
+            db.close()
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        return db, cleanup
+    if engine == 'mysql':
+        database = options.get('mysql_db') or 'beesql_bench'
+        db = beesql.connection(username=options['mysql_user'], password=options.get('mysql_password') or '',
+                               host=options.get('mysql_host') or 'localhost', port=options.get('mysql_port') or 3306)
+        db.create(database, if_not_exists=True)
+        db.use(database)
+        def cleanup():
+            db.drop_table(TABLE)
+            db.close()
+        return db, cleanup
+    raise beesql.BeeSQLError('Invalid benchmark engine: %s' % (engine))
+
+def populate(db, rows=TABLE_ROWS):
+    ''' (Re)create the benchmark table holding rows rows. '''
+    db.query('DROP TABLE IF EXISTS %s' % (TABLE))
+    db.query('CREATE TABLE %s (id INTEGER PRIMARY KEY, name VARCHAR(32), value INTEGER, score REAL)' % (TABLE))
+    db.insert_many(TABLE, ((i, 'name-%s' % i, i % 100, i / 7.0) for i in range(rows)), ('id', 'name', 'value', 'score'))
+
+@case('get')
+def bench_get(db):
+    populate(db)
+    return lambda i: db.get(TABLE, id=i % TABLE_ROWS)
+
+@case('get_prepared')
+def bench_get_prepared(db):
+    populate(db)
+    placeholder = '%s' if db.__class__.__name__ == 'MYSQLConnection' else '?'
+    statement = db.prepare('SELECT * FROM %s WHERE id=%s' % (TABLE, placeholder))
+    return lambda i: statement.execute((i % TABLE_ROWS,))
+
+@case('get_many_1000', iterations=20, ops_per_call=1000)
+def bench_get_many(db):
+    populate(db)
+    return lambda i: db.get_many(TABLE, 'id', range((i * 1000) % TABLE_ROWS, (i * 1000) % TABLE_ROWS + 1000))
+
+def select_case(size):
+    ''' Register a benchmark selecting size rows. '''
+    @case('select_%s' % (size), iterations=max(10, 10000 / size), ops_per_call=size)
+    def bench_select(db):
+        populate(db)
+        return lambda i: db.select(TABLE, where='id < %s' % (size))
+    return bench_select
+
+for size in (1, 100, 1000):
+    select_case(size)
+
+@case('insert')
+def bench_insert(db):
+    populate(db, 0)
+    return lambda i: db.insert(TABLE, id=i, name='name-%s' % i, value=i % 100, score=i / 7.0)
+
+@case('insert_many_1000', iterations=20, ops_per_call=1000)
+def bench_insert_many(db):
+    populate(db, 0)
+    def insert_many(i):
+        start = i * 1000
+        db.insert_many(TABLE, ((j, 'name-%s' % j, j % 100, j / 7.0) for j in range(start, start + 1000)),
+                       ('id', 'name', 'value', 'score'))
+    return insert_many
+
+@case('upsert_many_1000', iterations=20, ops_per_call=1000)
+def bench_upsert_many(db):
+    populate(db)
+    def upsert_many(i):
+        # Half of the rows exist, the table grows by 500 rows per call.
+        start = TABLE_ROWS - 500 + i * 500
+        db.upsert_many(TABLE, ((j, 'name-%s' % j, i, j / 7.0) for j in range(start, start + 1000)), 'id',
+                       columns=('id', 'name', 'value', 'score'))
+    return upsert_many
+
+@case('update')
+def bench_update(db):
+    populate(db)
+    return lambda i: db.update(TABLE, {'value': i}, id=i % TABLE_ROWS)
+
+@case('update_many_1000', iterations=20, ops_per_call=1000)
+def bench_update_many(db):
+    populate(db)
+    def update_many(i):
+        start = (i * 1000) % TABLE_ROWS
+        db.update_many(TABLE, ({'id': j, 'value': i, 'score': j / 3.0} for j in range(start, start + 1000)))
+    return update_many
+
+@case('delete')
+def bench_delete(db):
+    populate(db)
+    return lambda i: db.delete(TABLE, id=i % TABLE_ROWS)
+
+def row_format_case(row_format):
+    ''' Register a benchmark reading 1000 rows in row_format. '''
+    @case('row_format_%s' % (row_format), iterations=20, ops_per_call=1000)
+    def bench_row_format(db):
+        populate(db, 1000)
+        return lambda i: db.select(TABLE, row_format=row_format)
+    return bench_row_format
+
+for row_format in ROW_FORMATS:
+    row_format_case(row_format)
+
+def run_case(engine, name, options=None, warmup=None):
+    ''' Run benchmark name against engine and return its result dict. '''
+    setup, iterations, ops_per_call = CASES[name]
+    options = options or {}
+    iterations = int(iterations * options.get('scale', 1.0)) or 1
+    if warmup is None:
+        warmup = min(iterations / 10, 100)
+    db, cleanup = connect(engine, options)
+    try:
+        func = setup(db)
+        result = measure(func, iterations, warmup, ops_per_call)
+    finally:
+        cleanup()
+    result.update(engine=engine, benchmark=name)
+    return result
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+''' Benchmark timing, memory measurement and baseline comparison. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import gc
+import multiprocessing
+import resource
+import sys
+import time
+
+# Metrics compared against a baseline and whether higher values are better.
+COMPARED_METRICS = (('ops_per_sec', True), ('p50_ms', False), ('p95_ms', False))
+
+def peak_memory_kb():
+    ''' Return peak resident memory of the process in kilobytes. '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Reported in bytes on OS X.
+        peak /= 1024
+    return peak
+
+def percentile(values, percent):
+    ''' Return percent percentile of sorted values. '''
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(percent / 100.0 * (len(values) - 1))))
+    return values[index]
+
+def measure(func, iterations, warmup=0, ops_per_call=1):
+    ''' Call func(i) for i in range(iterations) after warmup calls and return timing and memory statistics.
+
+    Arguments:
+        :func: Callable run once per iteration, receives the iteration number.
+        :iterations (int): Number of timed calls.
+        :warmup (int): Number of untimed calls made first.
+        :ops_per_call (int): Number of operations, such as rows, performed by one call.
+
+    Returns:
+        Dict of iterations, ops, total_sec, ops_per_sec, mean_ms, p50_ms, p95_ms, p99_ms, max_ms,
+        peak_memory_kb and memory_growth_kb. '''
+    for i in range(warmup):
+        func(iterations + i)
+    gc.collect()
+    memory_before = peak_memory_kb()
+    timings = []
+    timer = time.time
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = timer()
+        for i in range(iterations):
+            start = timer()
+            func(i)
+            timings.append(timer() - start)
+        total = timer() - started
+    finally:
+        if gc_enabled:
+            gc.enable()
+    timings.sort()
+    ops = iterations * ops_per_call
+    peak = peak_memory_kb()
+    return dict(iterations=iterations, ops=ops, total_sec=total, ops_per_sec=ops / total if total else None,
+                mean_ms=total * 1000 / iterations, p50_ms=percentile(timings, 50) * 1000,
+                p95_ms=percentile(timings, 95) * 1000, p99_ms=percentile(timings, 99) * 1000,
+                max_ms=timings[-1] * 1000, peak_memory_kb=peak, memory_growth_kb=peak - memory_before)
+
+def isolated(func, *args):
+    ''' Run func(*args) in a fresh worker process, so that peak memory is measured per benchmark,
+        and return its result. func must be a module level function. '''
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(func, args)
+    finally:
+        pool.close()
+        pool.join()
+
+def compare(results, baseline, threshold=0.1):
+    ''' Compare results with baseline results of the same benchmarks.
+
+    Arguments:
+        :results (dict): Results keyed by benchmark id.
+        :baseline (dict): Baseline results keyed by benchmark id.
+        :threshold (float): Relative change of a metric considered a regression, 0.1 is 10 percent.
+
+    Returns:
+        List of (benchmark id, metric, baseline value, value, relative change) of regressed metrics. '''
+    regressions = []
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = baseline[key].get(metric), results[key].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / float(old)
+            if (higher_is_better and change < -threshold) or (not higher_is_better and change > threshold):
+                regressions.append((key, metric, old, new, change))
+    return regressions
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+''' Run BeeSQL benchmarks, report results as JSON and compare them against a baseline.
+
+Usage::
+
+    python -m benchmarks.run [--engine ENGINE] [--benchmark NAME] [--output FILE]
+                             [--baseline FILE] [--threshold 0.1] [--scale 1.0] '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import beesql
+from benchmarks import crud
+from benchmarks.harness import compare
+from benchmarks.harness import isolated
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run BeeSQL benchmarks.')
+    parser.add_argument('--engine', action='append', choices=crud.ENGINES,
+                        help='Engine to benchmark, may be repeated; Default to sqlite engines and mysql if --mysql-user is set.')
+    parser.add_argument('--benchmark', action='append', choices=list(crud.CASES),
+                        help='Benchmark to run, may be repeated; Default to all.')
+    parser.add_argument('--output', help='File results are written to as JSON; Default to stdout.')
+    parser.add_argument('--baseline', help='JSON results to compare against, exit with status 1 on regressions.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative slowdown considered a regression; Default to 0.1.')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplier of iteration counts; Default to 1.0.')
+    parser.add_argument('--no-isolate', dest='isolate', action='store_false',
+                        help='Run benchmarks in this process, peak memory then is the peak of all benchmarks so far.')
+    parser.add_argument('--mysql-user')
+    parser.add_argument('--mysql-password')
+    parser.add_argument('--mysql-host')
+    parser.add_argument('--mysql-port', type=int)
+    parser.add_argument('--mysql-db', help='Database created to run benchmarks in; Default to beesql_bench.')
+    return parser.parse_args(argv)
+
+def run(args):
+    ''' Run selected benchmarks and return report dict. '''
+    engines = args.engine or [engine for engine in crud.ENGINES if engine != 'mysql'] + (['mysql'] if args.mysql_user else [])
+    options = dict(scale=args.scale, mysql_user=args.mysql_user, mysql_password=args.mysql_password,
+                   mysql_host=args.mysql_host, mysql_port=args.mysql_port, mysql_db=args.mysql_db)
+    results = {}
+    for engine in engines:
+        for name in args.benchmark or crud.CASES:
+            if args.isolate:
+                result = isolated(crud.run_case, engine, name, options)
+            else:
+                result = crud.run_case(engine, name, options)
+            results['%s/%s' % (engine, name)] = result
+            sys.stderr.write('%-40s %12.1f ops/s  p50 %8.3f ms  p95 %8.3f ms  p99 %8.3f ms\n' %
+                             ('%s/%s' % (engine, name), result['ops_per_sec'] or 0, result['p50_ms'],
+                              result['p95_ms'], result['p99_ms']))
+    return dict(created=time.strftime('%Y-%m-%dT%H:%M:%S'), python=platform.python_version(),
+                platform=platform.platform(), beesql_path=beesql.__path__[0], results=results)
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        sys.stdout.write(output + '\n')
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)['results']
+        regressions = compare(report['results'], baseline, args.threshold)
+        for key, metric, old, new, change in regressions:
+            sys.stderr.write('REGRESSION %s %s: %.4g -> %.4g (%+.1f%%)\n' % (key, metric, old, new, change * 100))
+        if regressions:
+            return 1
+        sys.stderr.write('No regressions above %.0f%% against %s\n' % (args.threshold * 100, args.baseline))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+''' Benchmark BeeSQL startup: time for a fresh interpreter to import beesql and create connections,
+    and the per call cost of resolving an engine. Results are written as JSON.
+
+Usage::
+
+    python -m benchmarks.startup [--runs 20] [--output FILE] '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import argparse
+import collections
+import json
+import os
+import subprocess
+import sys
+import time
+
+import beesql
+from benchmarks.harness import measure
+from benchmarks.harness import percentile
+
+# Programs run by a fresh interpreter, keyed by scenario name.
+SCENARIOS = collections.OrderedDict([
+    ('python', 'pass'),
+    ('import', 'import beesql'),
+    ('sqlite_connect', "import beesql; beesql.connection(engine='sqlite', db=':memory:')"),
+    ('sqlite_lazy_connect', "import beesql; beesql.connection(engine='sqlite', db=':memory:', lazy=True)"),
+    ('sqlite_first_query', "import beesql; beesql.connection(engine='sqlite', db=':memory:').query('SELECT 1')"),
+    ('mysql_lazy_connect', "import beesql; beesql.connection(username='beesql', password='', lazy=True)"),
+])
+
+def time_program(program, runs):
+    ''' Run program in runs fresh interpreters and return timing statistics in milliseconds. '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings = []
+    for i in range(runs):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', program], cwd=root)
+        timings.append((time.time() - start) * 1000)
+    timings.sort()
+    return dict(runs=runs, min_ms=timings[0], p50_ms=percentile(timings, 50), p95_ms=percentile(timings, 95))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark BeeSQL startup.')
+    parser.add_argument('--runs', type=int, default=20, help='Interpreters started per scenario; Default to 20.')
+    parser.add_argument('--output', help='File results are written to as JSON; Default to stdout.')
+    args = parser.parse_args(argv)
+    results = {}
+    for name, program in SCENARIOS.items():
+        try:
+            results[name] = time_program(program, args.runs)
+        except subprocess.CalledProcessError:
+            # mysql driver is not installed.
+            continue
+        sys.stderr.write('%-24s p50 %8.2f ms  p95 %8.2f ms\n' % (name, results[name]['p50_ms'], results[name]['p95_ms']))
+    results['resolve_engine'] = measure(lambda i: beesql.core.backend('sqlite'), 10000)
+    output = json.dumps(dict(python=sys.version.split()[0], results=results), indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        sys.stdout.write(output + '\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+''' Test Cases for asyncio connections. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from beesql import aio
+except ImportError:
+    aio = None
+
+import beesql
+
+
+@unittest.skipIf(aio is None, 'asyncio or trollius is required')
+class TestAsyncConnection(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'beesql.db')
+        self.loop = aio.asyncio.new_event_loop()
+        self.db = aio.connect(engine='sqlite', db=self.path, loop=self.loop)
+        self.wait(self.db.query("""CREATE TABLE beesql_version(
+        id INTEGER PRIMARY_KEY,
+        version VARCHAR(10),
+        release_manager VARCHAR(100))"""))
+
+    def wait(self, future):
+        return self.loop.run_until_complete(future)
+
+    def test_crud(self):
+        ''' Connection methods should be available as futures. '''
+        self.wait(self.db.insert('beesql_version', id=1, version='0.1', release_manager='John Doe'))
+        self.wait(self.db.update('beesql_version', {'version': '0.2'}, id=1))
+        self.assertEqual(self.wait(self.db.get('beesql_version', id=1))['version'], '0.2')
+        self.wait(self.db.delete('beesql_version', id=1))
+        self.assertEqual(self.wait(self.db.select('beesql_version')), [])
+
+    def test_errors(self):
+        ''' Database errors should be raised from futures. '''
+        self.assertRaises(beesql.BeeSQLDatabaseError, self.wait, self.db.select('beesql_missing'))
+
+    def test_iter_select(self):
+        ''' Async row iterators should fetch rows in batches on the worker thread. '''
+        self.wait(self.db.insert_many('beesql_version', [(i, '0.%s' % i) for i in range(5)], ('id', 'version')))
+        rows = self.db.iter_select('beesql_version', order_by='id', batch_size=2)
+        self.assertEqual(self.db.iterators, 1)
+        self.assertEqual(self.wait(rows.__anext__())['id'], 0)
+        self.assertEqual([row['id'] for row in self.wait(rows.fetch())], [1])
+        self.assertEqual([row['id'] for row in self.wait(rows.fetch())], [2, 3])
+        self.assertEqual([row['id'] for row in self.wait(rows.fetch())], [4])
+        self.assertEqual(self.wait(rows.fetch()), [])
+        self.assertRaises(aio.StopAsyncIteration, self.wait, rows.__anext__())
+        self.assertEqual(self.db.iterators, 0)
+
+    def test_pool(self):
+        ''' Pool operations should be spread over connections. '''
+        pool = aio.pool(engine='sqlite', db=self.path, size=2, loop=self.loop)
+        futures = [pool.insert('beesql_version', id=i, version='0.%s' % i) for i in range(4)]
+        self.assertEqual([connection.pending for connection in pool.connections], [2, 2])
+        self.wait(aio.asyncio.gather(*futures))
+        self.assertEqual(len(self.wait(pool.select('beesql_version'))), 4)
+
+        first = self.wait(pool.acquire())
+        second = self.wait(pool.acquire())
+        waiter = pool.acquire()
+        self.assertFalse(waiter.done())
+        pool.release(first)
+        self.assertTrue(self.wait(waiter) is first)
+        pool.release(first)
+        pool.release(second)
+        self.wait(pool.close())
+
+    def test_pool_reserved(self):
+        ''' Pool operations should not run on a reserved connection, but after it is released. '''
+        pool = aio.pool(engine='sqlite', db=self.path, size=1, loop=self.loop)
+        reserved = self.wait(pool.acquire())
+        self.wait(reserved.run(lambda db: db.transaction_on()))
+        self.wait(reserved.insert('beesql_version', id=1, version='0.1'))
+        inserted = pool.insert('beesql_version', id=2, version='0.2')
+        rows = pool.iter_select('beesql_version')
+        fetched = rows.fetch()
+        self.wait(reserved.run(lambda db: (db.rollback(), db.transaction_off())))
+        self.assertFalse(inserted.done())
+        pool.release(reserved)
+        self.wait(inserted)
+        self.assertEqual([row['id'] for row in self.wait(fetched)], [2])
+        self.assertEqual(self.wait(rows.fetch()), [])
+        self.assertEqual(reserved.iterators, 0)
+        self.assertEqual([row['id'] for row in self.wait(pool.select('beesql_version'))], [2])
+        self.assertTrue(self.wait(pool.acquire()) is reserved)
+        pool.release(reserved)
+        self.wait(pool.close())
+
+    def tearDown(self):
+        self.wait(self.db.close())
+        self.assertRaises(beesql.BeeSQLError, self.db.select, 'beesql_version')
+        self.loop.close()
+        shutil.rmtree(self.tmpdir)
+
+if __name__ == '__main__':
+    unittest.main()
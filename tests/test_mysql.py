@@ -5,10 +5,14 @@
 # Author: Kasun Herath <kasunh01@gmail.com>
 # Source: https://github.com/kasun/BeeSQL
 
+import os
+import tempfile
 import unittest
 import mock
+import pymysql
 
 import beesql
+import beesql.backends.mysql
 
 import settings
 
@@ -45,6 +49,27 @@ class TestMysqlConnection(unittest.TestCase):
         self.db.select('beesql_version', 'SUM(billed_hours)', where='release_year > 2010', group_by='release_manager', having='SUM(billed_hours) > 100')
         self.assertEqual(self.db._run_query.call_args[0][0].lower(), "SELECT SUM(billed_hours) FROM beesql_version WHERE release_year > 2010 GROUP BY release_manager HAVING SUM(billed_hours) > 100".lower())
 
+    def test_iter_select(self):
+        ''' Mysql iter_select should generate the same sql as select. '''
+        self.db._iter_query = mock.Mock(return_value=iter([]))
+        list(self.db.iter_select('beesql_version', ('version', 'release_name'), release_manager='John Doe'))
+        self.assertEqual(self.db._iter_query.call_args[0][1].lower(), "SELECT version, release_name FROM beesql_version WHERE release_manager=%s".lower())
+        self.assertEqual(self.db._iter_query.call_args[0][2], ('John Doe',))
+
+    def test_unbuffered_cursor(self):
+        ''' Streaming methods should use an unbuffered cursor, and log once when PyMySQL has none. '''
+        self.db._new_cursor = mock.Mock()
+        with mock.patch('beesql.backends.mysql.SSCursor', pymysql.cursors.Cursor):
+            self.db._unbuffered_cursor()
+        self.assertEqual(self.db._new_cursor.call_args[0], (pymysql.cursors.Cursor,))
+        with mock.patch('beesql.backends.mysql.SSCursor', None):
+            with mock.patch('beesql.backends.mysql.driver_log') as log:
+                with mock.patch.object(beesql.backends.mysql.MYSQLConnection, '_warned_buffered', False):
+                    self.db._unbuffered_cursor()
+                    self.db._unbuffered_cursor()
+        self.assertEqual(self.db._new_cursor.call_args[0], ())
+        self.assertEqual(log.warning.call_count, 1)
+
     def test_insert(self):
         ''' Insert method should generate valid sql '''
         self.db._run_query = mock.Mock()
@@ -53,6 +78,20 @@ class TestMysqlConnection(unittest.TestCase):
         self.assertEqual(self.db._run_query.call_args[0][0].lower(), "INSERT INTO beesql_version (version, name) VALUES (%s, %s)".lower())
         self.assertEqual(self.db._run_query.call_args[0][1], ('0.1', 'Kasun Herath'))
 
+    def test_insert_many(self):
+        ''' insert_many should generate multi-row insert statements per chunk. '''
+        self.db._run_query = mock.Mock()
+        rows = [('0.1', 'Kasun Herath'), ('0.2', 'John Doe'), ('0.3', 'John Smith')]
+        self.db.insert_many('beesql_version', rows, ('version', 'release_manager'), chunk_size=2)
+
+        self.assertEqual(self.db._run_query.call_count, 2)
+        self.assertEqual(self.db._run_query.call_args_list[0][0][0].lower(),
+             "INSERT INTO beesql_version (version, release_manager) VALUES (%s, %s), (%s, %s)".lower())
+        self.assertEqual(self.db._run_query.call_args_list[0][0][1], ('0.1', 'Kasun Herath', '0.2', 'John Doe'))
+        self.assertEqual(self.db._run_query.call_args[0][0].lower(),
+             "INSERT INTO beesql_version (version, release_manager) VALUES (%s, %s)".lower())
+        self.assertEqual(self.db._run_query.call_args[0][1], ('0.3', 'John Smith'))
+
     def test_update(self):
         ''' Mysql update should generate valid sql for both, string where condition clause 
             and conditional clause as a set of values. '''
@@ -99,6 +138,146 @@ class TestMysqlConnection(unittest.TestCase):
         self.db.drop_table('beesql_version', 'beesql_downloads')
         self.assertEqual(self.db._run_query.call_args[0][0].lower(), "DROP TABLE beesql_version, beesql_downloads".lower())
 
+    def test_lazy(self):
+        ''' A lazy connection should connect and issue use on first query only. '''
+        with mock.patch('pymysql.connect') as connect:
+            db = beesql.connection(username=settings.MYSQL_USER, password=settings.MYSQL_PASSWD, db='beesql', lazy=True)
+            self.assertFalse(connect.called)
+            db.query('SELECT 1')
+            self.assertEqual(connect.call_count, 1)
+            self.assertEqual(connect.return_value.cursor.return_value.execute.call_args_list[0][0][0], 'use beesql')
+
+    def test_prepare(self):
+        ''' Prepared statements should run on a cursor of their own. '''
+        cursor = mock.Mock(description=None, rowcount=1)
+        self.db.db_connection = mock.Mock()
+        self.db.db_connection.cursor.return_value = cursor
+        statement = self.db.prepare('UPDATE beesql_version SET version = %s WHERE id = %s')
+        statement.execute(('0.2', 1))
+        cursor.execute.assert_called_with('UPDATE beesql_version SET version = %s WHERE id = %s', ('0.2', 1))
+        self.assertEqual(statement.executemany([('0.3', 2), ('0.4', 3)]), 1)
+        self.assertEqual(cursor.executemany.call_args[0][1], [('0.3', 2), ('0.4', 3)])
+        statement.close()
+        self.assertTrue(cursor.close.called)
+
+    def test_upsert_many(self):
+        ''' upsert_many should generate ON DUPLICATE KEY UPDATE statements, report affected rows and count existing
+            keys as updated on request only. '''
+        self.db.query = mock.Mock()
+        self.db.cursor = mock.Mock(rowcount=3)
+        rows = [{'id': 1, 'lang': 'a', 'version': '0.1'}, {'id': 2, 'lang': 'a', 'version': '0.2'}, {'id': 3, 'lang': 'a', 'version': '0.3'}]
+        counts = self.db.upsert_many('beesql_version', rows, ('id', 'lang'), columns=('id', 'lang', 'version'), chunk_size=2)
+        self.assertEqual(counts, {'affected': 6})
+        self.assertEqual(self.db.query.call_count, 2)
+        self.assertEqual(self.db.query.call_args_list[0][0],
+                         ("INSERT INTO beesql_version (id, lang, version) VALUES (%s, %s, %s), (%s, %s, %s) "
+                          "ON DUPLICATE KEY UPDATE version=VALUES(version)", (1, 'a', '0.1', 2, 'a', '0.2')))
+        self.assertEqual(self.db.query.call_args_list[1][0][0],
+                         "INSERT INTO beesql_version (id, lang, version) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE version=VALUES(version)")
+
+        self.db.query = mock.Mock(side_effect=[[(1, 'a')], [], [], []])
+        counts = self.db.upsert_many('beesql_version', rows, ('id', 'lang'), columns=('id', 'lang', 'version'), chunk_size=2,
+                                     count_existing=True)
+        self.assertEqual(counts, {'affected': 6, 'inserted': 2, 'updated': 1})
+        self.assertEqual(self.db.query.call_args_list[0][0][0],
+                         "SELECT id, lang FROM beesql_version WHERE (id=%s AND lang=%s) OR (id=%s AND lang=%s)")
+
+    def test_update_many(self):
+        ''' update_many should rewrite per row values to CASE expressions. '''
+        self.db.query = mock.Mock()
+        self.db.cursor = mock.Mock(rowcount=2)
+        rows = [{'id': 1, 'version': '0.1'}, {'id': 2, 'version': '0.2'}, {'id': 1, 'version': '0.1.1'}]
+        self.assertEqual(self.db.update_many('beesql_version', rows), {'updated': 2, 'batches': [2]})
+        self.assertEqual(self.db.query.call_args[0],
+                         ("UPDATE beesql_version SET version = CASE id WHEN %s THEN %s WHEN %s THEN %s ELSE version END "
+                          "WHERE id IN (%s, %s)", (1, '0.1.1', 2, '0.2', 1, 2)))
+
+        self.db.update_many('beesql_version', [(1, 'a', '0.1')], ('id', 'lang'), columns=('id', 'lang', 'version'))
+        self.assertEqual(self.db.query.call_args[0],
+                         ("UPDATE beesql_version SET version = CASE WHEN (id=%s AND lang=%s) THEN %s ELSE version END "
+                          "WHERE (id=%s AND lang=%s)", (1, 'a', '0.1', 1, 'a')))
+
+    def test_get_many(self):
+        ''' get_many should split values in IN lists fitting max_allowed_packet. '''
+        self.db.query = mock.Mock(side_effect=[[(1, '0.1')], [(3, '0.3')]])
+        self.db.cursor = mock.Mock(description=(('id',), ('version',)))
+        self.db._max_allowed_packet = 1024 + len('SELECT * FROM beesql_version WHERE id IN ') + 8
+        rows = self.db.get_many('beesql_version', 'id', [1, 2, 1, 3])
+        self.assertEqual(rows, {1: {'id': 1, 'version': '0.1'}, 3: {'id': 3, 'version': '0.3'}})
+        self.assertEqual(self.db.query.call_args_list[0][0][:2], ('SELECT * FROM beesql_version WHERE id IN (%s, %s)', (1, 2)))
+        self.assertEqual(self.db.query.call_args_list[1][0][:2], ('SELECT * FROM beesql_version WHERE id IN (%s)', (3,)))
+
+    def test_paginate(self):
+        ''' paginate should seek past the last key of the previous page. '''
+        self.db.query = mock.Mock(side_effect=[[(1, 'a'), (2, 'b')], [(3, 'c')]])
+        self.db.cursor = mock.Mock(description=(('id',), ('version',)))
+        pages = list(self.db.paginate('beesql_version', page_size=2, descending=True, lang='en'))
+        self.assertEqual(pages, [[{'id': 1, 'version': 'a'}, {'id': 2, 'version': 'b'}], [{'id': 3, 'version': 'c'}]])
+        self.assertEqual(self.db.query.call_args_list[1][0][:2],
+                         ('SELECT * FROM beesql_version WHERE lang=%s AND id < %s ORDER BY id DESC LIMIT 2', ('en', 2)))
+
+    def test_fast_ingest(self):
+        ''' fast_ingest should disable key checks for the session and restore them. '''
+        self.db.query = mock.Mock(side_effect=[[(1, 0)], [], [], [], [], []])
+        with self.db.fast_ingest('beesql_version'):
+            self.db.query('INSERT INTO beesql_version (id) VALUES (1)')
+        self.assertEqual([call[0] for call in self.db.query.call_args_list[1:]],
+                         [('SET SESSION unique_checks=0, foreign_key_checks=0',), ('ALTER TABLE beesql_version DISABLE KEYS',),
+                          ('INSERT INTO beesql_version (id) VALUES (1)',), ('ALTER TABLE beesql_version ENABLE KEYS',),
+                          ('SET SESSION unique_checks=%s, foreign_key_checks=%s', (1, 0))])
+        self.db.query.reset_mock()
+        self.db.in_transaction = True
+        self.assertRaises(beesql.BeeSQLError, self.db.fast_ingest('beesql_version').__enter__)
+        self.assertFalse(self.db.query.called)
+        self.db.in_transaction = False
+
+    def test_load(self):
+        ''' load should insert parsed rows in batches, using LOAD DATA LOCAL INFILE only when enabled. '''
+        path = tempfile.mktemp(suffix='.csv')
+        with open(path, 'wb') as handle:
+            handle.write('id,version\r\n1,0.1\r\n2,0.2\r\n')
+        try:
+            self.db.insert_many = mock.Mock(return_value=1)
+            self.assertEqual(self.db.load('beesql_version', path, batch_size=1)['rows'], 2)
+            self.assertEqual(self.db.insert_many.call_args[0], ('beesql_version', [(u'2', u'0.2')], (u'id', u'version'), 1))
+            db = beesql.connection(username=settings.MYSQL_USER, password=settings.MYSQL_PASSWD, local_infile=True, lazy=True)
+            db.query = mock.Mock(return_value=[])
+            db.cursor = mock.Mock(rowcount=2)
+            db.fast_ingest = mock.MagicMock()
+            self.assertEqual(db.load('beesql_version', path, fast=True)['rows'], 2)
+            self.assertEqual(db.query.call_args[0],
+                             ("LOAD DATA LOCAL INFILE %s INTO TABLE beesql_version CHARACTER SET utf8mb4 FIELDS TERMINATED BY ',' "
+                              "OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' LINES TERMINATED BY %s IGNORE 1 LINES (id, version)",
+                              (path, '\r\n')))
+        finally:
+            os.remove(path)
+
+    def test_explain(self):
+        ''' explain should run EXPLAIN and flag full table and index scans. '''
+        self.db._inspect = mock.Mock(return_value=[
+            {'id': 1, 'select_type': 'SIMPLE', 'table': 'beesql_version', 'type': 'ALL', 'possible_keys': None,
+             'key': None, 'rows': 1200, 'Extra': 'Using where'}])
+        plan = self.db.delete('beesql_version', limit=2, version='0.1', explain=True)
+        self.assertEqual(self.db._inspect.call_args[0],
+                         ('EXPLAIN DELETE FROM beesql_version WHERE version=%s LIMIT 2', ('0.1',), 'dict'))
+        self.assertEqual((plan[0]['scan'], plan[0]['index'], plan[0]['rows'], plan[0]['detail']), (True, None, 1200, 'Using where'))
+        self.db._inspect.return_value = [{'id': 1, 'table': 'beesql_version', 'type': 'ref', 'key': 'version', 'rows': 1,
+                                          'Extra': None}]
+        plan = self.db.select('beesql_version', version='0.1', explain=True)
+        self.assertEqual((plan[0]['scan'], plan[0]['index'], plan[0]['detail']), (False, 'version', ''))
+        self.db._inspect.return_value = [{'Key_name': 'PRIMARY', 'Seq_in_index': 1, 'Column_name': 'id'},
+                                         {'Key_name': 'lang_version', 'Seq_in_index': 2, 'Column_name': 'version'},
+                                         {'Key_name': 'lang_version', 'Seq_in_index': 1, 'Column_name': 'lang'}]
+        self.assertEqual(self.db.indexes('beesql_version'), {'PRIMARY': ('id',), 'lang_version': ('lang', 'version')})
+
+    def test_connection_errors(self):
+        ''' Client errors should be raised as connection errors, server errors as database errors. '''
+        error = self.db._database_error(pymysql.err.OperationalError(2013, 'Lost connection to MySQL server during query'))
+        self.assertTrue(isinstance(error, beesql.BeeSQLConnectionError))
+        error = self.db._database_error(pymysql.err.ProgrammingError(1064, 'You have an error in your SQL syntax'))
+        self.assertFalse(isinstance(error, beesql.BeeSQLConnectionError))
+        self.assertTrue(isinstance(error, beesql.BeeSQLDatabaseError))
+
     def test_use(self):
         ''' use method should generate valid sql. '''
         self.db._run_query = mock.Mock()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+''' Test Cases for connection pool. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import mock
+
+import beesql
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.pool = beesql.pool(engine='sqlite', db=os.path.join(self.tmpdir, 'beesql.db'), min_size=2, max_size=3)
+
+    def test_prewarm(self):
+        ''' Pool should open min_size connections upfront. '''
+        stats = self.pool.stats()
+        self.assertEqual((stats['size'], stats['idle'], stats['created']), (2, 2, 2))
+
+    def test_acquire_release(self):
+        ''' Released connections should be handed out again, most recently released first. '''
+        db = self.pool.acquire()
+        db.query('CREATE TABLE beesql_version(id INTEGER, version VARCHAR(10))')
+        self.pool.release(db)
+        with self.pool.connection() as other:
+            self.assertTrue(other is db)
+            other.insert('beesql_version', id=1, version='0.1')
+        self.assertEqual(self.pool.stats()['checkouts'], 2)
+        self.assertEqual(self.pool.stats()['in_use'], 0)
+        self.assertRaises(beesql.BeeSQLError, self.pool.release, db)
+
+    def test_max_size(self):
+        ''' Acquire should time out once max_size connections are checked out. '''
+        connections = [self.pool.acquire() for i in range(3)]
+        self.assertRaises(beesql.BeeSQLError, self.pool.acquire, 0.01)
+        stats = self.pool.stats()
+        self.assertEqual((stats['size'], stats['timeouts'], stats['waits']), (3, 1, 0))
+        for db in connections:
+            self.pool.release(db)
+
+    def test_waiting(self):
+        ''' Threads waiting for a connection should get released connections. '''
+        connections = [self.pool.acquire() for i in range(3)]
+        acquired = []
+        def worker():
+            with self.pool.connection() as db:
+                acquired.append(db)
+        threads = [threading.Thread(target=worker) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for db in connections:
+            self.pool.release(db)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(acquired), 4)
+        self.assertTrue(self.pool.stats()['waits'] > 0)
+        self.assertEqual(self.pool.stats()['size'], 3)
+
+    def test_recycle_and_evict(self):
+        ''' Connections should be replaced after max_lifetime and closed after idle_timeout. '''
+        self.pool.max_lifetime = 0
+        db = self.pool.acquire()
+        self.pool.release(db)
+        # Both prewarmed connections are replaced on checkout and the new one on release.
+        self.assertEqual(self.pool.stats()['recycled'], 3)
+        self.assertEqual(self.pool.stats()['size'], 0)
+        self.pool.max_lifetime = None
+        self.pool.idle_timeout = 0
+        connections = [self.pool.acquire() for i in range(3)]
+        for db in connections:
+            self.pool.release(db)
+        self.assertEqual(self.pool.stats()['size'], 2)
+        self.assertTrue(self.pool.stats()['evicted'] >= 1)
+
+    def test_evict_on_acquire(self):
+        ''' Idle connections should be evicted on checkout too, so that a quiet pool shrinks to min_size. '''
+        connections = [self.pool.acquire() for i in range(3)]
+        for db in connections:
+            self.pool.release(db)
+        self.pool.idle_timeout = 0
+        db = self.pool.acquire()
+        self.assertEqual((self.pool.stats()['evicted'], self.pool.stats()['size']), (1, 2))
+        self.pool.release(db)
+
+    def test_broken_release(self):
+        ''' A connection failing to commit on release should be closed and its slot freed. '''
+        db = self.pool.acquire()
+        db.flush = mock.Mock(side_effect=beesql.BeeSQLDatabaseError('disk I/O error'))
+        self.assertRaises(beesql.BeeSQLDatabaseError, self.pool.release, db)
+        stats = self.pool.stats()
+        self.assertEqual((stats['broken'], stats['size'], stats['in_use'], stats['idle']), (1, 1, 0, 1))
+        connections = [self.pool.acquire(timeout=0.1) for i in range(3)]
+        for db in connections:
+            self.pool.release(db)
+
+    def test_ping(self):
+        ''' Dead idle connections should be replaced on checkout. '''
+        self.pool.ping_interval = 0
+        db = self.pool.acquire()
+        self.pool.release(db)
+        db.db_connection.close()
+        other = self.pool.acquire()
+        self.assertFalse(other is db)
+        self.assertEqual(self.pool.stats()['failed_pings'], 1)
+        self.pool.release(other)
+
+    def tearDown(self):
+        self.pool.close()
+        self.assertRaises(beesql.BeeSQLError, self.pool.acquire)
+        shutil.rmtree(self.tmpdir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+''' Test Cases for connections shared by threads. '''
+
+# Author: Kasun Herath <kasunh01@gmail.com>
+# Source: https://github.com/kasun/BeeSQL
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import beesql
+
+
+class TestSharedConnection(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = beesql.shared(engine='sqlite', db=os.path.join(self.tmpdir, 'beesql.db'), connections=3,
+                                profile='throughput', pragmas=dict(busy_timeout=10000))
+        self.db.query('CREATE TABLE beesql_version(id INTEGER PRIMARY KEY, version VARCHAR(10), thread INTEGER)')
+
+    def test_threads(self):
+        ''' Threads should run statements concurrently and see their own lastrowid and lastsql. '''
+        errors = []
+        def worker(number):
+            try:
+                for i in range(50):
+                    self.db.insert('beesql_version', version='%s.%s' % (number, i), thread=number)
+                    row = self.db.get('beesql_version', id=self.db.lastrowid)
+                    if row['thread'] != number or self.db.lastescapes != (self.db.lastrowid,):
+                        errors.append((number, row))
+            except Exception, e:
+                errors.append((number, e))
+        threads = [threading.Thread(target=worker, args=(number,)) for number in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.db.query('SELECT COUNT(*) AS count FROM beesql_version')[0]['count'], 400)
+        stats = self.db.pool_stats()
+        self.assertTrue(stats['size'] <= 3)
+        self.assertEqual(stats['in_use'], 0)
+
+    def test_session(self):
+        ''' Sessions and transactions should hold one connection for the calling thread. '''
+        self.assertRaises(beesql.BeeSQLError, getattr, self.db, 'prepare')
+        with self.db.session() as db:
+            statement = db.prepare('INSERT INTO beesql_version (version) VALUES (?)')
+            statement.execute(('0.1',))
+            self.assertEqual(self.db.pool_stats()['in_use'], 1)
+            self.assertEqual(len(self.db.select('beesql_version')), 1)
+            statement.close()
+        try:
+            with self.db.transaction():
+                self.db.insert('beesql_version', version='0.2')
+                self.assertTrue(self.db.in_transaction)
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertFalse(self.db.in_transaction)
+        self.assertEqual([row['version'] for row in self.db.iter_select('beesql_version')], ['0.1'])
+        self.assertEqual(self.db.pool_stats()['in_use'], 0)
+        self.assertRaises(beesql.BeeSQLError, beesql.shared, engine='sqlite', db=':memory:')
+
+    def test_settings(self):
+        ''' Hooks, stats, the result cache and the index advisor should apply to every underlying connection. '''
+        connections = []
+        hook = self.db.add_hook(after=lambda connection, *args: connections.append(connection))
+        self.db.enable_stats()
+        cache = self.db.enable_result_cache()
+        self.db.enable_index_advisor()
+        with self.db.session() as db:
+            thread = threading.Thread(target=self.db.insert, args=('beesql_version',), kwargs=dict(version='0.1'))
+            thread.start()
+            thread.join()
+            self.assertEqual(self.db.get('beesql_version', version='0.1')['version'], '0.1')
+            self.assertTrue(db.result_cache is cache)
+        self.assertEqual(self.db.pool_stats()['size'], 2)
+        self.assertEqual(len(set(connections)), 2)
+        self.assertEqual(sum([shape['count'] for shape in self.db.stats().values()]), 2)
+        self.assertEqual(len(self.db.index_advice()['shapes']), 1)
+
+        thread = threading.Thread(target=self.db.get, args=('beesql_version',), kwargs=dict(version='0.1'))
+        thread.start()
+        thread.join()
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.db.remove_hook(hook)
+        self.db.disable_stats()
+        self.db.insert('beesql_version', version='0.2')
+        self.assertEqual(len(connections), 2)
+        self.assertEqual(self.db.stats(), {})
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,10 +5,24 @@
 # Author: Kasun Herath <kasunh01@gmail.com>
 # Source: https://github.com/kasun/BeeSQL
 
+import gzip
+import json
+import multiprocessing
+import os
+import pickle
+import StringIO
+import tempfile
+import time
 import unittest
 import mock
 
 import beesql
+import beesql.advisor
+import beesql.backends.base
+import beesql.columns
+import beesql.parallel
+import beesql.routing
+import beesql.stats
 
 
 class TestSQLiteConnection(unittest.TestCase):
@@ -29,6 +43,20 @@ class TestSQLiteConnection(unittest.TestCase):
         result = self.db.get('beesql_version', version='0.1.2')
         self.assertIsNone(result)
 
+    def test_get_many(self):
+        ''' get_many should return found rows keyed on column, looking up duplicates once. '''
+        self.db.query('CREATE TABLE beesql_version(id INTEGER PRIMARY KEY, version VARCHAR(10))')
+        self.db.insert_many('beesql_version', [(i, '0.%s' % i) for i in range(5)], ('id', 'version'))
+        rows = self.db.get_many('beesql_version', 'id', [3, 1, 3, 9])
+        self.assertEqual(rows, {1: {'id': 1, 'version': '0.1'}, 3: {'id': 3, 'version': '0.3'}})
+        self.assertEqual(self.db.lastescapes, (3, 1, 9))
+        rows = self.db.get_many('beesql_version', 'version', ['0.2', '0.4'], columns=('id',), row_format='tuple')
+        self.assertEqual(rows, {'0.2': (2, '0.2'), '0.4': (4, '0.4')})
+        rows = self.db.get_many('beesql_version', 'id', [0, 2, 4, 6], temp_table_threshold=2)
+        self.assertEqual(sorted(rows), [0, 2, 4])
+        self.assertEqual(rows[4]['version'], '0.4')
+        self.assertEqual(self.db.get_many('beesql_version', 'id', []), {})
+
     def test_select(self):
         ''' Select method should generate valid sql. '''
         self.db._run_query = mock.Mock()
@@ -56,6 +84,368 @@ class TestSQLiteConnection(unittest.TestCase):
         self.db.select('beesql_version', 'SUM(billed_hours)', where='release_year > 2010', group_by='release_manager', having='SUM(billed_hours) > 100')
         self.assertEqual(self.db._run_query.call_args[0][0].lower(), "SELECT SUM(billed_hours) FROM beesql_version WHERE release_year > 2010 GROUP BY release_manager HAVING SUM(billed_hours) > 100".lower())
 
+    def test_upsert_many(self):
+        ''' upsert_many should insert new rows, update existing ones and count both. '''
+        self.db.query('CREATE TABLE beesql_version(id INTEGER PRIMARY KEY, version VARCHAR(10), release_manager VARCHAR(100))')
+        self.db.insert('beesql_version', id=1, version='0.1', release_manager='John Doe')
+        rows = [{'id': 1, 'version': '0.1.1'}, {'id': 2, 'version': '0.2'}, {'id': 2, 'version': '0.2.1'}, {'id': 3, 'version': '0.3'}]
+        counts = self.db.upsert_many('beesql_version', rows, 'id', chunk_size=2)
+        self.assertEqual(counts, {'inserted': 2, 'updated': 2})
+        self.assertEqual(self.db.select('beesql_version', order_by='id', row_format='tuple'),
+                         [(1, '0.1.1', 'John Doe'), (2, '0.2.1', None), (3, '0.3', None)])
+
+        counts = self.db.upsert_many('beesql_version', [(3, '0.3.1'), (4, '0.4')], ('id',), update_columns=(),
+                                     columns=('id', 'version'))
+        self.assertEqual(counts, {'inserted': 1, 'updated': 1})
+        self.assertEqual(self.db.get('beesql_version', id=3)['version'], '0.3')
+        self.assertRaises(beesql.BeeSQLError, self.db.upsert_many, 'beesql_version', rows, 'release_manager')
+
+        with mock.patch('sqlite3.sqlite_version_info', (3, 8, 0)):
+            counts = self.db.upsert_many('beesql_version', [(4, '0.4.1')], 'id', columns=('id', 'version'))
+        self.assertEqual(counts, {'inserted': 0, 'updated': 1})
+        self.assertTrue(self.db.lastsql.startswith('INSERT OR REPLACE INTO beesql_version'))
+        self.assertEqual(self.db.get('beesql_version', id=4)['version'], '0.4.1')
+
+    def test_upsert_many_composite(self):
+        ''' upsert_many should look up composite keys of chunks larger than the expression depth limit. '''
+        self.db.query('CREATE TABLE beesql_downloads(release VARCHAR(10), country VARCHAR(2), count INTEGER, '
+                      'PRIMARY KEY (release, country))')
+        rows = [('0.%s' % (i), 'lk', i) for i in range(3000)]
+        self.db.insert_many('beesql_downloads', rows[:1000], ('release', 'country', 'count'))
+        counts = self.db.upsert_many('beesql_downloads', rows, ('release', 'country'), columns=('release', 'country', 'count'),
+                                     chunk_size=2000)
+        self.assertEqual(counts, {'inserted': 2000, 'updated': 1000})
+        with mock.patch('beesql.backends.sqlite.ROW_VALUES_VERSION', (99, 0, 0)):
+            counts = self.db.upsert_many('beesql_downloads', rows[1500:], ('release', 'country'),
+                                         columns=('release', 'country', 'count'), chunk_size=2000)
+        self.assertEqual(counts, {'inserted': 0, 'updated': 1500})
+        self.assertEqual(self.db.query('SELECT COUNT(*) FROM beesql_downloads', row_format='tuple'), [(3000,)])
+
+    def test_update_many(self):
+        ''' update_many should apply per row values in batches and report updated rows per batch. '''
+        self.db.query('CREATE TABLE beesql_version(id INTEGER PRIMARY KEY, version VARCHAR(10), release_manager VARCHAR(100))')
+        self.db.insert_many('beesql_version', [(i, '0.%s' % i, 'John Doe') for i in range(5)], ('id', 'version', 'release_manager'))
+        rows = [{'id': 0, 'version': '1.0'}, {'id': 1, 'version': '1.1'}, {'id': 2, 'version': '1.2'},
+                {'id': 3, 'release_manager': 'John Smith'}, {'id': 9, 'release_manager': 'John Smith'}]
+        result = self.db.update_many('beesql_version', rows, chunk_size=2)
+        self.assertEqual(result, {'updated': 4, 'batches': [2, 1, 1]})
+        self.assertEqual(self.db.select('beesql_version', order_by='id', row_format='tuple'),
+                         [(0, '1.0', 'John Doe'), (1, '1.1', 'John Doe'), (2, '1.2', 'John Doe'),
+                          (3, '0.3', 'John Smith'), (4, '0.4', 'John Doe')])
+        result = self.db.update_many('beesql_version', [('2.4', 4)], key=('id',), columns=('version', 'id'))
+        self.assertEqual(result['updated'], 1)
+        self.assertEqual(self.db.lastsql, 'UPDATE beesql_version SET version=? WHERE id=?')
+        self.assertRaises(beesql.BeeSQLError, self.db.update_many, 'beesql_version', [{'version': '3.0'}])
+
+    def test_iter_select(self):
+        ''' iter_select should lazily yield all matching rows fetched in batches. '''
+        self.db.query("""CREATE TABLE beesql_version(
+        id INTEGER PRIMARY_KEY,
+        version VARCHAR(10),
+        release_manager VARCHAR(100))""")
+        self.db.insert_many('beesql_version', [(i, '0.%s' % i, 'John Doe') for i in range(10)],
+                            ('id', 'version', 'release_manager'))
+        rows = self.db.iter_select('beesql_version', order_by='id', batch_size=3, release_manager='John Doe')
+        self.assertEqual(next(rows)['id'], 0)
+        self.assertEqual([row['id'] for row in rows], range(1, 10))
+        self.assertEqual(self.db.lastsql.lower(), 'SELECT * FROM beesql_version WHERE release_manager=? ORDER BY id'.lower())
+
+        rows = self.db.iter_query('SELECT version FROM beesql_version WHERE id < ?', (2,), batch_size=1)
+        self.assertEqual(list(rows), [{'version': '0.0'}, {'version': '0.1'}])
+
+    def test_paginate(self):
+        ''' paginate should seek pages by key in either direction and resume from a cursor token. '''
+        self.db.query('CREATE TABLE beesql_downloads(day INTEGER, id INTEGER, release VARCHAR(10), PRIMARY KEY (day, id))')
+        rows = [(day, i, '0.1' if i % 2 else '0.2') for day in range(3) for i in range(4)]
+        self.db.insert_many('beesql_downloads', rows, ('day', 'id', 'release'))
+        pages = list(self.db.paginate('beesql_downloads', key=('day', 'id'), page_size=5, row_format='tuple'))
+        self.assertEqual([len(page) for page in pages], [5, 5, 2])
+        self.assertEqual(sum(pages, []), rows)
+        self.assertEqual(self.db.lastescapes, (2, 2, 2, 1))
+
+        resumed = self.db.paginate('beesql_downloads', key=('day', 'id'), page_size=5, after=pages[0].cursor, row_format='tuple')
+        self.assertEqual(sum(resumed, []), rows[5:])
+
+        pages = list(self.db.paginate('beesql_downloads', ('id',), key=('day', 'id'), page_size=2, descending=True, release='0.1'))
+        self.assertEqual([(row['day'], row['id']) for row in sum(pages, [])], [(2, 3), (2, 1), (1, 3), (1, 1), (0, 3), (0, 1)])
+        self.assertEqual(len(pages), 3)
+
+        pages = self.db.paginate('beesql_downloads', key='day', page_size=4, where='id = 0')
+        self.assertEqual([[row['day'] for row in page] for page in pages], [[0, 1, 2]])
+        self.assertRaises(beesql.BeeSQLError, list, self.db.paginate('beesql_downloads', after='garbage'))
+
+    def test_export(self):
+        ''' export should stream rows to csv and json lines, optionally gzipped. '''
+        self.db.query('CREATE TABLE beesql_version(version FLOAT, name VARCHAR(20))')
+        self.db.insert_many('beesql_version', [(i / 10.0, u'r\xe9lease %s' % (i)) for i in range(25)], ('version', 'name'))
+        output = StringIO.StringIO()
+        result = self.db.export('beesql_version', output, batch_size=10)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(result, dict(rows=25, bytes=len(output.getvalue())))
+        self.assertEqual(lines[:2], ['version,name', '0.0,r\xc3\xa9lease 0'])
+        self.assertEqual(len(lines), 26)
+        output = StringIO.StringIO()
+        self.db.export('SELECT name, version FROM beesql_version WHERE version < ?', output, 'jsonl', escapes=(0.2,))
+        self.assertEqual(output.getvalue(), '{"name":"r\\u00e9lease 0","version":0.0}\n{"name":"r\\u00e9lease 1","version":0.1}\n')
+        path = tempfile.mktemp(suffix='.jsonl.gz')
+        try:
+            result = self.db.export('beesql_version', path, format='jsonl', batch_size=7)
+            self.assertEqual(result, dict(rows=25, bytes=os.path.getsize(path)))
+            rows = [json.loads(line) for line in gzip.open(path)]
+            self.assertEqual(rows, self.db.select('beesql_version'))
+        finally:
+            os.remove(path)
+        output = StringIO.StringIO()
+        self.assertEqual(self.db.export('beesql_version', output, delimiter=';', header=False)['rows'], 25)
+        self.assertEqual(output.getvalue().splitlines()[0], '0.0;r\xc3\xa9lease 0')
+        self.assertRaises(beesql.BeeSQLError, self.db.export, 'beesql_version', output, format='xml')
+
+    def test_load(self):
+        ''' load should insert rows of csv and json lines files and iterables, fast_ingest should restore settings. '''
+        self.db.query('CREATE TABLE beesql_version(version FLOAT, name VARCHAR(20))')
+        result = self.db.load('beesql_version', StringIO.StringIO('version,name\n0.1,r\xc3\xa9lease\n\n0.2,b\n'))
+        self.assertEqual(result['rows'], 2)
+        self.assertEqual(self.db.select('beesql_version', row_format='tuple'), [(0.1, u'r\xe9lease'), (0.2, u'b')])
+        self.db.load('beesql_version', StringIO.StringIO('{"name": "c", "version": 0.3}\n{"version": 0.4}\n'), format='jsonl')
+        self.assertEqual(self.db.select('beesql_version', where='version > 0.25', row_format='tuple'), [(0.3, u'c'), (0.4, None)])
+        self.db.load('beesql_version', ((i / 10.0, 'n') for i in range(5, 10)), ('version', 'name'))
+        self.assertEqual(self.db.query('SELECT COUNT(*) FROM beesql_version', row_format='tuple'), [(9,)])
+        self.assertRaises(beesql.BeeSQLError, self.db.load, 'beesql_version', StringIO.StringIO('0.1,a\n'), header=False)
+
+        path = tempfile.mktemp(suffix='.db')
+        data = tempfile.mktemp(suffix='.csv.gz')
+        db = beesql.connection(engine='sqlite', db=path)
+        try:
+            db.query('CREATE TABLE beesql_downloads(id INTEGER PRIMARY KEY, release VARCHAR(10))')
+            db.query('CREATE INDEX beesql_downloads_release ON beesql_downloads(release)')
+            handle = gzip.open(data, 'wb')
+            handle.write(''.join(['%s,0.%s\n' % (i, i % 3) for i in range(100)]))
+            handle.close()
+            progress = []
+            result = db.load('beesql_downloads', data, ('id', 'release'), batch_size=40, header=False, fast=True,
+                             progress=lambda rows, seconds: progress.append(rows))
+            self.assertEqual(result['rows'], 100)
+            self.assertEqual(progress, [40, 80, 100])
+            self.assertEqual(db.query("SELECT name FROM sqlite_master WHERE type='index'", row_format='tuple'),
+                             [('beesql_downloads_release',)])
+            self.assertEqual(db.query('PRAGMA journal_mode', row_format='tuple'), [('delete',)])
+            self.assertEqual(db.query('PRAGMA synchronous', row_format='tuple'), [(2,)])
+            self.assertEqual(db.query("SELECT COUNT(*) FROM beesql_downloads WHERE release='0.1'", row_format='tuple'), [(33,)])
+        finally:
+            db.close()
+            os.remove(path)
+            os.remove(data)
+
+    def test_fast_ingest(self):
+        ''' fast_ingest should keep unique indexes and create every dropped index again, reporting failures. '''
+        self.db.query('CREATE TABLE beesql_downloads(id INTEGER, release VARCHAR(10), country VARCHAR(2))')
+        self.db.query('CREATE UNIQUE INDEX beesql_downloads_id ON beesql_downloads(id)')
+        self.db.query('CREATE INDEX beesql_downloads_release ON beesql_downloads(release)')
+        self.db.query('CREATE INDEX beesql_downloads_country ON beesql_downloads(country)')
+        indexes = "SELECT name FROM sqlite_master WHERE type='index' ORDER BY name"
+        with self.db.fast_ingest('beesql_downloads'):
+            self.assertEqual(self.db.query(indexes, row_format='tuple'), [('beesql_downloads_id',)])
+            self.db.insert('beesql_downloads', id=1, release='0.1', country='lk')
+            self.assertRaises(Exception, self.db.insert, 'beesql_downloads', id=1, release='0.1', country='lk')
+        self.assertEqual(len(self.db.query(indexes)), 3)
+
+        def rename():
+            with self.db.fast_ingest('beesql_downloads'):
+                self.db.query('ALTER TABLE beesql_downloads RENAME COLUMN release TO version')
+        self.assertRaisesRegexp(beesql.BeeSQLDatabaseError, 'beesql_downloads_release', rename)
+        self.assertEqual(self.db.query(indexes, row_format='tuple'), [('beesql_downloads_country',), ('beesql_downloads_id',)])
+        self.assertEqual(self.db.query('PRAGMA synchronous', row_format='tuple'), [(2,)])
+
+    def test_profile(self):
+        ''' Profiles and pragmas should be set on connect and reported by settings. '''
+        path = tempfile.mktemp(suffix='.db')
+        db = beesql.connection(engine='sqlite', db=path, profile='throughput', pragmas={'synchronous': 'OFF', 'foreign_keys': 1})
+        try:
+            settings = db.settings()
+            self.assertEqual((settings['journal_mode'], settings['synchronous'], settings['cache_size'], settings['temp_store'],
+                              settings['foreign_keys']), ('wal', 0, -65536, 2, 1))
+            db.query('CREATE TABLE beesql_version(version FLOAT)')
+            db.insert('beesql_version', version=0.1)
+            clone = db.clone()
+            self.assertEqual(clone.settings()['cache_size'], -65536)
+            clone.close()
+            readonly = beesql.connection(engine='sqlite', db=path, profile='readonly')
+            self.assertEqual(readonly.settings()['query_only'], 1)
+            self.assertEqual(readonly.select('beesql_version', row_format='tuple'), [(0.1,)])
+            self.assertRaises(beesql.BeeSQLDatabaseError, readonly.insert, 'beesql_version', version=0.2)
+            readonly.close()
+        finally:
+            db.close()
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        self.assertEqual(self.db.settings()['synchronous'], 2)
+        self.assertRaises(beesql.BeeSQLError, beesql.connection, engine='sqlite', db=':memory:', profile='fastest')
+
+    def test_routed(self):
+        ''' Routed connections should read from replicas, write to the primary and read their writes. '''
+        path = tempfile.mktemp(suffix='.db')
+        db = beesql.routed(dict(engine='sqlite', db=path), [dict(engine='sqlite', db=path, profile='readonly')] * 2,
+                           strategy='round_robin', sticky=0)
+        try:
+            db.query('CREATE TABLE beesql_version(id INTEGER PRIMARY KEY, version VARCHAR(10))')
+            db.insert('beesql_version', version='0.1')
+            self.assertEqual(db.lastrowid, 1)
+            self.assertEqual(db.select('beesql_version', row_format='tuple'), [(1, '0.1')])
+            self.assertEqual(db.get('beesql_version', id=1)['version'], '0.1')
+            self.assertEqual(list(db.iter_query('SELECT id FROM beesql_version', row_format='tuple')), [(1,)])
+            stats = db.routing_stats()
+            self.assertEqual((stats['primary']['queries'], stats['replica-0']['queries'], stats['replica-1']['queries']), (2, 2, 1))
+            self.assertEqual(stats['replica-0']['outstanding'], 0)
+            with db.transaction():
+                db.update('beesql_version', dict(version='0.2'), id=1)
+                self.assertEqual(db.get('beesql_version', id=1)['version'], '0.2')
+            self.assertEqual(db.routing_stats()['primary']['queries'], 4)
+            db.sticky = 60
+            db.insert('beesql_version', version='0.3')
+            self.assertEqual(len(db.select('beesql_version')), 2)
+            self.assertEqual(db.routing_stats()['primary']['queries'], 6)
+        finally:
+            db.close()
+            os.remove(path)
+        self.assertTrue(beesql.routing.is_read_only(' select 1'))
+        self.assertFalse(beesql.routing.is_read_only('SELECT * FROM beesql_version FOR UPDATE'))
+        self.assertFalse(beesql.routing.is_read_only('PRAGMA journal_mode=WAL'))
+
+    def test_routed_fallback(self):
+        ''' Reads should fall back to the primary on connection errors only, and stay on it after a transaction. '''
+        path = tempfile.mktemp(suffix='.db')
+        db = beesql.routed(dict(engine='sqlite', db=path), [dict(engine='sqlite', db=path, profile='readonly')], sticky=0)
+        try:
+            db.query('CREATE TABLE beesql_version(id INTEGER PRIMARY KEY, version VARCHAR(10))')
+            self.assertRaises(beesql.BeeSQLDatabaseError, db.select, 'beesql_version', columns='missing')
+            stats = db.routing_stats()
+            self.assertEqual((stats['primary']['queries'], stats['replica-0']['errors']), (1, 1))
+            replica = db._replicas[0].connection
+            replica.select = mock.Mock(side_effect=beesql.BeeSQLConnectionError('disk I/O error'))
+            self.assertEqual(db.select('beesql_version'), [])
+            self.assertEqual(db.routing_stats()['primary']['queries'], 2)
+            del replica.select
+            db.sticky = 0.05
+            with db.transaction():
+                db.insert('beesql_version', version='0.1')
+                time.sleep(0.1)
+            self.assertEqual(len(db.select('beesql_version')), 1)
+            self.assertEqual(db.routing_stats()['primary']['queries'], 4)
+        finally:
+            db.close()
+            os.remove(path)
+
+    def test_routed_sticky(self):
+        ''' Only writes and transactions should keep reads on the primary. '''
+        path = tempfile.mktemp(suffix='.db')
+        db = beesql.routed(dict(engine='sqlite', db=path), [dict(engine='sqlite', db=path, profile='readonly')], sticky=60)
+        try:
+            db.query('CREATE TABLE beesql_version(id INTEGER PRIMARY KEY, version VARCHAR(10))')
+            db._last_write = None
+            db.enable_stats()
+            self.assertEqual(len(db.explain('SELECT * FROM beesql_version')), 1)
+            self.assertEqual(db.indexes('beesql_version'), {'PRIMARY': ('id',)})
+            self.assertEqual(db.table_rows('beesql_version'), 0)
+            self.assertEqual(db.stats(), {})
+            self.assertEqual(db.index_advice(), {})
+            db.settings()
+            self.assertTrue(db._last_write is None)
+            self.assertEqual(db.routing_stats()['primary']['queries'], 1)
+            db.insert('beesql_version', version='0.1')
+            self.assertEqual(len(db.select('beesql_version')), 1)
+            self.assertEqual(db.routing_stats()['primary']['queries'], 3)
+        finally:
+            db.close()
+            os.remove(path)
+
+    def test_fork(self):
+        ''' A connection used in a forked child should connect again, leaving the parent's connection usable. '''
+        path = tempfile.mktemp(suffix='.db')
+        db = beesql.connection(engine='sqlite', db=path)
+        try:
+            db.query('CREATE TABLE beesql_version(id INTEGER PRIMARY KEY, version VARCHAR(10))')
+            db.insert('beesql_version', version='0.1')
+            parent = db.db_connection
+            results = multiprocessing.Queue()
+            def child():
+                db.insert('beesql_version', version='0.2')
+                results.put((db.db_connection is parent, db.lastrowid, beesql.backends.base._inherited[-1][0] is parent))
+                db.close()
+            process = multiprocessing.Process(target=child)
+            process.start()
+            process.join()
+            self.assertEqual(results.get(timeout=5), (False, 2, True))
+            self.assertTrue(db.db_connection is parent)
+            self.assertEqual([row['version'] for row in db.select('beesql_version')], ['0.1', '0.2'])
+            statement = db.prepare('SELECT 1')
+            statement.pid = -1
+            self.assertRaises(beesql.BeeSQLError, statement.execute)
+        finally:
+            db.close()
+            os.remove(path)
+
+    def test_spec(self):
+        ''' Connection specs should pickle and open connections like the connection they were taken from. '''
+        db = beesql.connection(engine='sqlite', db=':memory:', row_format='tuple', cached_statements=10,
+                               query_stats=beesql.stats.QueryStats())
+        spec = pickle.loads(pickle.dumps(db.spec()))
+        self.assertEqual(spec, beesql.spec(engine='sqlite', db=':memory:', row_format='tuple', cached_statements=10,
+                                           check_same_thread=True, profile='default', pragmas=None, statement_cache_size=256,
+                                           commit_every=None, commit_interval=None))
+        self.assertTrue(spec.connection() is spec.connection())
+        self.assertFalse(spec.connection().connected)
+        self.assertEqual(spec.connection().query('SELECT 1'), [(1,)])
+        self.assertTrue('***' in repr(beesql.spec(username='root', password='secret')))
+        self.assertRaises(beesql.BeeSQLError, beesql.spec, engine='sqlite', db='beesql.db',
+                          query_stats=beesql.stats.QueryStats())
+        db.close()
+
+    def test_map_query(self):
+        ''' map_query should run partitions in worker processes and stream their rows back. '''
+        path = tempfile.mktemp(suffix='.db')
+        db = beesql.connection(engine='sqlite', db=path)
+        try:
+            db.query('CREATE TABLE beesql_downloads(id INTEGER PRIMARY KEY, release VARCHAR(10))')
+            db.insert_many('beesql_downloads', [(i, '0.%s' % (i % 3)) for i in range(100)], ('id', 'release'))
+            sql = 'SELECT id, release FROM beesql_downloads WHERE id >= ? AND id < ?'
+            ranges = [(low, low + 10) for low in range(0, 100, 10)]
+            rows = list(beesql.parallel.map_query(db, sql, ranges, processes=2))
+            self.assertEqual(rows, db.select('beesql_downloads'))
+            rows = beesql.parallel.map_query(db.spec(), sql, ranges, processes=2, ordered=False, row_format='namedtuple')
+            self.assertEqual(sorted(row.id for row in rows), range(100))
+            rows = beesql.parallel.map_query(db, 'SELECT * FROM beesql_missing WHERE id >= ? AND id < ?', ranges)
+            self.assertRaises(beesql.BeeSQLDatabaseError, list, rows)
+        finally:
+            db.close()
+            os.remove(path)
+        self.assertRaises(beesql.BeeSQLError, list, beesql.parallel.map_query(self.db, 'SELECT 1', [()]))
+
+    def test_parallel_select(self):
+        ''' parallel_select should read all rows across partitions, in key order when ordered. '''
+        path = tempfile.mktemp(suffix='.db')
+        db = beesql.connection(engine='sqlite', db=path)
+        try:
+            db.query('CREATE TABLE beesql_downloads(id INTEGER PRIMARY KEY, release VARCHAR(10))')
+            db.insert_many('beesql_downloads', [(i, '0.%s' % (i % 3)) for i in range(1000)], ('id', 'release'))
+            rows = db.parallel_select('beesql_downloads', 'id', partitions=7, workers=3, ordered=True, batch_size=50)
+            self.assertEqual([row['id'] for row in rows], range(1000))
+            rows = db.parallel_select('beesql_downloads', 'release', partitions=3, workers=2, columns=('id',),
+                                      row_format='tuple', where='id < 500')
+            self.assertEqual(sorted(rows), [(i, '0.%s' % (i % 3)) for i in range(500)])
+            rows = db.parallel_select('beesql_downloads', 'id', release='0.9')
+            self.assertEqual(list(rows), [])
+            rows = db.parallel_select('beesql_downloads', 'id', partitions=4, workers=2, batch_size=10)
+            self.assertEqual(len([next(rows) for i in range(25)]), 25)
+            rows.close()
+        finally:
+            db.close()
+            os.remove(path)
+        self.assertRaises(beesql.BeeSQLDatabaseError, list, self.db.parallel_select('beesql_missing', 'id'))
+        self.db.query('CREATE TABLE beesql_downloads(id INTEGER PRIMARY KEY)')
+        self.db.insert('beesql_downloads', id=1)
+        self.assertRaises(beesql.BeeSQLError, list, self.db.parallel_select('beesql_downloads', 'id'))
+
     def test_insert(self):
         ''' Insert method should generate valid sql '''
         self.db._run_query = mock.Mock()
@@ -64,6 +454,21 @@ class TestSQLiteConnection(unittest.TestCase):
         self.assertEqual(self.db._run_query.call_args[0][0].lower(), "INSERT INTO beesql_version (version, name) VALUES (?, ?)".lower())
         self.assertEqual(self.db._run_query.call_args[0][1], ('0.1', 'Kasun Herath'))
 
+    def test_insert_many(self):
+        ''' insert_many should insert dict and tuple rows in chunks and return inserted row count. '''
+        self.db.query("""CREATE TABLE beesql_version(
+        id INTEGER PRIMARY_KEY,
+        version VARCHAR(10),
+        release_manager VARCHAR(100))""")
+        rows = ({'id': i, 'version': '0.%s' % i, 'release_manager': 'John Doe'} for i in range(5))
+        self.assertEqual(self.db.insert_many('beesql_version', rows, chunk_size=2), 5)
+        rows = [(i, '1.%s' % i) for i in range(5, 8)]
+        self.assertEqual(self.db.insert_many('beesql_version', rows, ('id', 'version')), 3)
+        self.assertEqual(self.db.lastsql.lower(), 'INSERT INTO beesql_version (id, version) VALUES (?, ?)'.lower())
+        self.assertEqual(len(self.db.select('beesql_version')), 8)
+        self.assertEqual(self.db.insert_many('beesql_version', []), 0)
+        self.assertRaises(beesql.BeeSQLError, self.db.insert_many, 'beesql_version', [(1, '0.1')])
+
     def test_update(self):
         ''' Update should generate valid sql for instances when no where condition is provided,
             when it is provided as a string or as a set of values. '''
@@ -97,6 +502,148 @@ class TestSQLiteConnection(unittest.TestCase):
         self.assertEqual(self.db._run_query.call_args[0][0].lower(), "DELETE FROM beesql_version WHERE version=? and release_name=?".lower())
         self.assertEqual(self.db._run_query.call_args[0][1], (2.0, 'bumblebee'))
 
+    def test_row_format(self):
+        ''' Rows should be returned in the connection's row format unless another format is requested. '''
+        self.db.query("""CREATE TABLE beesql_version(
+        id INTEGER PRIMARY_KEY,
+        version VARCHAR(10),
+        release_manager VARCHAR(100))""")
+        self.db.insert('beesql_version', id=1, version='0.1.1', release_manager='John Doe')
+
+        self.assertEqual(self.db.get('beesql_version', id=1), {'id': 1, 'version': '0.1.1', 'release_manager': 'John Doe'})
+        self.assertEqual(self.db.get('beesql_version', row_format='tuple', id=1), (1, '0.1.1', 'John Doe'))
+        row = self.db.select('beesql_version', ('id', 'version'), row_format='namedtuple')[0]
+        self.assertEqual((row.id, row.version), (1, '0.1.1'))
+        row = list(self.db.iter_select('beesql_version', row_format='row'))[0]
+        self.assertEqual((row['release_manager'], row[0], row.get('missing')), ('John Doe', 1, None))
+        self.assertEqual(row.keys(), ['id', 'version', 'release_manager'])
+        self.assertEqual(row.asdict(), self.db.get('beesql_version', id=1))
+        self.assertRaises(beesql.BeeSQLError, self.db.query, 'SELECT * FROM beesql_version', row_format='list')
+
+        db = beesql.connection(engine='sqlite', db=':memory:', row_format='tuple')
+        self.assertEqual(db.query('SELECT 1 AS one'), [(1,)])
+        db.close()
+        self.assertRaises(beesql.BeeSQLError, beesql.connection, engine='sqlite', db=':memory:', row_format='list')
+
+    def test_columns(self):
+        ''' Select with as_columns should return typed column arrays with masks for NULL values. '''
+        self.db.query("""CREATE TABLE beesql_downloads(
+        id INTEGER PRIMARY_KEY,
+        version VARCHAR(10),
+        size REAL)""")
+        self.db.insert_many('beesql_downloads', [(1, '0.1', 1.5), (2, None, 2.0), (3, '0.3', None)], ('id', 'version', 'size'))
+
+        columns = self.db.select('beesql_downloads', order_by='id', as_columns=True)
+        self.assertEqual(columns.names, ('id', 'version', 'size'))
+        self.assertEqual(columns.rows, 3)
+        self.assertEqual(list(columns['id']), [1, 2, 3])
+        self.assertEqual(list(columns['version']), ['0.1', None, '0.3'])
+        self.assertEqual(list(columns['size']), [1.5, 2.0, 0])
+        self.assertEqual(list(columns.masks['size']), [False, False, True])
+        self.assertFalse('id' in columns.masks)
+        numpy = beesql.columns.numpy_module()
+        if numpy is not None:
+            self.assertEqual(columns['id'].dtype, numpy.dtype('l'))
+            self.assertEqual(columns['size'].dtype, numpy.dtype('d'))
+
+        batches = list(self.db.iter_select('beesql_downloads', 'id', batch_size=2, as_columns=True))
+        self.assertEqual([list(batch['id']) for batch in batches], [[1, 2], [3]])
+        columns = self.db.select('beesql_downloads', as_columns=True, id=4)
+        self.assertEqual((columns.names, columns.rows, len(columns['id'])), (('id', 'version', 'size'), 0, 0))
+
+    def test_statement_cache(self):
+        ''' CRUD methods should reuse compiled statements for calls of the same shape. '''
+        self.db._run_query = mock.Mock(return_value=[])
+        self.db.get('beesql_version', id=1)
+        self.db.get('beesql_version', id=2)
+        self.assertEqual((self.db.statement_cache.hits, self.db.statement_cache.misses), (1, 1))
+        self.assertEqual(self.db._run_query.call_args[0][0].lower(), "SELECT * FROM beesql_version WHERE id=? LIMIT 1".lower())
+        self.assertEqual(self.db._run_query.call_args[0][1], (2,))
+
+        self.db.get('beesql_version', version='0.1')
+        self.db.select('beesql_version', order_by='id', id=1)
+        self.db.select('beesql_version', order_by='id', order_by_asc=False, id=1)
+        self.assertEqual(self.db._run_query.call_args[0][0].lower(), "SELECT * FROM beesql_version WHERE id=? ORDER BY id DESC".lower())
+        self.assertEqual((self.db.statement_cache.hits, self.db.statement_cache.misses), (1, 4))
+
+        db = beesql.connection(engine='sqlite', db=':memory:', statement_cache_size=2)
+        db._run_query = mock.Mock()
+        db.delete('beesql_version', id=1)
+        db.insert('beesql_version', id=1)
+        db.update('beesql_version', {'version': '0.2'}, id=1)
+        db.delete('beesql_version', id=2)
+        self.assertEqual(len(db.statement_cache), 2)
+        self.assertEqual(db.statement_cache.evictions, 2)
+        self.assertEqual(db.statement_cache.misses, 4)
+        db.close()
+
+    def test_result_cache(self):
+        ''' Cached results should be served until the table is written to or the ttl expires. '''
+        self.db.query("""CREATE TABLE beesql_version(
+        id INTEGER PRIMARY_KEY,
+        version VARCHAR(10),
+        release_manager VARCHAR(100))""")
+        self.db.insert('beesql_version', id=1, version='0.1.1', release_manager='John Doe')
+        cache = self.db.enable_result_cache(max_entries=2, table_ttls={'beesql_release': 0})
+
+        self.assertEqual(self.db.get('beesql_version', id=1)['version'], '0.1.1')
+        self.db._run_query = mock.Mock(side_effect=self.db._run_query)
+        self.assertEqual(self.db.get('beesql_version', id=1)['version'], '0.1.1')
+        self.assertEqual(self.db.lastescapes, (1,))
+        self.assertFalse(self.db._run_query.called)
+
+        self.db.update('beesql_version', {'version': '0.1.2'}, id=1)
+        self.assertEqual(self.db.get('beesql_version', id=1)['version'], '0.1.2')
+        self.db.select('beesql_version')
+        self.db.select('beesql_version', 'version')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['invalidations'], stats['evictions']), (1, 4, 1, 1))
+        self.assertEqual(stats['entries'], 2)
+        self.assertTrue(stats['bytes'] > 0)
+
+        self.db.transaction_on()
+        self.db.query('DELETE FROM beesql_version')
+        self.assertEqual(self.db.select('beesql_version', 'version'), [])
+        self.db.rollback()
+        self.db.transaction_off()
+        self.assertEqual(self.db.select('beesql_version', 'version'), [{'version': '0.1.2'}])
+        self.db.query('CREATE TABLE beesql_release(id INTEGER)')
+        self.assertEqual(len(cache), 0)
+        self.db.select('beesql_release')
+        self.assertEqual(len(cache), 0)
+
+    def test_result_cache_copies(self):
+        ''' Cached results should not be changed by callers modifying served results. '''
+        self.db.query('CREATE TABLE beesql_version(id INTEGER, version VARCHAR(10))')
+        self.db.insert('beesql_version', id=1, version='0.1.1')
+        self.db.enable_result_cache()
+        self.db.get('beesql_version', id=1)['version'] = '0.0.0'
+        row = self.db.get('beesql_version', id=1)
+        self.assertEqual(row['version'], '0.1.1')
+        row['version'] = '0.0.0'
+        self.db.select('beesql_version').append({})
+        self.assertEqual(self.db.get('beesql_version', id=1)['version'], '0.1.1')
+        self.assertEqual(self.db.select('beesql_version'), [{'id': 1, 'version': '0.1.1'}])
+
+    def test_result_cache_joins(self):
+        ''' Writes to joined tables and tables of subqueries should invalidate cached results. '''
+        self.db.query('CREATE TABLE beesql_version(id INTEGER, version VARCHAR(10))')
+        self.db.query('CREATE TABLE beesql_release(version_id INTEGER, name VARCHAR(10))')
+        self.db.insert('beesql_version', id=1, version='0.1.1')
+        self.db.insert('beesql_release', version_id=1, name='bumblebee')
+        cache = self.db.enable_result_cache()
+
+        joined = 'beesql_version v JOIN beesql_release r ON r.version_id = v.id'
+        self.assertEqual(self.db.select(joined, ('version', 'name')), [{'version': '0.1.1', 'name': 'bumblebee'}])
+        self.db.update('beesql_release', {'name': 'honeybee'}, version_id=1)
+        self.assertEqual(self.db.select(joined, ('version', 'name')), [{'version': '0.1.1', 'name': 'honeybee'}])
+
+        where = 'id IN (SELECT version_id FROM beesql_release)'
+        self.assertEqual(len(self.db.select('beesql_version', where=where)), 1)
+        self.db.delete('beesql_release', version_id=1)
+        self.assertEqual(self.db.select('beesql_version', where=where), [])
+        self.assertEqual(cache.stats()['hits'], 0)
+
     def test_transaction(self):
         ''' When in a transaction auto commit should be false. '''
         self.db.query("""CREATE TABLE beesql_version(
@@ -111,6 +658,214 @@ class TestSQLiteConnection(unittest.TestCase):
         row = self.db.select('beesql_version', where="id=1")[0]
         self.assertNotEqual(row['release_manager'], updates['release_manager'])
 
+    def test_transaction_context(self):
+        ''' transaction() should commit on success and rollback when the block raises. '''
+        self.db.query('CREATE TABLE beesql_version(id INTEGER, version VARCHAR(10))')
+        with self.db.transaction():
+            self.db.insert('beesql_version', id=1, version='0.1')
+            with self.db.transaction():
+                self.db.insert('beesql_version', id=2, version='0.2')
+        self.assertFalse(self.db.in_transaction)
+        try:
+            with self.db.transaction():
+                self.db.insert('beesql_version', id=3, version='0.3')
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertFalse(self.db.in_transaction)
+        self.assertEqual([row['id'] for row in self.db.select('beesql_version', order_by='id')], [1, 2])
+
+    def test_commit_policy(self):
+        ''' commit_every should batch commits of statements and close should commit outstanding ones. '''
+        self.db.query('CREATE TABLE beesql_version(id INTEGER, version VARCHAR(10))')
+        self.db.commit = mock.Mock(wraps=self.db.commit)
+        with self.db.batched_commits(commit_every=3):
+            for i in range(7):
+                self.db.insert('beesql_version', id=i, version='0.%s' % i)
+            self.assertEqual(self.db.commit.call_count, 2)
+        self.assertEqual(self.db.commit.call_count, 3)
+        self.assertIsNone(self.db.commit_every)
+        with self.db.batched_commits(commit_every=2):
+            for i in range(3):
+                self.db.select('beesql_version')
+            self.assertEqual(self.db._pending, 0)
+            self.db.insert('beesql_version', id=7, version='0.7')
+            self.db.get('beesql_version', id=7)
+            self.assertEqual((self.db._pending, self.db.commit.call_count), (1, 3))
+        self.assertEqual(self.db.commit.call_count, 4)
+
+        path = tempfile.mktemp(suffix='.db')
+        try:
+            with beesql.connection(engine='sqlite', db=path, commit_every=100) as db:
+                db.query('CREATE TABLE beesql_version(id INTEGER)')
+                db.insert('beesql_version', id=1)
+                self.assertEqual(db._pending, 2)
+            db = beesql.connection(engine='sqlite', db=path)
+            self.assertEqual(db.select('beesql_version'), [{'id': 1}])
+            db.close()
+            # A trailing write is committed by the next statement once the interval passed, else on close.
+            db = beesql.connection(engine='sqlite', db=path, commit_interval=50)
+            db.insert('beesql_version', id=2)
+            reader = beesql.connection(engine='sqlite', db=path)
+            self.assertEqual(len(reader.select('beesql_version')), 1)
+            time.sleep(0.06)
+            db.select('beesql_version')
+            self.assertEqual((db._pending, len(reader.select('beesql_version'))), (0, 2))
+            db.insert('beesql_version', id=3)
+            db.close()
+            self.assertEqual(len(reader.select('beesql_version')), 3)
+            reader.close()
+        finally:
+            os.remove(path)
+
+    def test_stats(self):
+        ''' Hooks should see every statement and stats should report per shape counts and percentiles. '''
+        seen = []
+        hook = self.db.add_hook(after=lambda db, sql, escapes, elapsed, rows, error: seen.append((sql, rows, error)))
+        self.db.query('CREATE TABLE beesql_version(id INTEGER, version VARCHAR(10))')
+        stats = self.db.enable_stats(slow_query_threshold=0)
+        beesql.stats.slow_query_log.disabled = True
+        for i in range(5):
+            self.db.insert('beesql_version', id=i, version='0.%s' % i)
+        self.db.query("SELECT * FROM beesql_version WHERE id IN (1, 2) AND version = '0.1'")
+        self.assertEqual(len(list(self.db.iter_select('beesql_version', batch_size=2))), 5)
+        self.assertRaises(beesql.BeeSQLDatabaseError, self.db.query, 'SELECT * FROM beesql_missing')
+        self.db.remove_hook(hook)
+        self.db.insert('beesql_version', id=5, version='0.5')
+
+        self.assertEqual(len(seen), 9)
+        self.assertEqual(seen[-2][1:], (5, None))
+        self.assertIsNotNone(seen[-1][2])
+        snapshot = self.db.stats()
+        insert = [entry for shape, entry in snapshot.items() if shape.startswith('INSERT')][0]
+        self.assertEqual((insert['count'], insert['rows']), (6, 6))
+        self.assertTrue(insert['min'] <= insert['p50'] <= insert['p99'] <= insert['max'])
+        self.assertEqual(snapshot['SELECT * FROM beesql_version WHERE id IN (?+) AND version = ?']['rows'], 1)
+        self.assertEqual(snapshot['SELECT * FROM beesql_version']['rows'], 5)
+        self.assertEqual(snapshot['SELECT * FROM beesql_missing']['errors'], 1)
+        self.assertEqual(stats.slow_queries, 9)
+        beesql.stats.slow_query_log.disabled = False
+        self.db.disable_stats()
+        self.assertEqual(self.db.stats(), {})
+        self.assertEqual(self.db.hooks, [])
+
+    def test_explain(self):
+        ''' explain should report scans and indexes used, CRUD methods should explain instead of running. '''
+        self.db.query('CREATE TABLE beesql_version(id INTEGER PRIMARY KEY, version VARCHAR(10), lang VARCHAR(2))')
+        self.db.query('CREATE INDEX beesql_version_lang ON beesql_version (lang)')
+        self.db.insert('beesql_version', id=1, version='0.1', lang='en')
+        plan = self.db.explain('SELECT * FROM beesql_version WHERE version = ?', ('0.1',))
+        self.assertEqual([(step['table'], step['index'], step['scan']) for step in plan], [('beesql_version', None, True)])
+        plan = self.db.select('beesql_version', lang='en', explain=True)
+        self.assertEqual([(step['table'], step['index'], step['scan']) for step in plan],
+                         [('beesql_version', 'beesql_version_lang', False)])
+        self.assertEqual(self.db.get('beesql_version', id=1, explain=True)[0]['index'], 'INTEGER PRIMARY KEY')
+        self.assertTrue(self.db.update('beesql_version', {'lang': 'fr'}, version='0.1', explain=True)[0]['scan'])
+        self.assertFalse(self.db.delete('beesql_version', lang='en', explain=True)[0]['scan'])
+        self.assertEqual(self.db.get('beesql_version', id=1)['lang'], 'en')
+        self.assertEqual(self.db.explain('SELECT 1')[0]['table'], None)
+        self.assertEqual(self.db.indexes('beesql_version'), {'beesql_version_lang': ('lang',), 'PRIMARY': ('id',)})
+
+    def test_index_advisor(self):
+        ''' The index advisor should flag scans of large tables and suggest indexes covering the observed shapes. '''
+        self.db.query('CREATE TABLE beesql_downloads(id INTEGER PRIMARY KEY, release VARCHAR(10), country VARCHAR(2), os VARCHAR(10))')
+        self.db.query('CREATE TABLE beesql_version(id INTEGER PRIMARY KEY, version VARCHAR(10))')
+        self.db.query('CREATE INDEX beesql_downloads_os ON beesql_downloads (os)')
+        self.db.insert_many('beesql_downloads', [(i, '0.%s' % (i % 3), 'lk', 'linux') for i in range(100)],
+                            ('id', 'release', 'country', 'os'))
+        self.assertEqual(self.db.index_advice(), {})
+        advisor = self.db.enable_index_advisor(large_table_rows=50)
+        beesql.advisor.scan_log.disabled = True
+        for i in range(3):
+            self.db.select('beesql_downloads', release='0.1')
+        self.db.select('beesql_downloads', release='0.1', country='lk')
+        self.db.get('beesql_downloads', os='linux')
+        self.db.get('beesql_downloads', id=1)
+        self.db.update('beesql_downloads', {'os': 'mac'}, where='id = 1')
+        self.db.delete('beesql_version', version='0.1')
+        self.assertRaises(beesql.BeeSQLDatabaseError, self.db.select, 'beesql_missing', version='0.1')
+        beesql.advisor.scan_log.disabled = False
+
+        report = self.db.index_advice()
+        shapes = dict(((shape['table'], shape['columns']), shape) for shape in report['shapes'])
+        self.assertEqual(len(shapes), 5)
+        self.assertEqual(shapes[('beesql_downloads', ('release',))]['count'], 3)
+        self.assertEqual([(shape['table'], shape['columns']) for shape in report['scans']],
+                         [('beesql_downloads', ('release',)), ('beesql_downloads', ('country', 'release'))])
+        self.assertTrue(shapes[('beesql_downloads', ('os',))]['covered'])
+        version = shapes[('beesql_version', ('version',))]
+        self.assertEqual((version['scan'], version['rows']), (True, 0))
+        self.assertEqual(report['suggestions'], [dict(table='beesql_downloads', columns=('release', 'country'), calls=4,
+            sql='CREATE INDEX beesql_downloads_release_country ON beesql_downloads (release, country)')])
+        self.db.query(report['suggestions'][0]['sql'])
+        advisor.reset()
+        self.db.select('beesql_downloads', release='0.1', country='lk')
+        self.assertEqual(self.db.index_advice()['suggestions'], [])
+        self.db.disable_index_advisor()
+        self.assertEqual(self.db.index_advice(), {})
+
+    def test_index_advisor_side_effects(self):
+        ''' Statements run by the index advisor should not change lastsql, the commit policy or query stats. '''
+        self.db.query('CREATE TABLE beesql_downloads(id INTEGER PRIMARY KEY, release VARCHAR(10))')
+        self.db.enable_index_advisor()
+        self.db.enable_stats()
+        with self.db.batched_commits(commit_every=3):
+            self.db.insert('beesql_downloads', id=1, release='0.1')
+            self.db.insert('beesql_downloads', id=2, release='0.2')
+            sql = self.db.lastsql
+            self.db.index_advisor.observe(self.db, 'beesql_downloads', ['release'],
+                                          'SELECT * FROM beesql_downloads WHERE release=?', ('0.1',))
+            self.assertEqual((self.db.lastsql, self.db._pending), (sql, 2))
+            self.assertEqual(sum([shape['count'] for shape in self.db.stats().values()]), 2)
+            self.assertEqual(len(self.db.index_advice()['shapes']), 1)
+
+    def test_lazy(self):
+        ''' A lazy connection should open the database on first use only. '''
+        path = tempfile.mktemp(suffix='.db')
+        db = beesql.connection(engine='sqlite', db=path, lazy=True)
+        self.assertFalse(db.connected)
+        self.assertFalse(os.path.exists(path))
+        db.close()
+        self.assertFalse(db.connected)
+        try:
+            db.query('CREATE TABLE beesql_version(id INTEGER)')
+            self.assertTrue(db.connected)
+            self.assertEqual(db.tables(), ['beesql_version'])
+            db.close()
+        finally:
+            os.remove(path)
+
+    def test_backend_registry(self):
+        ''' Engines should resolve through the backend registry. '''
+        class MemoryConnection(beesql.core.backend('sqlite')):
+            def __init__(self, username, password, host, port, db, unix_socket, **options):
+                super(MemoryConnection, self).__init__(username, password, db=':memory:', **options)
+        beesql.register_backend('memory', MemoryConnection)
+        try:
+            db = beesql.connection(engine='memory')
+            self.assertTrue(isinstance(db, MemoryConnection))
+            db.close()
+        finally:
+            del beesql.core.BACKENDS['memory']
+            del beesql.core._backend_classes['memory']
+        self.assertRaises(beesql.BeeSQLError, beesql.connection, engine='memory')
+
+    def test_prepare(self):
+        ''' Prepared statements should execute many times on their own cursor. '''
+        self.db.query('CREATE TABLE beesql_version(id INTEGER, version VARCHAR(10))')
+        with self.db.prepare('INSERT INTO beesql_version (id, version) VALUES (?, ?)') as insert:
+            insert.execute((1, '0.1'))
+            self.assertEqual(insert.lastrowid, 1)
+            self.assertEqual(insert.executemany([(2, '0.2'), (3, '0.3')]), 2)
+        self.assertRaises(beesql.BeeSQLError, insert.execute, (4, '0.4'))
+        select = self.db.prepare('SELECT version FROM beesql_version WHERE id < ?')
+        self.assertEqual(select.execute((2,)), [{'version': '0.1'}])
+        self.assertEqual(select.execute((3,), row_format='tuple'), [('0.1',), ('0.2',)])
+        self.assertEqual(self.db.lastescapes, (3,))
+        self.assertEqual(list(select.iter((4,), batch_size=2)), [{'version': '0.1'}, {'version': '0.2'}, {'version': '0.3'}])
+        self.assertRaises(beesql.BeeSQLDatabaseError, self.db.prepare('SELECT * FROM beesql_missing').execute)
+        select.close()
+
     def test_tables(self):
         ''' tables should return tables of current database as a list. '''
         self.db.query("""CREATE TABLE beesql_version(